@@ -4,91 +4,287 @@ Performs analysis on the price history data.
 
 from datetime import datetime, timedelta, timezone
 import database
+import fx
+import metrics
 
 
-def get_price_history(item_name: str, days: int = 30) -> list[tuple]:
+def get_price_history(
+    item_name: str,
+    days: int = 30,
+    source: str = "skinport",
+    currency: str = fx.BASE_CURRENCY,
+) -> list[tuple]:
     """
     Retrieves the price history for a specific item over a number of days.
 
+    Only price changes (and periodic heartbeats) are stored, so the history
+    is a step function: each price holds until the next one. The price in
+    effect when the window starts is included as a point at its start.
+
     Args:
         item_name: The 'market_hash_name' of the item.
         days: The number of past days to retrieve data for.
+        source: The price source to read. Prices set aside when the base
+                currency was introduced (the ':legacy' sources) are in
+                mixed currencies and are never mixed in.
+        currency: The currency to convert the prices to.
 
     Returns:
-        A list of tuples, where each tuple is (timestamp, price).
+        A list of tuples, where each tuple is (timestamp, price) and the
+        timestamp is a timezone-aware datetime in UTC. Empty if there is
+        no exchange rate for the currency.
     """
+    rate = fx.get_rate(currency)
+    if rate is None:
+        return []
+
     conn = database.get_db_connection()
     cursor = conn.cursor()
 
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
+    start_epoch = database.to_epoch(
+        datetime.now(timezone.utc) - timedelta(days=days)
+    )
+    series_filter = (
+        "item_id = (SELECT id FROM items WHERE name = ?) "
+        "AND source_id = (SELECT id FROM sources WHERE name = ?)"
+    )
+
+    cursor.execute(
+        f"SELECT price FROM price_history WHERE {series_filter} "
+        "AND ts_epoch < ? ORDER BY ts_epoch DESC LIMIT 1",
+        (item_name, source, start_epoch),
+    )
+    previous = cursor.fetchone()
 
     query = (
-        "SELECT timestamp, price FROM price_history "
-        "WHERE item_name = ? AND timestamp >= ? ORDER BY timestamp ASC"
+        f"SELECT ts_epoch, price FROM price_history WHERE {series_filter} "
+        "AND ts_epoch >= ? ORDER BY ts_epoch ASC"
     )
-    cursor.execute(query, (item_name, start_date))
+    cursor.execute(query, (item_name, source, start_epoch))
 
-    history = cursor.fetchall()
-    conn.close()
-    return [(row["timestamp"], row["price"]) for row in history]
+    history = [(row["ts_epoch"], row["price"]) for row in cursor.fetchall()]
+    if previous is not None and (not history or history[0][0] > start_epoch):
+        history.insert(0, (start_epoch, previous["price"]))
 
+    return [
+        (
+            datetime.fromtimestamp(ts_epoch, timezone.utc),
+            fx.convert(price, rate),
+        )
+        for ts_epoch, price in history
+    ]
 
-def analyze_item_trend(item_name: str, current_price: float) -> str:
+
+def _time_weighted_average(
+    rows: list, opening: float | None, start: int, end: int
+) -> float | None:
     """
-    Analyzes the price trend for a single item and provides a recommendation.
+    Averages a step function over [start, end), weighted by time.
 
     Args:
-        item_name: The 'market_hash_name' of the item.
-        current_price: The current price of the item.
+        rows: The price_daily rows of the window, in day order.
+        opening: The price in effect at `start` (the close of the last day
+                 before the window), or None if there was none; the
+                 average then starts at the first sample.
+        start: The start of the window, as a Unix timestamp.
+        end: The end of the window, as a Unix timestamp.
+    """
+    area = 0.0
+    covered_from = start if opening is not None else None
+    last_ts, last_price = start, opening
+    for row in rows:
+        if last_price is not None:
+            area += last_price * (row["first_ts"] - last_ts)
+        else:
+            covered_from = row["first_ts"]
+        area += row["area"]
+        last_ts, last_price = row["last_ts"], row["close"]
+    if last_price is None:
+        return None
+    area += last_price * (end - last_ts)
+    duration = end - covered_from
+    return area / duration if duration > 0 else last_price
+
+
+def get_price_averages(
+    item_names: list[str],
+    days: int = 30,
+    recent_days: int = 7,
+    source: str = "skinport",
+) -> dict[str, tuple[int, float, float | None]]:
+    """
+    Computes time-weighted price averages for many items from the daily
+    rollups.
+
+    Prices are stored as a step function (only changes and heartbeats), so
+    each price counts for as long as it held, however often it was seen.
+    Windows start at the beginning of a UTC calendar day and end now, so
+    each item needs at most `days + 2` rollup rows no matter how often it
+    was priced.
+
+    Args:
+        item_names: The 'market_hash_name' of each item.
+        days: The length of the full averaging window.
+        recent_days: The length of the recent averaging window.
+        source: The price source to average.
 
     Returns:
-        A string summarizing the trend (e.g., "stable", "overpriced", "good deal").
+        A dictionary mapping each item with history to a tuple of
+        (sample_count, average_over_days, average_over_recent_days), where
+        sample_count is the number of stored prices in the window plus the
+        one in effect when it starts. The recent average is None if there
+        are no prices up to the end of the recent window.
     """
-    history = get_price_history(item_name, days=30)
+    now = database.to_epoch(datetime.now(timezone.utc))
+    today = database.epoch_day(now)
+    start_day = today - days
+    recent_start_day = today - recent_days
 
-    if len(history) < 2:
-        return "Not enough data to analyze trend."
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+
+    source_id = database.get_ids(cursor, "sources", [source]).get(source)
+    item_ids = database.get_ids(cursor, "items", item_names)
+    names_by_id = {item_id: name for name, item_id in item_ids.items()}
+    ids = list(names_by_id) if source_id is not None else []
+
+    rows_by_item = {}
+    opening = {}
+    for i in range(0, len(ids), database.MAX_NAMES_PER_QUERY):
+        chunk = ids[i : i + database.MAX_NAMES_PER_QUERY]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            "SELECT item_id, day, count, area, close, first_ts, last_ts "
+            f"FROM price_daily WHERE item_id IN ({placeholders}) "
+            "AND source_id = ? AND day >= ? ORDER BY item_id, day",
+            (*chunk, source_id, start_day),
+        )
+        for row in cursor.fetchall():
+            rows_by_item.setdefault(row["item_id"], []).append(row)
+        # The close of the last day before the window, found via the
+        # primary key for each item.
+        cursor.execute(
+            "SELECT item_id, close FROM price_daily AS d "
+            f"WHERE item_id IN ({placeholders}) AND source_id = ? "
+            "AND day = (SELECT MAX(day) FROM price_daily "
+            "WHERE item_id = d.item_id AND source_id = d.source_id "
+            "AND day < ?)",
+            (*chunk, source_id, start_day),
+        )
+        opening.update(
+            {row["item_id"]: row["close"] for row in cursor.fetchall()}
+        )
 
-    prices = [row[1] for row in history]
-    avg_price_30_days = sum(prices) / len(prices)
+    averages = {}
+    start = start_day * database.SECONDS_PER_DAY
+    recent_start = recent_start_day * database.SECONDS_PER_DAY
+    for item_id in set(rows_by_item) | set(opening):
+        rows = rows_by_item.get(item_id, [])
+        recent_rows = [row for row in rows if row["day"] >= recent_start_day]
+        older_rows = rows[: len(rows) - len(recent_rows)]
+        recent_opening = (
+            older_rows[-1]["close"] if older_rows else opening.get(item_id)
+        )
 
-    # Analyze last 7 days
-    last_7_days_prices = []
-    now_utc = datetime.now(timezone.utc)
-    for ts_from_db, price in history:
-        ts_obj = datetime.fromisoformat(ts_from_db)
-        # Ensure the datetime object is timezone-aware before comparison
-        if ts_obj.tzinfo is None:
-            ts_obj = ts_obj.replace(tzinfo=timezone.utc)
+        samples = sum(row["count"] for row in rows) + (item_id in opening)
+        averages[names_by_id[item_id]] = (
+            samples,
+            _time_weighted_average(rows, opening.get(item_id), start, now),
+            _time_weighted_average(
+                recent_rows, recent_opening, recent_start, now
+            ),
+        )
 
-        if (now_utc - ts_obj).days <= 7:
-            last_7_days_prices.append(price)
+    return averages
 
-    if not last_7_days_prices:
-        avg_price_7_days = avg_price_30_days  # Fallback
-    else:
-        avg_price_7_days = sum(last_7_days_prices) / len(last_7_days_prices)
 
-    # Simple trend logic
+def _describe_trend(current_price: float, avg_price_7_days: float) -> str:
+    """Builds the trend summary comparing a price with its 7-day average."""
     price_str = f"${current_price:.2f}"
     avg_price_str = f"${avg_price_7_days:.2f}"
     if current_price > avg_price_7_days * 1.1:
-        trend = (
+        return (
             f"High: Current price ({price_str}) is >10% "
             f"above 7-day average ({avg_price_str})."
         )
-    elif current_price < avg_price_7_days * 0.9:
-        trend = (
+    if current_price < avg_price_7_days * 0.9:
+        return (
             f"Low: Current price ({price_str}) is >10% "
             f"below 7-day average ({avg_price_str})."
         )
-    else:
-        trend = (
-            f"Stable: Current price ({price_str}) is within 10% "
-            f"of 7-day average ({avg_price_str})."
+    return (
+        f"Stable: Current price ({price_str}) is within 10% "
+        f"of 7-day average ({avg_price_str})."
+    )
+
+
+@metrics.timed("analysis")
+def analyze_items_trend(
+    items: list[str],
+    current_prices: dict[str, float],
+    currency: str = fx.BASE_CURRENCY,
+) -> dict[str, str]:
+    """
+    Analyzes the price trend of many items at once.
+
+    All averages are computed in a single pass over the database, so the
+    cost does not grow with one connection and query per item. History is
+    stored in the base currency and converted to `currency` here.
+
+    Args:
+        items: The 'market_hash_name' of each item to analyze.
+        current_prices: A dictionary mapping item name to its current price.
+                        Items without a current price are skipped.
+        currency: The currency of current_prices.
+
+    Returns:
+        A dictionary mapping item name to its trend summary, in the same
+        format as analyze_item_trend. Empty if there is no exchange rate
+        for the currency.
+    """
+    rate = fx.get_rate(currency)
+    if rate is None:
+        return {}
+
+    priced_items = [
+        item for item in items if current_prices.get(item) is not None
+    ]
+    averages = get_price_averages(priced_items, days=30, recent_days=7)
+
+    trends = {}
+    for item_name in priced_items:
+        samples, avg_price_30_days, avg_price_7_days = averages.get(
+            item_name, (0, None, None)
+        )
+        if samples < 2:
+            trends[item_name] = "Not enough data to analyze trend."
+            continue
+
+        if avg_price_7_days is None:
+            avg_price_7_days = avg_price_30_days  # Fallback
+
+        trends[item_name] = _describe_trend(
+            current_prices[item_name], avg_price_7_days * rate
         )
 
-    return trend
+    return trends
+
+
+def analyze_item_trend(item_name: str, current_price: float) -> str:
+    """
+    Analyzes the price trend for a single item and provides a recommendation.
+
+    Args:
+        item_name: The 'market_hash_name' of the item.
+        current_price: The current price of the item.
+
+    Returns:
+        A string summarizing the trend (e.g., "stable", "overpriced",
+        "good deal").
+    """
+    return analyze_items_trend([item_name], {item_name: current_price})[
+        item_name
+    ]
 
 
 if __name__ == "__main__":
@@ -97,44 +293,23 @@ if __name__ == "__main__":
 
     # First, ensure there's data to analyze
     database.create_tables()
-    # Add some dummy historical data
-    conn = database.get_db_connection()
-    cursor = conn.cursor()
-
     item_to_test = "AK-47 | Redline (Field-Tested)"
 
     # Clear old test data
-    cursor.execute(
-        "DELETE FROM price_history WHERE item_name = ?", (item_to_test,)
-    )
+    with database.transaction() as conn:
+        for table in ("price_history", "price_daily"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE item_id = "
+                "(SELECT id FROM items WHERE name = ?)",
+                (item_to_test,),
+            )
 
-    dummy_data = [
-        (
-            item_to_test,
-            "skinport",
-            50.0,
-            datetime.now(timezone.utc) - timedelta(days=10),
-        ),
-        (
-            item_to_test,
-            "skinport",
-            52.5,
-            datetime.now(timezone.utc) - timedelta(days=5),
-        ),
-        (
-            item_to_test,
-            "skinport",
-            51.0,
-            datetime.now(timezone.utc) - timedelta(days=2),
-        ),
-    ]
-    query = (
-        "INSERT INTO price_history (item_name, source, price, timestamp) "
-        "VALUES (?, ?, ?, ?)"
-    )
-    cursor.executemany(query, dummy_data)
-    conn.commit()
-    conn.close()
+    # Add some dummy historical data
+    for days_ago, price in ((10, 50.0), (5, 52.5), (2, 51.0)):
+        database.save_prices(
+            {item_to_test: {"skinport": price}},
+            timestamp=datetime.now(timezone.utc) - timedelta(days=days_ago),
+        )
 
     print(f"Analyzing trend for: {item_to_test}")
 
@@ -0,0 +1,291 @@
+"""
+Vectorized price statistics for many items at once.
+
+The stored history of all requested items is resampled onto a regular time
+grid by SQLite, with one query per chunk of items, giving one row per
+item in a contiguous (items x steps) NumPy array. Price history is a step
+function (only changes and heartbeats are stored), so each grid point holds
+the last price known at that time, and NaN before an item's first price.
+Every statistic is then computed for all items together.
+"""
+
+import math
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+
+import database
+import fx
+import metrics
+
+# Resolution of the resampled history.
+DEFAULT_STEP_SECONDS = 3600
+
+
+def load_price_matrix(
+    item_names: list[str],
+    days: int = 30,
+    step_seconds: int = DEFAULT_STEP_SECONDS,
+    source: str = "skinport",
+    now: float | None = None,
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    Loads the recent price history of many items into one array.
+
+    Args:
+        item_names: The 'market_hash_name' of each item.
+        days: How far back to load.
+        step_seconds: The spacing of the time grid.
+        source: The price source to load.
+        now: The end of the grid as a Unix timestamp. Defaults to now.
+
+    Returns:
+        A tuple of (names, grid, prices): the item names (one per row), the
+        Unix timestamp closing each step, and a float64 array of shape
+        (len(names), len(grid)) holding the last price known at the end of
+        each step, or NaN before the item's first price.
+    """
+    if now is None:
+        now = database.to_epoch(datetime.now(timezone.utc))
+    n_steps = max(math.ceil(days * database.SECONDS_PER_DAY / step_seconds), 1)
+    start = now - n_steps * step_seconds
+    grid = start + step_seconds * np.arange(1, n_steps + 1, dtype=np.int64)
+
+    names = list(dict.fromkeys(item_names))
+    prices = np.full((len(names), n_steps), np.nan)
+    if not names:
+        return names, grid, prices
+
+    conn = database.get_db_connection()
+    cursor = conn.cursor()
+    # Plain tuples convert to arrays much faster than sqlite3.Row objects.
+    cursor.row_factory = None
+    source_id = database.get_ids(cursor, "sources", [source]).get(source)
+    item_ids = database.get_ids(cursor, "items", names)
+    if source_id is None or not item_ids:
+        return names, grid, prices
+
+    # Maps an item id to its row in the result.
+    ids = list(item_ids.values())
+    row_of_id = np.zeros(max(ids) + 1, dtype=np.int64)
+    for row, name in enumerate(names):
+        if name in item_ids:
+            row_of_id[item_ids[name]] = row
+
+    for i in range(0, len(ids), database.MAX_NAMES_PER_QUERY):
+        chunk = ids[i : i + database.MAX_NAMES_PER_QUERY]
+        placeholders = ", ".join("?" for _ in chunk)
+
+        # The price in effect when the window starts, found with one index
+        # lookup per item.
+        cursor.execute(
+            "SELECT id, (SELECT price FROM price_history "
+            "WHERE item_id = items.id AND source_id = ? AND ts_epoch <= ? "
+            "ORDER BY ts_epoch DESC LIMIT 1) FROM items "
+            f"WHERE id IN ({placeholders})",
+            (source_id, start, *chunk),
+        )
+        carried = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+        carried = carried[~np.isnan(carried[:, 1])]
+        prices[row_of_id[carried[:, 0].astype(np.int64)], 0] = carried[:, 1]
+
+        cursor.execute(
+            "SELECT item_id, ts_epoch, price FROM price_history "
+            f"WHERE source_id = ? AND item_id IN ({placeholders}) "
+            "AND ts_epoch > ? AND ts_epoch <= ? ORDER BY item_id, ts_epoch",
+            (source_id, *chunk, start, now),
+        )
+        history = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+        if not len(history):
+            continue
+        rows = row_of_id[history[:, 0].astype(np.int64)]
+        steps = (history[:, 1].astype(np.int64) - start - 1) // step_seconds
+        # Rows are sorted by (item, time): keep the last price of each step.
+        keys = rows * n_steps + steps
+        last = np.append(keys[1:] != keys[:-1], True)
+        prices[rows[last], steps[last]] = history[last, 2]
+
+    return names, grid, forward_fill(prices)
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Replaces each NaN with the last non-NaN value before it in its row."""
+    index = np.where(np.isnan(values), 0, np.arange(values.shape[1]))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return values[np.arange(values.shape[0])[:, None], index]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of the last `window` values at every step, ignoring NaN.
+
+    Returns:
+        An array of the same shape; NaN where the window has no values.
+    """
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window].copy()
+    counts[:, window:] = counts[:, window:] - counts[:, :-window].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    Exponential moving average with smoothing 2 / (span + 1), started at
+    each row's first value. NaN values leave the average unchanged.
+    """
+    alpha = 2.0 / (span + 1)
+    result = np.empty_like(values)
+    current = values[:, 0].copy()
+    result[:, 0] = current
+    for step in range(1, values.shape[1]):
+        column = values[:, step]
+        update = current + alpha * (column - current)
+        current = np.where(
+            np.isnan(current),
+            column,
+            np.where(np.isnan(column), current, update),
+        )
+        result[:, step] = current
+    return result
+
+
+def percentiles(values: np.ndarray, q: list[float]) -> np.ndarray:
+    """
+    Percentiles of each row, ignoring NaN, with linear interpolation.
+    Same as np.nanpercentile along axis 1, without its per-row loop.
+
+    Returns:
+        An array of shape (len(q), rows); NaN for rows without values.
+    """
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    counts = np.count_nonzero(~np.isnan(values), axis=1)
+    positions = np.outer(np.asarray(q) / 100.0, np.maximum(counts - 1, 0))
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    fraction = positions - lower
+    rows = np.arange(values.shape[0])
+    low_values = ordered[rows, lower]
+    high_values = ordered[rows, upper]
+    result = low_values + (high_values - low_values) * fraction
+    result[:, counts == 0] = np.nan
+    return result
+
+
+def log_returns(values: np.ndarray) -> np.ndarray:
+    """Step-to-step log returns; one column shorter than `values`."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.diff(np.log(values), axis=1)
+
+
+@metrics.timed("analytics")
+def summarize(
+    item_names: list[str],
+    current_prices: dict[str, float] | None = None,
+    currency: str = fx.BASE_CURRENCY,
+    days: int = 30,
+    recent_days: int = 7,
+    step_seconds: int = DEFAULT_STEP_SECONDS,
+    now: float | None = None,
+) -> dict[str, dict]:
+    """
+    Computes price statistics for many items at once.
+
+    Args:
+        item_names: The 'market_hash_name' of each item.
+        current_prices: Current price of each item, in `currency`. Items
+                        without one are compared using their last stored
+                        price instead.
+        currency: The currency to report prices in.
+        days: The length of the full window.
+        recent_days: The length of the recent window (means and EMA span).
+        step_seconds: The resolution of the resampled history.
+        now: The end of the window as a Unix timestamp. Defaults to now.
+
+    Returns:
+        A dictionary mapping each item with history to a dictionary with
+        the keys 'samples' (steps with a known price), 'mean' and
+        'mean_recent' (rolling means over both windows), 'ema',
+        'volatility' (standard deviation of daily log returns), 'zscore'
+        (current price against the full window), and 'p10', 'p50' and
+        'p90' (percentile bands over the full window). Empty if there is
+        no exchange rate for the currency.
+    """
+    rate = fx.get_rate(currency)
+    if rate is None:
+        return {}
+
+    names, _, prices = load_price_matrix(
+        item_names, days, step_seconds, now=now
+    )
+    has_history = ~np.all(np.isnan(prices), axis=1)
+    if not has_history.any():
+        return {}
+    names = [name for name, keep in zip(names, has_history) if keep]
+    prices = prices[has_history] * rate
+
+    n_steps = prices.shape[1]
+    recent_steps = math.ceil(
+        recent_days * database.SECONDS_PER_DAY / step_seconds
+    )
+    recent_steps = max(min(recent_steps, n_steps), 1)
+    steps_per_day = database.SECONDS_PER_DAY / step_seconds
+
+    current_prices = current_prices or {}
+    current = np.array(
+        [
+            (
+                current_prices[name]
+                if current_prices.get(name) is not None
+                else np.nan
+            )
+            for name in names
+        ]
+    )
+    current = np.where(np.isnan(current), prices[:, -1], current)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN windows
+        mean = np.nanmean(prices, axis=1)
+        std = np.nanstd(prices, axis=1)
+        mean_recent = rolling_mean(prices, recent_steps)[:, -1]
+        ema_last = ema(prices, recent_steps)[:, -1]
+        volatility = np.nanstd(log_returns(prices), axis=1)
+        volatility *= math.sqrt(steps_per_day)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            zscore = np.where(std > 0, (current - mean) / std, 0.0)
+        bands = percentiles(prices, [10, 50, 90])
+    samples = np.count_nonzero(~np.isnan(prices), axis=1)
+
+    def number(value):
+        return None if np.isnan(value) else float(value)
+
+    return {
+        name: {
+            "samples": int(samples[i]),
+            "mean": number(mean[i]),
+            "mean_recent": number(mean_recent[i]),
+            "ema": number(ema_last[i]),
+            "volatility": number(volatility[i]),
+            "zscore": number(zscore[i]),
+            "p10": number(bands[0, i]),
+            "p50": number(bands[1, i]),
+            "p90": number(bands[2, i]),
+        }
+        for i, name in enumerate(names)
+    }
+
+
+if __name__ == "__main__":
+    # Example usage (requires data in the database)
+    database.create_tables()
+    example_item = "AK-47 | Redline (Field-Tested)"
+    stats = summarize([example_item])
+    if example_item in stats:
+        for key, value in stats[example_item].items():
+            print(f" -> {key}: {value}")
+    else:
+        print(f"No price history for {example_item}.")
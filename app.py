@@ -1,58 +1,231 @@
-from flask import Flask, render_template, request
-import tracker
+import json
+import os
+
+from flask import (
+    Flask,
+    Response,
+    make_response,
+    render_template,
+    request,
+    stream_with_context,
+)
+import metrics
+
+# The tracker (and with it requests, SQLite and every other project module)
+# is imported by the routes that use it, not here, so a cold start that only
+# serves the form does not pay for it.
+
+# Renders /track as a page that loads the results progressively from
+# /api/track/stream instead of waiting for all of them. The form can also
+# ask for it with stream=true.
+STREAM_RESULTS = (
+    os.environ.get("TRACK_STREAM_RESULTS", "false").lower() == "true"
+)
 
 
 app = Flask(__name__)
 
 
+def _render(template: str, **context) -> str:
+    """Renders a template, timing it as the 'render' stage."""
+    with metrics.timer("render"):
+        return render_template(template, **context)
+
+
+def _tracker_params() -> tuple[dict | None, str | None]:
+    """
+    Reads the tracker parameters shared by /track and /api/track/stream,
+    from the query string or the form data.
+
+    Returns:
+        A tuple of (params, error_message). params holds the 'steam_id'
+        ("TEST_DATA_MODE" with test data), 'use_test_data', 'currency' and
+        'filter_tradable' arguments of the tracker; it is None, with an
+        error message, if no SteamID was given for real data.
+    """
+    steam_id = request.values.get("steam_id")
+    use_test_data = request.values.get("use_test_data") == "true"
+    if use_test_data:
+        # Test data does not need a real steam_id, but one is passed for
+        # consistency.
+        steam_id = "TEST_DATA_MODE"
+    elif not steam_id:
+        return None, "Error: SteamID is required if not using test data."
+    return {
+        "steam_id": steam_id,
+        "use_test_data": use_test_data,
+        "currency": request.values.get("currency", "USD"),
+        "filter_tradable": request.values.get("filter_tradable") == "true",
+    }, None
+
+
 @app.route("/")
 def index():
     """Renders the main input form."""
-    return render_template("index.html")
+    return _render("index.html")
 
 
-@app.route("/track", methods=["POST"])
+@app.route("/track", methods=["GET", "POST"])
 def track():
     """
     Receives the form submission, runs the tracker,
     and renders the results page.
+
+    The same parameters are accepted as a query string, so the results page
+    can be reloaded or linked; a reload with a matching ETag gets a 304.
     """
-    # Get data from the form
-    steam_id = request.form.get("steam_id")
-    use_test_data = request.form.get("use_test_data") == "true"
-    currency = request.form.get("currency", "USD")
-    filter_tradable = request.form.get("filter_tradable") == "true"
+    params, error = _tracker_params()
+    if error:
+        return error, 400
+    # The SteamID as entered, for the page (None with test data).
+    steam_id = request.values.get("steam_id")
+    use_test_data = params["use_test_data"]
+    currency = params["currency"]
+    filter_tradable = params["filter_tradable"]
+    stream = STREAM_RESULTS or request.values.get("stream") == "true"
 
-    # If using test data, we don't need a real steam_id, but we pass one for consistency
-    if use_test_data:
-        steam_id_for_tracker = "TEST_DATA_MODE"
-    else:
-        if not steam_id:
-            # Basic validation
-            return "Error: SteamID is required if not using test data.", 400
-        steam_id_for_tracker = steam_id
+    if stream:
+        return _render(
+            "results_stream.html",
+            steam_id=steam_id,
+            use_test_data=use_test_data,
+            currency=currency,
+            filter_tradable=filter_tradable,
+        )
+
+    import tracker
+
+    items, results, error = tracker.run_tracker_cached(**params)
 
-    items, results, error = tracker.run_tracker(
+    portfolio_chart = None
+    if not use_test_data and items:
+        import portfolio
 
-        steam_id=steam_id_for_tracker,
-        use_test_data=use_test_data,
-        currency=currency,
-        filter_tradable=filter_tradable,
+        series = portfolio.get_value_series(steam_id, currency=currency)
+        portfolio_chart = portfolio.build_chart(series or [])
 
+    response = make_response(
+        _render(
+            "results.html",
+            items=items,
+            results=results,
+            steam_id=steam_id,
+            use_test_data=use_test_data,
+            currency=currency,
+            error_message=error,
+            portfolio_chart=portfolio_chart,
+        )
     )
 
-    return render_template(
-        "results.html",
-        items=items,
-        results=results,
-        steam_id=steam_id,
-        use_test_data=use_test_data,
+    # Results with an error are not cached, so they should not be re-used.
+    if error:
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    response.headers["Cache-Control"] = (
+        f"private, max-age={tracker.RESULT_CACHE_TTL_SECONDS}"
+    )
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.route("/api/track/stream", methods=["GET", "POST"])
+def track_stream():
+    """
+    Streams the tracker results as they are ready: one event per item as
+    soon as it is priced, then one with its trend.
 
-        currency=currency,
-        error_message=error,
+    Takes the same parameters as /track, as query string or form data,
+    plus 'format': 'ndjson' (the default) for one JSON object per line, or
+    'sse' for Server-Sent Events. The events are the ones yielded by
+    tracker.iter_tracker.
+    """
+    params, error = _tracker_params()
+    if error:
+        return error, 400
+    output_format = request.values.get("format", "ndjson")
+    if output_format not in ("ndjson", "sse"):
+        return "Error: format must be 'ndjson' or 'sse'.", 400
+
+    import tracker
+
+    events = tracker.iter_tracker(**params)
+
+    def generate():
+        for event in events:
+            data = json.dumps(event, ensure_ascii=False)
+            if output_format == "sse":
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+            else:
+                yield data + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=(
+            "text/event-stream"
+            if output_format == "sse"
+            else "application/x-ndjson"
+        ),
+        # Ask proxies not to buffer the stream.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.route("/api/portfolio")
+def portfolio_history():
+    """
+    Returns the value history of a SteamID's inventory as JSON.
+
+    Query parameters: 'steam_id' (required), 'days' (how far back; default
+    PORTFOLIO_DAYS) and 'currency' (default USD). The inventory must have
+    been tracked before for its history to be recorded.
+    """
+    import database
+    import portfolio
+
+    steam_id = request.args.get("steam_id")
+    currency = request.args.get("currency", "USD").upper()
+    if not steam_id:
+        return "Error: steam_id is required.", 400
+    try:
+        days = int(request.args.get("days", portfolio.PORTFOLIO_DAYS))
+    except ValueError:
+        return "Error: days must be a whole number.", 400
+    if days <= 0:
+        return "Error: days must be a whole number.", 400
+
+    database.create_tables()
+    series = portfolio.get_value_series(steam_id, days=days, currency=currency)
+    if series is None:
+        return f"Error: no exchange rate available for {currency}.", 400
+    return {
+        "steam_id": steam_id,
+        "currency": currency,
+        "days": days,
+        "values": [
+            {"ts": ts_epoch, "value": value} for ts_epoch, value in series
+        ],
+    }
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Exposes this process's metrics in the Prometheus text format: stage
+    latencies, upstream requests and errors, cache lookups and the number
+    of rows in each database table (see database.count_rows).
+
+    The endpoint is not authenticated: keep it off public deployments or
+    behind the proxy's access control (see METRICS_ENABLED in the README).
+    """
+    if not metrics.ENABLED:
+        return "Metrics are disabled.", 404
+    import database
+
+    for table, rows in database.count_rows().items():
+        metrics.DB_ROWS.set(rows, table=table)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     # For local development. Vercel will use a WSGI server.
     app.run(debug=True, port=8080)
@@ -0,0 +1,11 @@
+"""
+Offline benchmarks for the price tracker's hot paths.
+
+Run them from the repository root as modules, e.g.:
+    python -m benchmarks.bench_catalog_parse
+    python -m benchmarks.bench_tracker --quick
+    python -m benchmarks.bench_catalog_index
+
+synthetic.py generates the test data and upstream_stub.py serves it over
+HTTP in place of Skinport and Steam.
+"""
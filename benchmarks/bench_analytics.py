@@ -0,0 +1,112 @@
+"""
+Compares computing price statistics item by item (one history query and
+plain-Python loops per item) against the vectorized analytics module.
+
+Builds a temporary database of random-walk prices first.
+
+Usage:
+    python -m benchmarks.bench_analytics [items] [samples_per_item]
+"""
+
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import analysis
+import analytics
+import database
+from benchmarks.synthetic import populate_history
+
+DAYS = 30
+RECENT_DAYS = 7
+
+
+def per_item_statistics(names: list[str]) -> dict[str, dict]:
+    """The per-item path: one query and Python loops for every item."""
+    results = {}
+    recent_start = datetime.now(timezone.utc).timestamp() - RECENT_DAYS * 86400
+    for name in names:
+        history = analysis.get_price_history(name, days=DAYS)
+        prices = [price for _, price in history]
+        recent = [
+            price for ts, price in history if ts.timestamp() >= recent_start
+        ]
+        returns = [math.log(b / a) for a, b in zip(prices, prices[1:])]
+        alpha = 2 / (len(recent) + 1)
+        ema = prices[0]
+        for price in prices[1:]:
+            ema += alpha * (price - ema)
+        deciles = statistics.quantiles(prices, n=10)
+        mean = statistics.fmean(prices)
+        std = statistics.pstdev(prices)
+        results[name] = {
+            "mean": mean,
+            "mean_recent": statistics.fmean(recent),
+            "ema": ema,
+            "volatility": statistics.pstdev(returns),
+            "zscore": (prices[-1] - mean) / std if std else 0.0,
+            "p10": deciles[0],
+            "p50": deciles[4],
+            "p90": deciles[8],
+        }
+    return results
+
+
+def per_item_trends(names: list[str]) -> None:
+    """The existing trend analysis called once per item."""
+    for name in names:
+        analysis.analyze_item_trend(name, 100.0)
+
+
+def main():
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    n_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        now = database.to_epoch(datetime.now(timezone.utc))
+
+        start = time.perf_counter()
+        names = populate_history(n_items, n_samples, now, days=DAYS)
+        print(
+            f"Built {n_items} items x {n_samples} samples in "
+            f"{time.perf_counter() - start:.1f}s "
+            f"({os.path.getsize(database.DB_FILE) / 1e6:.0f} MB)"
+        )
+
+        print(f"{'mode':<44}{'time (s)':>10}")
+        for label, func in (
+            (
+                "analyze_item_trend, per item (rollups)",
+                lambda: per_item_trends(names),
+            ),
+            (
+                "statistics, per item (Python loops)",
+                lambda: per_item_statistics(names),
+            ),
+            (
+                "analytics.summarize, hourly grid",
+                lambda: analytics.summarize(
+                    names, days=DAYS, recent_days=RECENT_DAYS
+                ),
+            ),
+            (
+                "analytics.summarize, 5-minute grid",
+                lambda: analytics.summarize(
+                    names, days=DAYS, recent_days=RECENT_DAYS, step_seconds=300
+                ),
+            ),
+        ):
+            start = time.perf_counter()
+            func()
+            print(f"{label:<44}{time.perf_counter() - start:>10.2f}")
+
+        database.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares keeping the Skinport catalog as a Python dict against the
+memory-mapped catalog index: memory held per worker, time to load the
+catalog in a new worker, and time to price one inventory.
+
+Usage:
+    python -m benchmarks.bench_catalog_index [catalog_size] [inventory_size]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import catalog_index
+from benchmarks.synthetic import item_name
+
+
+def measure(func):
+    """Returns (result, seconds, bytes still allocated by the result)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def price_inventory(catalog, item_names: list[str]) -> dict[str, float]:
+    """The lookup done by price_fetcher.get_prices_from_skinport."""
+    prices = {}
+    for name in item_names:
+        price = catalog.get(name)
+        if price is not None:
+            prices[name] = price
+    return prices
+
+
+def main():
+    catalog_size = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    inventory_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    rng = random.Random(3)
+    prices = {
+        item_name(i): round(rng.uniform(0.03, 2500.0), 2)
+        for i in range(catalog_size)
+    }
+    inventory = [
+        item_name(i) for i in rng.sample(range(catalog_size), inventory_size)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "catalog.json")
+        index_path = os.path.join(tmp, "catalog.idx")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"prices": prices, "fetched_at": time.time()}, f)
+        catalog_index.write_index(
+            index_path, prices, {"fetched_at": time.time()}
+        )
+
+        def load_json():
+            with open(json_path, encoding="utf-8") as f:
+                return json.load(f)["prices"]
+
+        as_dict, dict_load, dict_memory = measure(load_json)
+        index, index_load, index_memory = measure(
+            lambda: catalog_index.CatalogIndex(index_path)
+        )
+        assert price_inventory(as_dict, inventory) == price_inventory(
+            index, inventory
+        )
+
+        print(
+            f"Catalog: {catalog_size} items; JSON cache "
+            f"{os.path.getsize(json_path) / 1e6:.1f} MB, index "
+            f"{os.path.getsize(index_path) / 1e6:.1f} MB; "
+            f"inventory: {inventory_size} items"
+        )
+        print(
+            f"{'mode':<16}{'load (ms)':>12}{'held (MB)':>12}"
+            f"{'lookup (ms)':>14}"
+        )
+        for label, catalog, load, memory in (
+            ("dict from JSON", as_dict, dict_load, dict_memory),
+            ("catalog index", index, index_load, index_memory),
+        ):
+            start = time.perf_counter()
+            price_inventory(catalog, inventory)
+            lookup = time.perf_counter() - start
+            print(
+                f"{label:<16}{load * 1000:>12.1f}{memory / 1e6:>12.2f}"
+                f"{lookup * 1000:>14.2f}"
+            )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares the memory and latency of decoding the Skinport catalog in one go
+(the previous `response.json()` approach) against the streaming decoder.
+
+Usage:
+    python -m benchmarks.bench_catalog_parse [catalog_size] [inventory_size]
+"""
+
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import price_fetcher
+from benchmarks.synthetic import item_name, make_catalog
+
+
+def iter_chunks(body: bytes, size: int = price_fetcher.STREAM_CHUNK_SIZE):
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+def parse_all_at_once(body: bytes, item_names: list[str]) -> dict[str, float]:
+    """The previous implementation: full decode, full lookup table, filter."""
+    all_items = json.loads(body)
+    skinport_prices = {
+        item["market_hash_name"]: item.get("suggested_price")
+        for item in all_items
+    }
+    return {
+        name: float(skinport_prices[name])
+        for name in item_names
+        if skinport_prices.get(name) is not None
+    }
+
+
+def parse_streaming_filtered(
+    body: bytes, item_names: list[str]
+) -> dict[str, float]:
+    wanted = set(item_names)
+    return {
+        item["market_hash_name"]: float(item["suggested_price"])
+        for item in price_fetcher._iter_json_array(iter_chunks(body))
+        if item["market_hash_name"] in wanted
+        and item.get("suggested_price") is not None
+    }
+
+
+def parse_streaming_projected(
+    body: bytes, item_names: list[str]
+) -> dict[str, float]:
+    return {
+        item["market_hash_name"]: float(item["suggested_price"])
+        for item in price_fetcher._iter_json_array(iter_chunks(body))
+        if item.get("suggested_price") is not None
+    }
+
+
+def measure(func, *args) -> tuple[float, int]:
+    """
+    Returns (seconds, peak traced bytes) for a call. Timing and memory are
+    measured in separate runs because tracing allocations slows code down.
+    """
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    catalog_size = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    inventory_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    body = make_catalog(catalog_size)
+    rng = random.Random(2)
+    item_names = [
+        item_name(i) for i in rng.sample(range(catalog_size), inventory_size)
+    ]
+
+    # Sanity check: every mode must agree on the requested items.
+    expected = parse_all_at_once(body, item_names)
+    assert parse_streaming_filtered(body, item_names) == expected
+    projected = parse_streaming_projected(body, item_names)
+    assert {name: projected[name] for name in expected} == expected
+
+    print(
+        f"Catalog: {catalog_size} items ({len(body) / 1e6:.1f} MB), "
+        f"inventory: {inventory_size} items"
+    )
+    print(f"{'mode':<28}{'time (ms)':>12}{'peak (MB)':>12}")
+    for label, func in (
+        ("json.loads + lookup dict", parse_all_at_once),
+        ("streaming, filtered", parse_streaming_filtered),
+        ("streaming, name->price", parse_streaming_projected),
+    ):
+        elapsed, peak = measure(func, body, item_names)
+        print(f"{label:<28}{elapsed * 1000:>12.1f}{peak / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
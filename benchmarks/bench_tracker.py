@@ -0,0 +1,340 @@
+"""
+Runs the whole tracker end to end against a local stub of the Skinport and
+Steam APIs, with synthetic catalogs, inventories and price history.
+
+Each scenario is run twice: cold (empty caches, everything downloaded) and
+warm (catalog in memory, inventory cached in the database). For each run it
+reports the time spent in every stage, the size of the database and, with
+--trace-memory, the peak memory allocated while tracking (tracemalloc
+slows Python code down a lot, so stage times are not comparable with runs
+without it). The inventory and catalog stages overlap, as they are fetched
+concurrently.
+
+Results can be saved as JSON and compared with a previous run; the process
+exits with status 1 if any stage got slower than the tolerance allows.
+
+Usage:
+    python -m benchmarks.bench_tracker [--quick] [--scenario NAME]
+        [--trace-memory] [--json results.json] [--baseline baseline.json]
+        [--tolerance 0.25]
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import analysis
+import database
+import price_fetcher
+import price_writer
+import steam_client
+import tracker
+from benchmarks.synthetic import make_catalog, make_inventory, populate_history
+from benchmarks.upstream_stub import UpstreamStub
+
+STEAM_ID = "76561198000000000"
+
+# catalog: items in the Skinport catalog; assets: items in the inventory;
+# history_rows: rows of price_history, spread over the whole catalog.
+SCENARIOS = {
+    "small": {"catalog": 1_000, "assets": 10, "history_rows": 100_000},
+    "medium": {"catalog": 10_000, "assets": 1_000, "history_rows": 1_000_000},
+    "large": {"catalog": 50_000, "assets": 10_000, "history_rows": 2_000_000},
+}
+QUICK_SCENARIOS = ["small"]
+
+# Stage name -> (module, function name) of the function timed for it.
+STAGES = {
+    "inventory": (steam_client, "get_inventory_quantities"),
+    "catalog": (price_fetcher, "prefetch_catalog"),
+    "prices": (price_fetcher, "fetch_all_prices"),
+    "save": (price_writer, "save_prices"),
+    "trends": (analysis, "analyze_items_trend"),
+    "stats": (tracker, "_compute_stats"),
+    "results": (tracker, "_build_results"),
+}
+
+# Stage times below this many seconds are not checked against the baseline,
+# as their noise is larger than any regression worth reporting.
+NOISE_FLOOR_SECONDS = 0.005
+
+
+@contextlib.contextmanager
+def stage_timers(timings: dict[str, float]):
+    """Adds the time spent in each stage function to `timings` while active."""
+
+    def timed(name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = (
+                    timings.get(name, 0.0) + time.perf_counter() - start
+                )
+
+        return wrapper
+
+    originals = []
+    for name, (module, attribute) in STAGES.items():
+        original = getattr(module, attribute)
+        originals.append((module, attribute, original))
+        setattr(module, attribute, timed(name, original))
+    try:
+        yield
+    finally:
+        for module, attribute, original in originals:
+            setattr(module, attribute, original)
+
+
+def database_size() -> int:
+    """Size of the database file and its write-ahead log, in bytes."""
+    size = 0
+    for path in (database.DB_FILE, database.DB_FILE + "-wal"):
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident memory of this process so far, or None if unknown."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def track_once(stub: UpstreamStub, trace_memory: bool = False) -> dict:
+    """Runs the tracker once and measures it."""
+    timings = {}
+    requests_before = dict(stub.requests)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with stage_timers(timings), contextlib.redirect_stdout(io.StringIO()):
+        items, results, error = tracker.run_tracker(STEAM_ID, currency="USD")
+    timings["total"] = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    if error:
+        print(f"  warning: the tracker reported an error: {error}")
+    return {
+        "stages": timings,
+        "items": len(items),
+        "priced": sum(
+            1 for r in results.values() if r["current_price"] is not None
+        ),
+        "peak_mb": peak,
+        "db_mb": database_size() / 1e6,
+        "requests": {
+            kind: count - requests_before.get(kind, 0)
+            for kind, count in stub.requests.items()
+        },
+    }
+
+
+def run_scenario(
+    name: str, sizes: dict, latency: float, trace_memory: bool = False
+) -> dict:
+    """
+    Builds the synthetic data of a scenario and tracks it cold, then warm.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.create_tables()
+        price_fetcher.clear_catalog_cache()
+        tracker.clear_result_cache()
+
+        start = time.perf_counter()
+        now = database.to_epoch(datetime.now(timezone.utc))
+        samples = max(sizes["history_rows"] // sizes["catalog"], 1)
+        populate_history(sizes["catalog"], samples, now)
+        catalog = make_catalog(sizes["catalog"])
+        inventory = make_inventory(sizes["assets"], sizes["catalog"])
+        print(
+            f"{name}: {sizes['catalog']} catalog items "
+            f"({len(catalog) / 1e6:.1f} MB), {sizes['assets']} assets, "
+            f"{sizes['catalog'] * samples} history rows "
+            f"(built in {time.perf_counter() - start:.1f}s)"
+        )
+
+        with UpstreamStub(catalog, latency_seconds=latency) as stub:
+            stub.add_inventory(STEAM_ID, *inventory)
+            saved_urls = (
+                price_fetcher.SKINPORT_API_URL,
+                steam_client.STEAM_INVENTORY_URL,
+            )
+            price_fetcher.SKINPORT_API_URL = stub.skinport_url
+            steam_client.STEAM_INVENTORY_URL = stub.steam_inventory_url
+            try:
+                runs = {
+                    "cold": track_once(stub, trace_memory),
+                    "warm": track_once(stub, trace_memory),
+                }
+            finally:
+                (
+                    price_fetcher.SKINPORT_API_URL,
+                    steam_client.STEAM_INVENTORY_URL,
+                ) = saved_urls
+
+        database.close_connection()
+        price_fetcher.clear_catalog_cache()
+    return runs
+
+
+def print_report(results: dict):
+    """Prints the per-stage times (in ms) and memory of every run."""
+    stages = list(STAGES) + ["total"]
+    header = f"{'scenario':<16}" + "".join(f"{stage:>11}" for stage in stages)
+    print(header + f"{'peak MB':>10}{'DB MB':>9}")
+    for scenario, runs in results.items():
+        for run, measured in runs.items():
+            row = f"{scenario + '/' + run:<16}"
+            for stage in stages:
+                seconds = measured["stages"].get(stage)
+                row += (
+                    f"{'-':>11}"
+                    if seconds is None
+                    else f"{seconds * 1000:>11.1f}"
+                )
+            peak = measured["peak_mb"]
+            row += f"{'-':>10}" if peak is None else f"{peak:>10.1f}"
+            print(row + f"{measured['db_mb']:>9.1f}")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS of the benchmark process: {rss:.0f} MB")
+
+
+def find_regressions(
+    results: dict, baseline: dict, tolerance: float
+) -> list[str]:
+    """
+    Compares stage times and peak memory with a baseline.
+
+    Returns:
+        A description of every measurement that exceeds its baseline value
+        by more than `tolerance` (a fraction, e.g. 0.25 for 25%).
+    """
+    regressions = []
+    for scenario, runs in results.items():
+        for run, measured in runs.items():
+            previous = baseline.get(scenario, {}).get(run)
+            if previous is None:
+                continue
+            checks = [
+                (f"{stage} time", seconds, previous["stages"].get(stage), "s")
+                for stage, seconds in measured["stages"].items()
+                if max(seconds, previous["stages"].get(stage) or 0)
+                >= NOISE_FLOOR_SECONDS
+            ]
+            if measured["peak_mb"] is not None:
+                checks.append(
+                    (
+                        "peak memory",
+                        measured["peak_mb"],
+                        previous.get("peak_mb"),
+                        " MB",
+                    )
+                )
+            for label, value, before, unit in checks:
+                if before and value > before * (1 + tolerance):
+                    regressions.append(
+                        f"{scenario}/{run} {label}: {value:.3f}{unit} "
+                        f"(baseline {before:.3f}{unit}, "
+                        f"+{value / before - 1:.0%})"
+                    )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--quick", action="store_true", help="only run the small scenario"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run (repeatable; default: all)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds of simulated network latency per request",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help=(
+            "measure peak allocations with tracemalloc "
+            "(slows the stages down)"
+        ),
+    )
+    parser.add_argument(
+        "--json", metavar="PATH", help="save the results as JSON"
+    )
+    parser.add_argument(
+        "--baseline", metavar="PATH", help="JSON results to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline (default: 0.25)",
+    )
+    args = parser.parse_args()
+
+    names = args.scenario or (
+        QUICK_SCENARIOS if args.quick else list(SCENARIOS)
+    )
+    # Measure the request path only: no write-behind thread, no result cache.
+    price_writer.WRITE_BEHIND = False
+    tracker.RESULT_CACHE_TTL_SECONDS = 0
+
+    results = {
+        name: run_scenario(
+            name, SCENARIOS[name], args.latency, args.trace_memory
+        )
+        for name in names
+    }
+    print()
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(
+                f"\n{len(regressions)} regression(s) against {args.baseline}:"
+            )
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Generators of synthetic upstream payloads and databases for benchmarks.
+
+Item names are shared by every generator, so inventories and price
+history refer to items that exist in the synthetic catalog.
+"""
+
+import json
+import random
+
+import numpy as np
+
+import database
+
+
+def item_name(index: int) -> str:
+    """Returns the market_hash_name of synthetic item number `index`."""
+    return f"Synthetic Skin {index} | Finish {index % 97} (Field-Tested)"
+
+
+def make_catalog(size: int) -> bytes:
+    """Builds a synthetic Skinport /v1/items response body."""
+    rng = random.Random(730)
+    items = []
+    for i in range(size):
+        price = round(rng.uniform(0.03, 2500.0), 2)
+        items.append(
+            {
+                "market_hash_name": item_name(i),
+                "currency": "USD",
+                "suggested_price": price,
+                "item_page": f"https://skinport.com/item/synthetic-skin-{i}",
+                "market_page": f"https://skinport.com/market?item={i}",
+                "min_price": round(price * 0.9, 2),
+                "max_price": round(price * 1.4, 2),
+                "mean_price": round(price * 1.05, 2),
+                "median_price": price,
+                "quantity": rng.randint(1, 400),
+                "created_at": 1535988253,
+                "updated_at": 1700000000 + i,
+            }
+        )
+    return json.dumps(items).encode("utf-8")
+
+
+def make_inventory(
+    asset_count: int, catalog_size: int, unique_items: int | None = None
+) -> tuple[list[dict], list[dict]]:
+    """
+    Builds the assets and descriptions of a synthetic Steam inventory.
+
+    Args:
+        asset_count: The number of assets (owned items).
+        catalog_size: Items are picked among the first `catalog_size`
+                      catalog items.
+        unique_items: How many different items the assets are spread over.
+                      Defaults to a third of the assets.
+
+    Returns:
+        A tuple of (assets, descriptions) as found in inventory pages.
+        Every fifth description is untradable.
+    """
+    if unique_items is None:
+        unique_items = max(asset_count // 3, 1)
+    rng = random.Random(asset_count)
+    picked = rng.sample(range(catalog_size), min(unique_items, catalog_size))
+    descriptions = [
+        {
+            "classid": str(1000 + n),
+            "instanceid": "0",
+            "market_hash_name": item_name(index),
+            "tradable": 0 if n % 5 == 0 else 1,
+            "marketable": 1,
+            "type": "Classified Rifle",
+            "tags": [
+                {"category": "Type", "localized_tag_name": "Rifle"},
+                {"category": "Rarity", "localized_tag_name": "Classified"},
+                {"category": "Exterior", "localized_tag_name": "Field-Tested"},
+            ],
+        }
+        for n, index in enumerate(picked)
+    ]
+    assets = [
+        {
+            "assetid": str(10_000_000 + n),
+            "classid": str(1000 + rng.randrange(len(picked))),
+            "instanceid": "0",
+            "amount": "1",
+        }
+        for n in range(asset_count)
+    ]
+    return assets, descriptions
+
+
+def inventory_page(
+    assets: list[dict],
+    descriptions: list[dict],
+    count: int,
+    start_assetid: str | None = None,
+) -> dict:
+    """Builds one steamcommunity.com/inventory page of an inventory."""
+    start = 0
+    if start_assetid is not None:
+        ids = [asset["assetid"] for asset in assets]
+        start = ids.index(start_assetid) + 1
+
+    page = assets[start : start + count]
+    classids = {asset["classid"] for asset in page}
+    body = {
+        "success": 1,
+        "assets": page,
+        "descriptions": [d for d in descriptions if d["classid"] in classids],
+        "total_inventory_count": len(assets),
+    }
+    if start + count < len(assets):
+        body["more_items"] = 1
+        body["last_assetid"] = page[-1]["assetid"]
+    return body
+
+
+def populate_history(
+    n_items: int, n_samples: int, now: int, days: int = 30
+) -> list[str]:
+    """
+    Fills the database with random-walk prices: n_samples evenly spaced
+    prices per item over the last `days` days, bulk-loaded with
+    database.import_price_history.
+
+    Returns:
+        The names of the items.
+    """
+    names = [item_name(i) for i in range(n_items)]
+    spacing = days * database.SECONDS_PER_DAY // n_samples
+    timestamps = (now - spacing * np.arange(n_samples, 0, -1)).tolist()
+    rng = np.random.default_rng(730)
+
+    def rows():
+        for name in names:
+            start_price = rng.uniform(1.0, 500.0)
+            walk = start_price * np.exp(
+                np.cumsum(rng.normal(0, 0.002, n_samples))
+            )
+            for ts_epoch, price in zip(timestamps, np.round(walk, 2).tolist()):
+                yield name, "skinport", ts_epoch, price
+
+    database.import_price_history(rows())
+    return names
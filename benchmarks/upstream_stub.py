@@ -0,0 +1,163 @@
+"""
+A local HTTP server standing in for the Skinport and Steam APIs.
+
+It serves a synthetic catalog at /v1/items (with an ETag, answering
+conditional requests with 304) and paginated inventories at
+/inventory/<steam_id>/730/2, so the whole tracker can be run against it
+without network access.
+
+Usage:
+    with UpstreamStub(catalog=make_catalog(10_000)) as stub:
+        stub.add_inventory("76561198000000000", *make_inventory(1_000, 10_000))
+        price_fetcher.SKINPORT_API_URL = stub.skinport_url
+        steam_client.STEAM_INVENTORY_URL = stub.steam_inventory_url
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.synthetic import inventory_page
+
+INVENTORY_PATH = re.compile(r"^/inventory/(?P<steam_id>\d+)/730/2$")
+DEFAULT_PAGE_SIZE = 2000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable.
+
+    def _send(
+        self, status: int, body: bytes = b"", headers: dict | None = None
+    ):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        query = {
+            key: values[-1] for key, values in parse_qs(url.query).items()
+        }
+        stub.record(url.path)
+        if stub.latency_seconds:
+            time.sleep(stub.latency_seconds)
+
+        if url.path == "/v1/items":
+            if self.headers.get("If-None-Match") == stub.catalog_etag:
+                self._send(304, headers={"ETag": stub.catalog_etag})
+                return
+            self._send(
+                200,
+                stub.catalog,
+                {
+                    "Content-Type": "application/json",
+                    "ETag": stub.catalog_etag,
+                },
+            )
+            return
+
+        match = INVENTORY_PATH.match(url.path)
+        inventory = match and stub.inventories.get(match.group("steam_id"))
+        if not inventory:
+            self._send(403, b"null", {"Content-Type": "application/json"})
+            return
+        page = inventory_page(
+            *inventory,
+            count=int(query.get("count", DEFAULT_PAGE_SIZE)),
+            start_assetid=query.get("start_assetid"),
+        )
+        self._send(
+            200,
+            json.dumps(page).encode("utf-8"),
+            {"Content-Type": "application/json"},
+        )
+
+
+class UpstreamStub:
+    """
+    Serves synthetic upstream payloads on a free local port, from a
+    background thread. Use it as a context manager.
+
+    Args:
+        catalog: The body of the /v1/items response (see make_catalog).
+        latency_seconds: Delay added before every answer, to simulate the
+                         network round trip.
+    """
+
+    def __init__(self, catalog: bytes = b"[]", latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.inventories = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.set_catalog(catalog)
+
+    def set_catalog(self, catalog: bytes):
+        """Replaces the catalog; its ETag changes with its content."""
+        self.catalog = catalog
+        self.catalog_etag = '"' + hashlib.sha1(catalog).hexdigest() + '"'
+
+    def add_inventory(
+        self, steam_id: str, assets: list[dict], descriptions: list[dict]
+    ):
+        """Serves an inventory (see make_inventory) for a SteamID."""
+        self.inventories[steam_id] = (assets, descriptions)
+
+    def record(self, path: str):
+        """Counts a request to a path."""
+        kind = "skinport" if path == "/v1/items" else "steam"
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def skinport_url(self) -> str:
+        """Drop-in value for price_fetcher.SKINPORT_API_URL."""
+        return self.base_url + "/v1/items"
+
+    @property
+    def steam_inventory_url(self) -> str:
+        """Drop-in value for steam_client.STEAM_INVENTORY_URL."""
+        return self.base_url + "/inventory/{steam_id}/730/2"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="upstream-stub",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
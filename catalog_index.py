@@ -0,0 +1,220 @@
+"""
+Compact, memory-mapped storage for a price catalog.
+
+A catalog ({market_hash_name: price}) is written as one binary file of
+sorted names and a packed array of prices, which is then memory-mapped
+read-only. Every worker process mapping the same file shares a single
+page-cached copy, and looking up an item binary-searches the sorted names
+without loading the rest of the catalog into Python objects.
+
+File layout (little-endian):
+    header    -- magic b"CSCI", format version, item count, metadata length
+    metadata  -- JSON object (e.g. 'fetched_at', 'etag'), padded to 8 bytes
+    prices    -- float64 per item, in name order
+    offsets   -- uint32 per item plus one: where each name starts in `names`
+    names     -- the UTF-8 encoded names, sorted bytewise, back to back
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping
+
+MAGIC = b"CSCI"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sIII")
+
+
+def _pad(length: int) -> int:
+    """Bytes needed to align `length` to 8 bytes."""
+    return -length % 8
+
+
+def write_index(
+    path: str, prices: dict[str, float], metadata: dict | None = None
+):
+    """
+    Writes a catalog as an index file, replacing any previous one atomically
+    (processes that mapped the old file keep reading it until they reopen).
+
+    Args:
+        path: Where to write the index.
+        prices: The catalog, as {market_hash_name: price}.
+        metadata: JSON-serializable values stored with the catalog.
+
+    Raises:
+        OSError: If the file cannot be written.
+    """
+    encoded = sorted(
+        (name.encode("utf-8"), float(price)) for name, price in prices.items()
+    )
+    meta = json.dumps(metadata or {}).encode("utf-8")
+
+    offsets = [0]
+    for name, _ in encoded:
+        offsets.append(offsets[-1] + len(name))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded), len(meta)))
+        f.write(meta + b"\0" * _pad(_HEADER.size + len(meta)))
+        f.write(
+            struct.pack(f"<{len(encoded)}d", *(price for _, price in encoded))
+        )
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(name for name, _ in encoded))
+    os.replace(tmp_path, path)
+
+
+class CatalogIndex(Mapping):
+    """
+    A read-only {market_hash_name: price} mapping backed by an index file.
+
+    Lookups decode only the names they compare against, so finding the
+    prices of an inventory costs O(k log n) and allocates nothing per
+    catalog item. Iterating decodes every name.
+
+    Raises:
+        OSError: If the file cannot be opened.
+        ValueError: If it is not a valid index file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise ValueError(f"{path} is not a catalog index.")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, meta_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(
+                f"{path} is not a catalog index (version {FORMAT_VERSION})."
+            )
+
+        meta_end = _HEADER.size + meta_length
+        prices_start = meta_end + _pad(meta_end)
+        offsets_start = prices_start + 8 * count
+        self._names_start = offsets_start + 4 * (count + 1)
+        if self._names_start > size:
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated.")
+
+        self.metadata = json.loads(self._mmap[_HEADER.size : meta_end])
+        self._count = count
+        # Typed views over the mapped arrays; the file is little-endian, so
+        # other machines decode them with struct instead.
+        if sys.byteorder == "little":
+            view = memoryview(self._mmap)
+            self._prices = view[prices_start:offsets_start].cast("d")
+            self._offsets = view[offsets_start : self._names_start].cast("I")
+            view.release()
+        else:
+            self._prices = struct.unpack_from(
+                f"<{count}d", self._mmap, prices_start
+            )
+            self._offsets = struct.unpack_from(
+                f"<{count + 1}I", self._mmap, offsets_start
+            )
+
+    def _name_bytes(self, position: int) -> bytes:
+        start, offsets = self._names_start, self._offsets
+        return self._mmap[
+            start + offsets[position] : start + offsets[position + 1]
+        ]
+
+    def _price(self, position: int) -> float:
+        return self._prices[position]
+
+    def _find(self, name: str) -> int:
+        """Returns the position of a name, or -1 if it is not in the index."""
+        key = name.encode("utf-8")
+        names, offsets, start = self._mmap, self._offsets, self._names_start
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if (
+                names[start + offsets[middle] : start + offsets[middle + 1]]
+                < key
+            ):
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._name_bytes(low) == key:
+            return low
+        return -1
+
+    def __getitem__(self, name: str) -> float:
+        position = self._find(name) if isinstance(name, str) else -1
+        if position < 0:
+            raise KeyError(name)
+        return self._price(position)
+
+    def get(self, name, default=None):
+        # Same as the Mapping default, without raising KeyError on misses.
+        position = self._find(name) if isinstance(name, str) else -1
+        return self._price(position) if position >= 0 else default
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self._find(name) >= 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self._name_bytes(position).decode("utf-8")
+
+    def items(self):
+        # Faster than the Mapping default, which searches for every name.
+        for position in range(self._count):
+            yield self._name_bytes(position).decode("utf-8"), self._price(
+                position
+            )
+
+    def lookup(self, names) -> dict[str, float]:
+        """Returns the prices of the given names that are in the catalog."""
+        prices = {}
+        for name in names:
+            position = self._find(name)
+            if position >= 0:
+                prices[name] = self._price(position)
+        return prices
+
+    def close(self):
+        """Unmaps the file. The index must not be used afterwards."""
+        for view in (self._prices, self._offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+    def __repr__(self) -> str:
+        return f"<CatalogIndex {self.path!r}: {self._count} items>"
+
+
+def open_index(path: str) -> CatalogIndex | None:
+    """Opens an index file, or returns None if it is missing or invalid."""
+    try:
+        return CatalogIndex(path)
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    # Prints the size of an index file and looks up the names given after
+    # it, e.g.:
+    # python catalog_index.py /tmp/skinport_catalog_USD.idx \
+    #     "AK-47 | Redline (Field-Tested)"
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python catalog_index.py <index file> [item name]...")
+    index = open_index(sys.argv[1])
+    if index is None:
+        sys.exit(f"{sys.argv[1]} is not a valid catalog index.")
+    size_kib = os.path.getsize(sys.argv[1]) / 1024
+    print(f"{len(index)} items, {size_kib:.0f} KiB, {index.metadata}")
+    for item_name in sys.argv[2:]:
+        print(f" -> {item_name}: {index.get(item_name, 'not found')}")
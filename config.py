@@ -16,14 +16,16 @@ def get_config() -> tuple[str, bool]:
         ValueError: If the STEAM_ID environment variable is not set.
     """
     # In a Vercel environment, these are set in the project settings.
-    # For local development, you can set them in your shell before running the app.
+    # For local development, you can set them in your shell before running
+    # the app.
     # Example: export STEAM_ID="your_id_here"
 
     steam_id = os.environ.get("STEAM_ID")
     if not steam_id:
         raise ValueError(
             "The 'STEAM_ID' environment variable is not set. "
-            "Please set it in your Vercel project settings or in your local shell."
+            "Please set it in your Vercel project settings or in your local "
+            "shell."
         )
 
     # The value will be a string 'true' or 'false', so we check against 'true'.
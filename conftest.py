@@ -0,0 +1,11 @@
+import pytest
+
+import database
+
+
+@pytest.fixture(autouse=True)
+def db(tmp_path, monkeypatch):
+    """Points the database module at an empty, temporary database."""
+    monkeypatch.setattr(
+        database, "DB_FILE", str(tmp_path / "price_history.db")
+    )
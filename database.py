@@ -1,86 +1,1196 @@
 """
 Handles all database operations for the price tracker.
 Uses SQLite for simple, file-based storage.
+
+Schema (version 8):
+    items           -- interned item names: (id, name)
+    sources         -- interned price source names: (id, name)
+    price_history   -- (item_id, source_id, ts_epoch, price), clustered on
+                       its primary key so range scans are index-only
+    price_daily     -- per-item, per-source, per-day (UTC) aggregates of
+                       price_history
+    latest_prices   -- the last price persisted for each item and source
+    inventory_cache -- the last raw inventory downloaded for each SteamID
+    fx_rates        -- exchange rates from the base currency, per currency
+    snapshot_runs   -- one row per scheduled catalog snapshot
+    portfolio_holdings -- the items each SteamID holds, with the price last
+                       applied to each
+    portfolio_values   -- (steam_id, ts_epoch, value): each SteamID's
+                       inventory value whenever it changed
+    schema_version  -- the version of the schema above
+
+Each thread keeps one tuned connection (WAL journal, relaxed fsync, larger
+page cache, memory-mapped reads) that is re-used across calls, and the
+schema is set up once per process the first time a database is opened.
+The schema version is also stored as PRAGMA user_version, so opening an
+up-to-date database only reads its header.
 """
 
+import itertools
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import os
+import sys
+import threading
+import time
+
+import metrics
 
 # In a serverless environment like Vercel, only the /tmp directory is writable.
 DB_FILE = os.path.join("/tmp", "price_history.db")
 
+# Connection tuning. The page cache is given in KiB per connection.
+CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_KIB", "16384"))
+MMAP_SIZE_BYTES = int(
+    os.environ.get("SQLITE_MMAP_BYTES", str(64 * 1024 * 1024))
+)
+# How long a writer waits for another writer to finish before giving up.
+BUSY_TIMEOUT_SECONDS = 10.0
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_FILE)
+SCHEMA_VERSION = 8
+
+# Change-only storage: when enabled, a price is only added to price_history
+# if it differs from the last one persisted for the same item and source,
+# or if that one is older than PRICE_HEARTBEAT_SECONDS. History is read as
+# a step function (each price holds until the next one), so averages
+# weighted by time are unaffected.
+PRICE_DEDUP = os.environ.get("PRICE_DEDUP", "true").lower() == "true"
+PRICE_HEARTBEAT_SECONDS = int(
+    os.environ.get("PRICE_HEARTBEAT_SECONDS", "3600")
+)
+
+SECONDS_PER_DAY = 86400
+
+# How long count_rows re-uses the row counts it reports to /metrics.
+ROW_COUNT_TTL_SECONDS = float(os.environ.get("METRICS_ROW_COUNT_TTL", "300"))
+
+# Before schema v5, prices were stored in whichever currency each request
+# asked for, so they cannot be read as base-currency prices. The v5
+# migration moves them to sources named "<source>:legacy" (kept, but no
+# longer read), unless PRICE_LEGACY_IN_BASE says they were all fetched in
+# the base currency.
+LEGACY_PRICES_IN_BASE = (
+    os.environ.get("PRICE_LEGACY_IN_BASE", "false").lower() == "true"
+)
+LEGACY_SOURCE_SUFFIX = ":legacy"
+
+# The price source portfolio values are computed from.
+PORTFOLIO_SOURCE = "skinport"
+
+# SQLite caps the number of bound parameters per statement, so lookups by
+# name are done in chunks of this many names.
+MAX_NAMES_PER_QUERY = 500
+# import_price_history inserts rows in batches of this many.
+IMPORT_BATCH_ROWS = 50_000
+
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+# Database paths whose schema has been checked by this process.
+_schema_ready = set()
+# Database path -> (time.monotonic(), counts) of the last count_rows call.
+_row_counts = {}
+_row_counts_lock = threading.Lock()
+
+
+def _open_connection(path: str):
+    """Opens and tunes a new connection, setting up the schema if needed."""
+    if not os.path.exists(path):
+        # Leftovers from a deleted database must not be applied to a new one.
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        _schema_ready.discard(path)
+
+    # Autocommit mode: transactions are opened explicitly by transaction().
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    if path not in _schema_ready:
+        with _schema_lock:
+            if path not in _schema_ready:
+                # The version marker in the file header is read without
+                # locking the database, so an up-to-date schema (e.g. after
+                # a cold start) is not checked table by table.
+                marker = conn.execute("PRAGMA user_version").fetchone()[0]
+                if marker != SCHEMA_VERSION:
+                    _setup_schema(conn)
+                _schema_ready.add(path)
     return conn
 
 
-def create_tables():
-    """Creates the necessary database tables if they don't exist."""
+def get_db_connection():
+    """
+    Returns this thread's connection to the SQLite database, opening it on
+    first use. The connection is shared by every caller on the thread, so
+    callers must not close it.
+    """
+    state = getattr(_local, "state", None)
+    if state is not None:
+        path, pid, inode, conn = state
+        if path == DB_FILE and pid == os.getpid():
+            try:
+                if os.stat(path).st_ino == inode:
+                    conn.total_changes  # Raises if it was closed
+                    return conn
+            except (OSError, sqlite3.ProgrammingError):
+                pass
+            conn.close()
+        elif pid == os.getpid():
+            conn.close()
+        # A connection inherited through fork() is dropped without closing.
+
+    conn = _open_connection(DB_FILE)
+    _local.state = (DB_FILE, os.getpid(), os.stat(DB_FILE).st_ino, conn)
+    # Last persisted (price, ts_epoch) per (item_id, source_id), as known to
+    # this connection. Only valid while PRAGMA data_version is unchanged,
+    # i.e. while no other connection has written to the database.
+    _local.last_saved = {"data_version": None, "prices": {}}
+    return conn
+
+
+def close_connection():
+    """Closes this thread's connection, if it has one."""
+    state = getattr(_local, "state", None)
+    _local.state = None
+    if state is not None and state[1] == os.getpid():
+        state[3].close()
+
+
+@contextmanager
+def transaction():
+    """
+    Runs a block inside a write transaction on this thread's connection.
+
+    The transaction takes the write lock up front (BEGIN IMMEDIATE), so
+    concurrent writers wait for each other instead of failing halfway.
+    It is committed if the block succeeds and rolled back otherwise.
+    Nested uses join the outermost transaction.
+
+    Yields:
+        The connection.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    if conn.in_transaction:
+        yield conn
+        return
 
-    # Table to store price history
-    cursor.execute(
-        """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.execute("COMMIT")
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """Converts a datetime (naive values are taken as UTC) to epoch seconds."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp())
+
+
+def epoch_day(ts_epoch: int) -> int:
+    """Returns the UTC day number (days since 1970-01-01) of a timestamp."""
+    return ts_epoch // SECONDS_PER_DAY
+
+
+def _create_schema(cursor):
+    """Creates the current tables and indexes if they don't exist."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+
+    # Table to store price history. Rows are clustered by item, source and
+    # time, so a range read for one item never touches other items' rows.
+    cursor.execute("""
         CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            item_name TEXT NOT NULL,
-            source TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            source_id INTEGER NOT NULL,
+            ts_epoch INTEGER NOT NULL,
+            price REAL NOT NULL,
+            PRIMARY KEY (item_id, source_id, ts_epoch)
+        ) WITHOUT ROWID
+    """)
+
+    # Per-item, per-source, per-day (UTC) aggregates of price_history,
+    # maintained by save_prices so trend lookups read at most one row per day.
+    # first_ts/last_ts are the first and last samples of the day, and 'area'
+    # is the integral of the price (a step function) between them, in
+    # price-seconds, so averages can be weighted by how long prices held.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_daily (
+            item_id INTEGER NOT NULL,
+            source_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            area REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            open REAL NOT NULL,
+            close REAL NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            PRIMARY KEY (item_id, source_id, day)
+        ) WITHOUT ROWID
+    """)
+
+    # The last price persisted per item and source, used to decide whether
+    # a new observation is a change worth storing.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            item_id INTEGER NOT NULL,
+            source_id INTEGER NOT NULL,
             price REAL NOT NULL,
-            timestamp DATETIME NOT NULL
+            ts_epoch INTEGER NOT NULL,
+            PRIMARY KEY (item_id, source_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Raw inventories (assets and descriptions as JSON) per SteamID, so any
+    # combination of filters can be answered without another download.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_cache (
+            steam_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL
+        )
+    """)
+
+    # Units of each currency per unit of the base currency prices are
+    # stored in, and when each rate was last refreshed.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            currency TEXT PRIMARY KEY,
+            rate REAL NOT NULL,
+            updated_at INTEGER NOT NULL
         )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_runs (
+            started_at INTEGER PRIMARY KEY,
+            duration REAL NOT NULL,
+            items INTEGER NOT NULL,
+            rows_written INTEGER NOT NULL
+        )
+    """)
+
+    # Materialized portfolio values: the current holdings of each SteamID
+    # with the last price applied to each (in the base currency), and the
+    # resulting value series, clustered by (steam_id, ts_epoch) so a curve
+    # is one range read. Kept up to date by update_holdings and save_prices.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_holdings (
+            steam_id TEXT NOT NULL,
+            item_id INTEGER NOT NULL REFERENCES items (id),
+            quantity INTEGER NOT NULL,
+            price REAL,
+            price_ts INTEGER,
+            PRIMARY KEY (steam_id, item_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_portfolio_holdings_item "
+        "ON portfolio_holdings (item_id)"
+    )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_values (
+            steam_id TEXT NOT NULL,
+            ts_epoch INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (steam_id, ts_epoch)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"
+    )
+
+
+def _get_schema_version(cursor) -> int:
+    """
+    Returns the schema version of the database: 0 for an empty database and
+    1 for the original layout, which predates the schema_version table.
     """
+    tables = {
+        row[0]
+        for row in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    if "schema_version" in tables:
+        row = cursor.execute(
+            "SELECT MAX(version) FROM schema_version"
+        ).fetchone()
+        if row[0] is not None:
+            return row[0]
+    return 1 if "price_history" in tables else 0
+
+
+def _set_schema_version(cursor, version: int):
+    cursor.execute("DELETE FROM schema_version")
+    cursor.execute(
+        "INSERT INTO schema_version (version) VALUES (?)", (version,)
     )
+    cursor.execute(f"PRAGMA user_version = {int(version)}")
+
 
-    # Create an index for faster lookups by item_name
+def _migrate_v1_to_v2(cursor):
+    """
+    Converts the original price_history(item_name, source, price, timestamp)
+    table to the interned, epoch-based layout and rebuilds the rollups.
+    """
+    cursor.execute("ALTER TABLE price_history RENAME TO price_history_v1")
+    cursor.execute("DROP TABLE IF EXISTS price_daily")
+    _create_schema(cursor)
+
+    cursor.execute(
+        "INSERT OR IGNORE INTO items (name) "
+        "SELECT DISTINCT item_name FROM price_history_v1"
+    )
     cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_item_name ON price_history (item_name)"
+        "INSERT OR IGNORE INTO sources (name) "
+        "SELECT DISTINCT source FROM price_history_v1"
     )
+    # The old timestamps are ISO strings written by the sqlite3 datetime
+    # adapter. Samples falling in the same second collapse into the latest.
+    cursor.execute("""
+        INSERT OR REPLACE INTO price_history
+            (item_id, source_id, ts_epoch, price)
+        SELECT items.id, sources.id,
+               CAST(strftime('%s', h.timestamp) AS INTEGER), h.price
+        FROM price_history_v1 AS h
+        JOIN items ON items.name = h.item_name
+        JOIN sources ON sources.name = h.source
+        WHERE strftime('%s', h.timestamp) IS NOT NULL
+        ORDER BY h.id
+    """)
+    cursor.execute("DROP TABLE price_history_v1")
+    _rebuild_daily_rollups(cursor)
+
+
+def _migrate_v2_to_v3(cursor):
+    """Adds latest_prices, filled from the newest row of each series."""
+    _create_schema(cursor)
+    # SQLite takes the bare 'price' column from the row holding MAX(ts_epoch).
+    cursor.execute("""
+        INSERT OR REPLACE INTO latest_prices
+            (item_id, source_id, price, ts_epoch)
+        SELECT item_id, source_id, price, MAX(ts_epoch)
+        FROM price_history
+        GROUP BY item_id, source_id
+    """)
+
+
+def _migrate_v3_to_v4(cursor):
+    """Adds the inventory_cache table."""
+    _create_schema(cursor)
+
+
+def _migrate_v4_to_v5(cursor):
+    """
+    Adds the fx_rates table. From v5 on prices are stored in the base
+    currency, so older prices are set aside (see LEGACY_PRICES_IN_BASE).
+    """
+    _create_schema(cursor)
+    if LEGACY_PRICES_IN_BASE:
+        return
+
+    sources = [
+        tuple(row) for row in cursor.execute("SELECT id, name FROM sources")
+    ]
+    legacy_ids = _intern_names(
+        cursor, "sources", [name + LEGACY_SOURCE_SUFFIX for _, name in sources]
+    )
+    for source_id, name in sources:
+        legacy_id = legacy_ids[name + LEGACY_SOURCE_SUFFIX]
+        for table in ("price_history", "latest_prices"):
+            cursor.execute(
+                f"UPDATE {table} SET source_id = ? WHERE source_id = ?",
+                (legacy_id, source_id),
+            )
+    _rebuild_daily_rollups(cursor)
+
 
-    conn.commit()
-    conn.close()
+def _migrate_v5_to_v6(cursor):
+    """Adds the snapshot_runs table."""
+    _create_schema(cursor)
+
+
+def _migrate_v6_to_v7(cursor):
+    """Adds the portfolio tables."""
+    _create_schema(cursor)
+
+
+def _migrate_v7_to_v8(cursor):
+    """
+    Rebuilds price_daily with time-weighted areas instead of sums of
+    observations, which did not match price_history once unchanged prices
+    were no longer stored.
+    """
+    cursor.execute("DROP TABLE price_daily")
+    _create_schema(cursor)
+    _rebuild_daily_rollups(cursor)
+
+
+# Maps a schema version to the function upgrading it to the next version.
+_MIGRATIONS = {
+    1: _migrate_v1_to_v2,
+    2: _migrate_v2_to_v3,
+    3: _migrate_v3_to_v4,
+    4: _migrate_v4_to_v5,
+    5: _migrate_v5_to_v6,
+    6: _migrate_v6_to_v7,
+    7: _migrate_v7_to_v8,
+}
+
+
+def _setup_schema(conn):
+    """Creates or migrates the schema on a freshly opened connection."""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        version = _get_schema_version(cursor)
+        migrated = False
+
+        if version == 0:
+            _create_schema(cursor)
+        while 0 < version < SCHEMA_VERSION:
+            print(
+                f"Migrating database schema from v{version} "
+                f"to v{version + 1}..."
+            )
+            _MIGRATIONS[version](cursor)
+            version += 1
+            migrated = True
+        # Also sets the user_version marker of databases checked before it
+        # was introduced.
+        _set_schema_version(cursor, SCHEMA_VERSION)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.execute("COMMIT")
+
+    # Reclaim the space freed by the migration.
+    if migrated:
+        conn.execute("VACUUM")
     print("Database tables checked/created successfully.")
 
 
-def save_prices(price_data: dict[str, dict[str, float]]):
+def create_tables():
+    """
+    Creates the necessary database tables if they don't exist, migrating
+    databases written by older versions of the schema.
+
+    The work is done once per process when the database is first opened,
+    so calling this again is cheap.
+    """
+    get_db_connection()
+
+
+def _rollup_query(where: str = "") -> str:
+    """
+    Builds the INSERT computing price_daily rows from the price_history
+    rows selected by `where`. Each price holds until the next sample of
+    the same day, which gives the area between first_ts and last_ts.
+    """
+    return f"""
+        INSERT OR REPLACE INTO price_daily (item_id, source_id, day, count,
+                                            area, min, max, open, close,
+                                            first_ts, last_ts)
+        SELECT item_id, source_id, day, COUNT(*),
+               SUM(price * (COALESCE(next_ts, ts_epoch) - ts_epoch)),
+               MIN(price), MAX(price), MIN(open), MIN(close), MIN(ts_epoch),
+               MAX(ts_epoch)
+        FROM (
+            SELECT item_id, source_id, ts_epoch, price,
+                   ts_epoch / {SECONDS_PER_DAY} AS day,
+                   LEAD(ts_epoch) OVER w AS next_ts,
+                   FIRST_VALUE(price) OVER w AS open,
+                   LAST_VALUE(price) OVER w AS close
+            FROM price_history
+            {where}
+            WINDOW w AS (
+                PARTITION BY item_id, source_id, ts_epoch / {SECONDS_PER_DAY}
+                ORDER BY ts_epoch
+                ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+            )
+        )
+        GROUP BY item_id, source_id, day
+    """
+
+
+def _rebuild_daily_rollups(cursor) -> int:
+    """Recomputes price_daily from price_history. Returns the row count."""
+    cursor.execute("DELETE FROM price_daily")
+    cursor.execute(_rollup_query())
+    return cursor.rowcount
+
+
+def _refresh_daily_rollups(cursor, keys):
+    """Recomputes the price_daily rows of (item_id, source_id, day) keys."""
+    cursor.executemany(
+        _rollup_query(
+            "WHERE item_id = ? AND source_id = ? "
+            "AND ts_epoch >= ? AND ts_epoch < ?"
+        ),
+        [
+            (
+                item_id,
+                source_id,
+                day * SECONDS_PER_DAY,
+                (day + 1) * SECONDS_PER_DAY,
+            )
+            for item_id, source_id, day in keys
+        ],
+    )
+
+
+def rebuild_daily_rollups() -> int:
+    """
+    Rebuilds the daily rollups from the full price history.
+
+    Use this to backfill rollups for history recorded before they existed,
+    or to repair them after editing price_history by hand. The rollups are
+    a function of price_history alone, so the rebuilt rows match the ones
+    save_prices maintains.
+
+    Returns:
+        The number of rollup rows written.
+    """
+    with transaction() as conn:
+        rows = _rebuild_daily_rollups(conn.cursor())
+    print(f"Rebuilt {rows} daily rollup rows from price history.")
+    return rows
+
+
+def _intern_names(cursor, table: str, names) -> dict[str, int]:
+    """
+    Returns the ids of the given names in an interning table ('items' or
+    'sources'), inserting the names that are not there yet.
+    """
+    names = list(dict.fromkeys(names))
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {table} (name) VALUES (?)",
+        [(name,) for name in names],
+    )
+    return get_ids(cursor, table, names)
+
+
+def get_ids(cursor, table: str, names) -> dict[str, int]:
+    """
+    Looks up the ids of names in an interning table ('items' or 'sources').
+
+    Returns:
+        A dictionary mapping each known name to its id. Unknown names are
+        left out.
+    """
+    names = list(dict.fromkeys(names))
+    ids = {}
+    for i in range(0, len(names), MAX_NAMES_PER_QUERY):
+        chunk = names[i : i + MAX_NAMES_PER_QUERY]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"SELECT id, name FROM {table} WHERE name IN ({placeholders})",
+            chunk,
+        )
+        ids.update({row[1]: row[0] for row in cursor.fetchall()})
+    return ids
+
+
+def get_cached_inventory(steam_id: str) -> tuple[str, int] | None:
+    """
+    Reads the cached raw inventory of a SteamID.
+
+    Returns:
+        A tuple of (payload, fetched_at), where payload is the JSON text
+        stored by save_cached_inventory and fetched_at a Unix timestamp,
+        or None if the SteamID has no cached inventory.
+    """
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT payload, fetched_at FROM inventory_cache WHERE steam_id = ?",
+        (steam_id,),
+    ).fetchone()
+    return (row["payload"], row["fetched_at"]) if row else None
+
+
+def save_cached_inventory(steam_id: str, payload: str, fetched_at: int):
+    """Stores (or replaces) the cached raw inventory of a SteamID."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO inventory_cache "
+            "(steam_id, payload, fetched_at) VALUES (?, ?, ?)",
+            (steam_id, payload, fetched_at),
+        )
+
+
+def get_fx_rate(currency: str) -> tuple[float, int] | None:
+    """Returns the stored (rate, updated_at) of a currency, if any."""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT rate, updated_at FROM fx_rates WHERE currency = ?", (currency,)
+    ).fetchone()
+    return (row["rate"], row["updated_at"]) if row else None
+
+
+def save_fx_rate(currency: str, rate: float, updated_at: int):
+    """Stores (or replaces) the exchange rate of a currency."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO fx_rates (currency, rate, updated_at) "
+            "VALUES (?, ?, ?)",
+            (currency, rate, updated_at),
+        )
+
+
+def record_snapshot_run(
+    started_at: int, duration: float, items: int, rows_written: int
+):
+    """Records a finished catalog snapshot."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshot_runs "
+            "(started_at, duration, items, rows_written) VALUES (?, ?, ?, ?)",
+            (started_at, duration, items, rows_written),
+        )
+
+
+def count_rows() -> dict[str, int]:
+    """
+    Returns the number of rows in each table of the database.
+
+    COUNT(*) reads every table in full, so the counts of each database file
+    are re-used for ROW_COUNT_TTL_SECONDS.
+    """
+    with _row_counts_lock:
+        cached = _row_counts.get(DB_FILE)
+        if cached and time.monotonic() - cached[0] < ROW_COUNT_TTL_SECONDS:
+            return cached[1]
+
+    conn = get_db_connection()
+    tables = [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+    ]
+    counts = {
+        table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        for table in tables
+    }
+    with _row_counts_lock:
+        _row_counts[DB_FILE] = (time.monotonic(), counts)
+    return counts
+
+
+def get_last_snapshot_run() -> dict | None:
+    """
+    Returns the most recent catalog snapshot as a dictionary with the keys
+    'started_at', 'duration', 'items' and 'rows_written', or None if no
+    snapshot was ever taken.
+    """
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT * FROM snapshot_runs ORDER BY started_at DESC LIMIT 1"
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def _portfolio_value(cursor, steam_id: str) -> float | None:
+    """
+    Current value of a SteamID's priced holdings, or None if none is priced.
+    """
+    return cursor.execute(
+        "SELECT SUM(quantity * price) FROM portfolio_holdings "
+        "WHERE steam_id = ?",
+        (steam_id,),
+    ).fetchone()[0]
+
+
+def _record_portfolio_value(cursor, steam_id: str, ts_epoch: int, value):
+    """
+    Adds a point to a SteamID's value series if its value changed.
+
+    Points only move forward in time: a value computed from a late price
+    sample replaces the latest point instead of rewriting older ones.
+    """
+    if value is None:
+        return
+    last = cursor.execute(
+        "SELECT ts_epoch, value FROM portfolio_values WHERE steam_id = ? "
+        "ORDER BY ts_epoch DESC LIMIT 1",
+        (steam_id,),
+    ).fetchone()
+    if last is not None:
+        if abs(last[1] - value) < 1e-9:
+            return
+        ts_epoch = max(ts_epoch, last[0])
+    cursor.execute(
+        "INSERT OR REPLACE INTO portfolio_values (steam_id, ts_epoch, value) "
+        "VALUES (?, ?, ?)",
+        (steam_id, ts_epoch, value),
+    )
+
+
+def _update_portfolios(
+    cursor, rows: list[tuple], source_ids: dict[str, int], ts_epoch: int
+):
+    """
+    Applies newly written (item_id, source_id, price) rows to the holdings
+    that contain those items, and records the new value of every portfolio
+    that changed. Must run inside a transaction.
+    """
+    source_id = source_ids.get(PORTFOLIO_SOURCE)
+    if source_id is None:
+        return
+    prices = {
+        item_id: price for item_id, src, price in rows if src == source_id
+    }
+    item_ids = list(prices)
+
+    # Only the holdings of the changed items are read, through
+    # idx_portfolio_holdings_item.
+    updates = []
+    for i in range(0, len(item_ids), MAX_NAMES_PER_QUERY):
+        chunk = item_ids[i : i + MAX_NAMES_PER_QUERY]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            "SELECT steam_id, item_id, price, price_ts "
+            f"FROM portfolio_holdings WHERE item_id IN ({placeholders})",
+            chunk,
+        )
+        for steam_id, item_id, price, price_ts in cursor.fetchall():
+            # Older samples than the applied price, or the same price again,
+            # do not change the portfolio.
+            if price_ts is not None and ts_epoch < price_ts:
+                continue
+            if price == prices[item_id]:
+                continue
+            updates.append((prices[item_id], ts_epoch, steam_id, item_id))
+    if not updates:
+        return
+
+    cursor.executemany(
+        "UPDATE portfolio_holdings SET price = ?, price_ts = ? "
+        "WHERE steam_id = ? AND item_id = ?",
+        updates,
+    )
+    for steam_id in dict.fromkeys(update[2] for update in updates):
+        _record_portfolio_value(
+            cursor, steam_id, ts_epoch, _portfolio_value(cursor, steam_id)
+        )
+
+
+def update_holdings(
+    steam_id: str,
+    quantities: dict[str, int],
+    timestamp: datetime | None = None,
+) -> float | None:
+    """
+    Replaces the holdings of a SteamID and records its new value.
+
+    Each item is valued at its latest stored PORTFOLIO_SOURCE price; from
+    then on, save_prices keeps the holdings and the value series up to
+    date. Calling it again with the same inventory writes nothing.
+
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        quantities: A dictionary mapping each item name to its quantity.
+        timestamp: When the inventory was seen. Defaults to now.
+
+    Returns:
+        The value of the holdings in the base currency, or None if none of
+        them has a price yet.
+    """
+    ts_epoch = to_epoch(timestamp or datetime.now(timezone.utc))
+    with transaction() as conn:
+        cursor = conn.cursor()
+        item_ids = _intern_names(cursor, "items", quantities)
+        holdings = {
+            item_ids[item_name]: quantity
+            for item_name, quantity in quantities.items()
+            if quantity > 0
+        }
+        current = {
+            row[0]: row[1]
+            for row in cursor.execute(
+                "SELECT item_id, quantity FROM portfolio_holdings "
+                "WHERE steam_id = ?",
+                (steam_id,),
+            )
+        }
+        if current == holdings:
+            return _portfolio_value(cursor, steam_id)
+
+        prices = {}
+        source_id = get_ids(cursor, "sources", [PORTFOLIO_SOURCE]).get(
+            PORTFOLIO_SOURCE
+        )
+        held = list(holdings) if source_id is not None else []
+        for i in range(0, len(held), MAX_NAMES_PER_QUERY):
+            chunk = held[i : i + MAX_NAMES_PER_QUERY]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                "SELECT item_id, price, ts_epoch FROM latest_prices "
+                f"WHERE source_id = ? AND item_id IN ({placeholders})",
+                [source_id, *chunk],
+            )
+            prices.update(
+                {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            )
+
+        cursor.execute(
+            "DELETE FROM portfolio_holdings WHERE steam_id = ?", (steam_id,)
+        )
+        cursor.executemany(
+            "INSERT INTO portfolio_holdings "
+            "(steam_id, item_id, quantity, price, price_ts) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    steam_id,
+                    item_id,
+                    quantity,
+                    *prices.get(item_id, (None, None)),
+                )
+                for item_id, quantity in holdings.items()
+            ],
+        )
+        value = _portfolio_value(cursor, steam_id)
+        _record_portfolio_value(cursor, steam_id, ts_epoch, value)
+    return value
+
+
+def get_last_portfolio_time(steam_id: str) -> int | None:
+    """Returns when a SteamID's value last changed, or None if it never did."""
+    return (
+        get_db_connection()
+        .execute(
+            "SELECT MAX(ts_epoch) FROM portfolio_values WHERE steam_id = ?",
+            (steam_id,),
+        )
+        .fetchone()[0]
+    )
+
+
+def get_portfolio_values(
+    steam_id: str, start_epoch: int | None = None, end_epoch: int | None = None
+) -> list[tuple[int, float]]:
+    """
+    Reads a SteamID's value series between two Unix timestamps (inclusive).
+
+    The series is a step function: each point holds until the next one. So
+    that a window starts with the value it opened at, the last point before
+    `start_epoch` is returned with its timestamp moved to `start_epoch`.
+
+    Returns:
+        A list of (ts_epoch, value) tuples in time order, in the base
+        currency.
+    """
+    conn = get_db_connection()
+    start = start_epoch if start_epoch is not None else 0
+    end = end_epoch if end_epoch is not None else 2**62
+    points = [
+        (row[0], row[1])
+        for row in conn.execute(
+            "SELECT ts_epoch, value FROM portfolio_values "
+            "WHERE steam_id = ? AND ts_epoch BETWEEN ? AND ? "
+            "ORDER BY ts_epoch",
+            (steam_id, start, end),
+        )
+    ]
+    if start_epoch is not None and (not points or points[0][0] > start_epoch):
+        previous = conn.execute(
+            "SELECT value FROM portfolio_values "
+            "WHERE steam_id = ? AND ts_epoch < ? "
+            "ORDER BY ts_epoch DESC LIMIT 1",
+            (steam_id, start_epoch),
+        ).fetchone()
+        if previous is not None:
+            points.insert(0, (start_epoch, previous[0]))
+    return points
+
+
+@metrics.timed("save_prices")
+def save_prices(
+    price_data: dict[str, dict[str, float]], timestamp: datetime | None = None
+) -> int:
     """
     Saves a batch of price data to the database.
 
+    With PRICE_DEDUP enabled, unchanged prices are not written again until
+    the heartbeat is due.
+
     Args:
         price_data: A dictionary structured like:
                     {'item_name': {'source': price, ...}, ...}
+        timestamp: When the prices were observed. Defaults to now.
+
+    Returns:
+        The number of rows added to price_history.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    records = [
+        (item_name, source, price)
+        for item_name, sources in price_data.items()
+        for source, price in sources.items()
+    ]
 
-    timestamp = datetime.now(timezone.utc)
+    if not records:
+        print("No price data to save.")
+        return 0
 
-    records_to_insert = []
-    for item_name, sources in price_data.items():
-        for source, price in sources.items():
-            records_to_insert.append((item_name, source, price, timestamp))
+    ts_epoch = to_epoch(timestamp or datetime.now(timezone.utc))
 
-    if not records_to_insert:
-        print("No price data to save.")
-        return
+    with transaction() as conn:
+        cursor = conn.cursor()
+        persisted = _write_prices(cursor, records, ts_epoch)
+
+    skipped = len(records) - persisted
+    print(
+        f"Successfully saved {persisted} price records to the database"
+        + (f" ({skipped} unchanged prices skipped)." if skipped else ".")
+    )
+    return persisted
+
+
+def save_price_snapshots(
+    snapshots: list[tuple[datetime, dict[str, dict[str, float]]]],
+) -> int:
+    """
+    Saves several price snapshots in a single transaction.
+
+    Args:
+        snapshots: A list of (timestamp, price_data) tuples, where price_data
+                   has the same structure as for save_prices.
+
+    Returns:
+        The number of rows added to price_history.
+    """
+    persisted = 0
+    with transaction() as conn:
+        cursor = conn.cursor()
+        for timestamp, price_data in snapshots:
+            records = [
+                (item_name, source, price)
+                for item_name, sources in price_data.items()
+                for source, price in sources.items()
+            ]
+            if records:
+                persisted += _write_prices(
+                    cursor, records, to_epoch(timestamp)
+                )
+    return persisted
+
+
+def import_price_history(rows) -> int:
+    """
+    Bulk-loads historical prices, e.g. a backfill or benchmark data.
 
+    The rows are inserted as they are, without the deduplication of
+    save_prices, and latest_prices and the daily rollups are then rebuilt
+    from the full history. Portfolio values are not updated.
+
+    Args:
+        rows: An iterable of (item_name, source, ts_epoch, price) tuples.
+              It is consumed in batches, so it can be a generator.
+
+    Returns:
+        The number of rows added to price_history.
+    """
+    rows = iter(rows)
+    inserted = 0
+    with transaction() as conn:
+        cursor = conn.cursor()
+        while batch := list(itertools.islice(rows, IMPORT_BATCH_ROWS)):
+            item_ids = _intern_names(cursor, "items", (r[0] for r in batch))
+            source_ids = _intern_names(
+                cursor, "sources", (r[1] for r in batch)
+            )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO price_history "
+                "(item_id, source_id, ts_epoch, price) VALUES (?, ?, ?, ?)",
+                [
+                    (item_ids[item_name], source_ids[source], ts_epoch, price)
+                    for item_name, source, ts_epoch, price in batch
+                ],
+            )
+            inserted += cursor.rowcount
+        cursor.execute(
+            "INSERT OR REPLACE INTO latest_prices "
+            "(item_id, source_id, price, ts_epoch) "
+            "SELECT item_id, source_id, price, MAX(ts_epoch) "
+            "FROM price_history GROUP BY item_id, source_id"
+        )
+        _rebuild_daily_rollups(cursor)
+    # The rows bypassed save_prices, so its view of the last prices is stale.
+    _local.last_saved["prices"].clear()
+    return inserted
+
+
+def _filter_changed(cursor, rows: list[tuple], ts_epoch: int) -> list[tuple]:
+    """
+    Returns the (item_id, source_id, price) rows whose price differs from the
+    last persisted one, or whose last persisted row is older than the
+    heartbeat interval. Must run inside a write transaction.
+    """
+    last_saved = _local.last_saved
+    known = last_saved["prices"]
+
+    # Another connection wrote since we last looked: our view may be stale.
+    data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+    if data_version != last_saved["data_version"]:
+        known.clear()
+        last_saved["data_version"] = data_version
+
+    # Seed the series we have not seen yet from latest_prices.
+    missing_items = list(
+        {
+            item_id
+            for item_id, source_id, _ in rows
+            if (item_id, source_id) not in known
+        }
+    )
+    for i in range(0, len(missing_items), MAX_NAMES_PER_QUERY):
+        chunk = missing_items[i : i + MAX_NAMES_PER_QUERY]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            "SELECT item_id, source_id, price, ts_epoch FROM latest_prices "
+            f"WHERE item_id IN ({placeholders})",
+            chunk,
+        )
+        for item_id, source_id, price, last_ts in cursor.fetchall():
+            known[(item_id, source_id)] = (price, last_ts)
+
+    changed = []
+    for item_id, source_id, price in rows:
+        previous = known.get((item_id, source_id))
+        if (
+            previous is None
+            or previous[0] != price
+            or ts_epoch - previous[1] >= PRICE_HEARTBEAT_SECONDS
+        ):
+            changed.append((item_id, source_id, price))
+    return changed
+
+
+def _drop_stored(cursor, rows: list[tuple], ts_epoch: int) -> list[tuple]:
+    """
+    Drops the (item_id, source_id, price) rows whose item and source already
+    have a price stored at `ts_epoch`.
+
+    price_history holds one price per item and source per second, so an
+    observation made in the same second as a stored one (e.g. by two
+    requests running at once) is dropped everywhere instead of replacing
+    the stored price while the rollups count both.
+    """
+    item_ids = list(dict.fromkeys(row[0] for row in rows))
+    source_ids = list(dict.fromkeys(row[1] for row in rows))
+    stored = set()
+    chunk_size = max(MAX_NAMES_PER_QUERY - len(source_ids), 1)
+    for i in range(0, len(item_ids), chunk_size):
+        chunk = item_ids[i : i + chunk_size]
+        cursor.execute(
+            "SELECT item_id, source_id FROM price_history "
+            f"WHERE item_id IN ({', '.join('?' for _ in chunk)}) "
+            f"AND source_id IN ({', '.join('?' for _ in source_ids)}) "
+            "AND ts_epoch = ?",
+            [*chunk, *source_ids, ts_epoch],
+        )
+        stored.update((row[0], row[1]) for row in cursor.fetchall())
+    if not stored:
+        return rows
+    return [row for row in rows if (row[0], row[1]) not in stored]
+
+
+def _write_prices(cursor, records: list[tuple], ts_epoch: int) -> int:
+    """
+    Records (item_name, source, price) observations made at one time. The
+    changed ones are stored in price_history, latest_prices, the daily
+    rollups of their day and the portfolios holding those items.
+    Observations of a price already stored at that second are dropped.
+    Must run inside a transaction.
+
+    Returns:
+        The number of rows added to price_history.
+    """
+    day = epoch_day(ts_epoch)
+    item_ids = _intern_names(cursor, "items", (r[0] for r in records))
+    source_ids = _intern_names(cursor, "sources", (r[1] for r in records))
+    rows = [
+        (item_ids[item_name], source_ids[source], price)
+        for item_name, source, price in records
+    ]
+    rows = _drop_stored(cursor, rows, ts_epoch)
+    changed = _filter_changed(cursor, rows, ts_epoch) if PRICE_DEDUP else rows
+
+    cursor.executemany(
+        "INSERT OR IGNORE INTO price_history "
+        "(item_id, source_id, ts_epoch, price) VALUES (?, ?, ?, ?)",
+        [
+            (item_id, source_id, ts_epoch, price)
+            for item_id, source_id, price in changed
+        ],
+    )
+    # Samples written out of order must not replace a newer latest price.
     cursor.executemany(
-        "INSERT INTO price_history (item_name, source, price, timestamp) VALUES (?, ?, ?, ?)",
-        records_to_insert,
+        """
+        INSERT INTO latest_prices (item_id, source_id, price, ts_epoch)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (item_id, source_id) DO UPDATE SET
+            price = excluded.price,
+            ts_epoch = excluded.ts_epoch
+        WHERE excluded.ts_epoch >= ts_epoch
+    """,
+        [
+            (item_id, source_id, price, ts_epoch)
+            for item_id, source_id, price in changed
+        ],
     )
+    if PRICE_DEDUP:
+        known = _local.last_saved["prices"]
+        for item_id, source_id, price in changed:
+            previous = known.get((item_id, source_id))
+            if previous is None or ts_epoch >= previous[1]:
+                known[(item_id, source_id)] = (price, ts_epoch)
 
-    conn.commit()
-    conn.close()
-    print(
-        f"Successfully saved {len(records_to_insert)} price records to the database."
+    # Recompute the rollups of the days that got a new row, in the same
+    # transaction. Unchanged prices are not stored, so they cost no write.
+    _refresh_daily_rollups(
+        cursor,
+        {(item_id, source_id, day) for item_id, source_id, _ in changed},
     )
+    _update_portfolios(cursor, changed, source_ids, ts_epoch)
+    return len(changed)
 
 
 if __name__ == "__main__":
+    # Backfill command: python database.py backfill-rollups
+    if sys.argv[1:] == ["backfill-rollups"]:
+        create_tables()
+        rebuild_daily_rollups()
+        sys.exit(0)
+
     # Example usage:
     print("Initializing database...")
     create_tables()
@@ -98,10 +1208,14 @@ if __name__ == "__main__":
     print("\nVerifying saved data...")
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        "SELECT * FROM price_history ORDER BY timestamp DESC LIMIT 2"
-    )
+    cursor.execute("""
+        SELECT items.name AS item_name, sources.name AS source,
+               price_history.price, price_history.ts_epoch
+        FROM price_history
+        JOIN items ON items.id = price_history.item_id
+        JOIN sources ON sources.id = price_history.source_id
+        ORDER BY price_history.ts_epoch DESC LIMIT 2
+    """)
     rows = cursor.fetchall()
     for row in rows:
         print(dict(row))
-    conn.close()
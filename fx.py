@@ -0,0 +1,265 @@
+"""
+Currency conversion for prices fetched and stored in a single base currency.
+
+Only the base-currency catalog is downloaded from Skinport and price history
+is kept in the base currency; other currencies are converted on the fly
+with exchange rates stored in the fx_rates table.
+
+Stored rates are refreshed once they are older than FX_REFRESH_SECONDS. A
+rate is derived from Skinport itself, as the median ratio between its
+catalog in that currency and in the base currency, so converted prices
+match what Skinport shows. Deriving a rate downloads a second catalog, so
+get_rate never does it on the caller's thread: rates are refreshed in the
+background, or ahead of time by scheduler.py. If FX_RATES_FILE points to a
+JSON file such as {"base": "USD", "rates": {"EUR": 0.92}}, its rates are
+used instead (for tests and offline use).
+
+The catalogs come from the functions given to set_catalog_source, which
+price_fetcher registers when it is imported, so this module does not
+import price_fetcher.
+"""
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import database
+
+BASE_CURRENCY = os.environ.get("PRICE_BASE_CURRENCY", "USD").upper()
+
+# How long (in seconds) a stored exchange rate is used before refreshing it.
+FX_REFRESH_SECONDS = int(os.environ.get("FX_REFRESH_SECONDS", "86400"))
+
+FX_RATES_FILE = os.environ.get("FX_RATES_FILE")
+
+# Cheap items are rounded to the cent in every currency, which makes their
+# price ratios too noisy to derive a rate from.
+MIN_REFERENCE_PRICE = 1.0
+
+# Process-wide copy of the stored rates: currency -> (rate, updated_at).
+_rates = {}
+_rates_lock = threading.Lock()
+_refresh_locks = {}
+_refreshing = set()
+_rates_file_cache = {}
+
+# (get_catalog, download_catalog), see set_catalog_source.
+_catalog_source = None
+
+
+def set_catalog_source(get_catalog, download_catalog):
+    """
+    Sets where the catalogs rates are derived from come from.
+
+    Args:
+        get_catalog: A callable taking a currency and returning the current
+                     {market_hash_name: price} catalog in it, or None.
+        download_catalog: A callable taking a currency and `item_names`
+                          and returning those items' prices, or None.
+    """
+    global _catalog_source
+    _catalog_source = (get_catalog, download_catalog)
+
+
+def convert(price: float, rate: float) -> float:
+    """Converts a base-currency price, rounded to the cent."""
+    return round(price * rate, 2)
+
+
+def convert_prices(
+    price_data: dict[str, dict[str, float]], rate: float
+) -> dict[str, dict[str, float]]:
+    """
+    Converts a fetch_all_prices result from the base currency.
+
+    Args:
+        price_data: A dictionary mapping item name to {source: price}.
+        rate: The exchange rate returned by get_rate.
+
+    Returns:
+        A dictionary of the same shape with converted prices.
+    """
+    if rate == 1.0:
+        return price_data
+    return {
+        item: {
+            source: convert(price, rate) for source, price in sources.items()
+        }
+        for item, sources in price_data.items()
+    }
+
+
+def _load_rates_file(path: str) -> dict[str, float]:
+    """
+    Reads the rates of an FX_RATES_FILE, relative to BASE_CURRENCY.
+
+    The parsed file is cached until its modification time changes.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+        cached = _rates_file_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        file_base = data.get("base", BASE_CURRENCY).upper()
+        rates = {
+            currency.upper(): float(rate)
+            for currency, rate in data.get("rates", {}).items()
+        }
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"Could not read exchange rates from {path}: {e}")
+        return {}
+
+    rates[file_base] = 1.0
+    base_rate = rates.get(BASE_CURRENCY)
+    if base_rate is None:
+        print(f"{path} has no rate for the base currency {BASE_CURRENCY}.")
+        return {}
+    rates = {currency: rate / base_rate for currency, rate in rates.items()}
+    _rates_file_cache[path] = (mtime, rates)
+    return rates
+
+
+def derive_rate_from_skinport(currency: str) -> float | None:
+    """
+    Derives the exchange rate from the base currency to `currency` by
+    comparing the Skinport catalog in both currencies.
+
+    Returns:
+        The median price ratio, or None if either catalog is unavailable.
+    """
+    if _catalog_source is None:
+        print("No catalog source is set; import price_fetcher first.")
+        return None
+    get_catalog, download_catalog = _catalog_source
+    base_prices = get_catalog(BASE_CURRENCY)
+    if not base_prices:
+        return None
+    reference = [
+        name
+        for name, price in base_prices.items()
+        if price >= MIN_REFERENCE_PRICE
+    ]
+    quoted_prices = download_catalog(currency, item_names=reference)
+    if not quoted_prices:
+        return None
+
+    ratios = [
+        quoted_prices[name] / base_prices[name]
+        for name in reference
+        if name in quoted_prices
+    ]
+    if not ratios:
+        return None
+    return statistics.median(ratios)
+
+
+def refresh_rate(currency: str) -> float | None:
+    """
+    Fetches a new exchange rate for a currency and stores it.
+
+    Only one refresh per currency runs at a time; concurrent callers wait
+    for it and then re-use its result.
+
+    Returns:
+        The new rate, or None if it could not be fetched.
+    """
+    currency = currency.upper()
+    with _rates_lock:
+        refresh_lock = _refresh_locks.setdefault(currency, threading.Lock())
+
+    with refresh_lock:
+        entry = _rates.get(currency)
+        if entry and time.time() - entry[1] < FX_REFRESH_SECONDS:
+            return entry[0]  # Someone else refreshed it while we waited
+
+        print(f"Refreshing exchange rate {BASE_CURRENCY} -> {currency}...")
+        rate = derive_rate_from_skinport(currency)
+        if rate is None:
+            print(f"Could not refresh the {currency} exchange rate.")
+            return None
+
+        updated_at = int(time.time())
+        database.save_fx_rate(currency, rate, updated_at)
+        _rates[currency] = (rate, updated_at)
+        return rate
+
+
+def _refresh_rate_in_background(currency: str):
+    """Starts a background refresh of a rate unless one is running."""
+    with _rates_lock:
+        if currency in _refreshing:
+            return
+        _refreshing.add(currency)
+
+    def worker():
+        try:
+            refresh_rate(currency)
+        finally:
+            with _rates_lock:
+                _refreshing.discard(currency)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def get_rate(currency: str) -> float | None:
+    """
+    Returns the exchange rate from the base currency to `currency`, i.e.
+    how many units of `currency` one unit of the base currency buys.
+
+    A rate older than FX_REFRESH_SECONDS is refreshed in the background
+    while the old one is still used. A currency with no stored rate has
+    nothing to fall back on, so its first rate is derived before
+    returning.
+
+    Args:
+        currency: The target currency (e.g., 'EUR', 'USD').
+
+    Returns:
+        The rate, or None if the currency has no known rate.
+    """
+    currency = currency.upper()
+    if currency == BASE_CURRENCY:
+        return 1.0
+    if FX_RATES_FILE:
+        return _load_rates_file(FX_RATES_FILE).get(currency)
+
+    entry = _rates.get(currency)
+    if entry is None:
+        entry = database.get_fx_rate(currency)
+        if entry is not None:
+            _rates.setdefault(currency, entry)
+
+    if entry is not None and time.time() - entry[1] < FX_REFRESH_SECONDS:
+        return entry[0]
+
+    if entry is None:
+        print(f"No {currency} exchange rate yet; deriving one.")
+        return refresh_rate(currency)
+    _refresh_rate_in_background(currency)
+    print(f"Using the stale {currency} exchange rate while it is refreshed.")
+    return entry[0]
+
+
+def clear_rate_cache():
+    """Drops all in-memory rates. The fx_rates table is left untouched."""
+    with _rates_lock:
+        _rates.clear()
+        _rates_file_cache.clear()
+
+
+if __name__ == "__main__":
+    # Refreshes and prints the rates of the currencies given as arguments,
+    # e.g. `python fx.py EUR GBP`.
+    import price_fetcher  # noqa: F401 (registers the catalog source)
+
+    for code in sys.argv[1:] or ["EUR"]:
+        new_rate = refresh_rate(code)
+        if new_rate is None:
+            print(f" -> {BASE_CURRENCY} -> {code.upper()}: not available")
+        else:
+            print(f" -> 1 {BASE_CURRENCY} = {new_rate:.4f} {code.upper()}")
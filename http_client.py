@@ -0,0 +1,294 @@
+"""
+Shared HTTP layer for the calls made to Steam and Skinport.
+
+All requests go through one pooled requests.Session with explicit connect
+and read timeouts. Each upstream host has a token bucket limiting how fast
+it is called, and failed requests (connection errors, timeouts, 429 and
+5xx answers) are retried with exponential backoff and jitter, waiting at
+least as long as the server's Retry-After header asks for.
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT_SECONDS = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = 0.5
+# Longest single wait between attempts, and longest wait for a rate limit
+# token, before giving up.
+MAX_BACKOFF_SECONDS = float(os.environ.get("HTTP_MAX_BACKOFF", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests per second and burst size allowed per host. Skinport allows 8
+# calls to /v1/items per 5 minutes; Steam does not document its inventory
+# limit, but answers bursts with 429s. Hosts not listed are not limited.
+HOST_RATE_LIMITS = {
+    "api.skinport.com": (8 / 300, 8),
+    "steamcommunity.com": (
+        float(os.environ.get("STEAM_REQUESTS_PER_SECOND", "1")),
+        5,
+    ),
+}
+
+POOL_SIZE = 16
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """
+    Raised when a host's rate limit would delay a request too long.
+
+    Attributes:
+        retry_after: Seconds until the host accepts requests again.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, with bursts of up to
+    `capacity` requests.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Takes a token, possibly one that only becomes available later.
+
+        Returns:
+            How many seconds the caller must wait before using the token.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+    def cancel(self):
+        """Returns a token taken with reserve() that will not be used."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+_session = None
+_buckets = {}
+# Host -> time.monotonic() until which it asked not to be called (Retry-After).
+_blocked_until = {}
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the shared session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _get_bucket(host: str) -> TokenBucket | None:
+    """Returns the token bucket of a host, or None if it is not limited."""
+    limit = HOST_RATE_LIMITS.get(host)
+    if limit is None:
+        return None
+    with _lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*limit)
+        return bucket
+
+
+def _block_host(host: str, seconds: float):
+    """Holds back every request to a host for some time (e.g. after a 429)."""
+    with _lock:
+        _blocked_until[host] = max(
+            _blocked_until.get(host, 0.0), time.monotonic() + seconds
+        )
+
+
+def _wait_for_token(host: str):
+    """Blocks until the host's rate limit allows another request."""
+    with _lock:
+        wait = max(_blocked_until.get(host, 0.0) - time.monotonic(), 0.0)
+    bucket = _get_bucket(host)
+    if bucket is not None and wait <= MAX_BACKOFF_SECONDS:
+        wait = max(wait, bucket.reserve())
+        if wait > MAX_BACKOFF_SECONDS:
+            bucket.cancel()
+    if wait > MAX_BACKOFF_SECONDS:
+        metrics.UPSTREAM_ERRORS.inc(host=host, kind="rate_limited")
+        raise RateLimitExceeded(
+            f"Rate limit for {host} would delay the request by {wait:.0f}s.",
+            wait,
+        )
+    if wait > 0:
+        time.sleep(wait)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Returns:
+        The number of seconds to wait, or None if the header is missing or
+        invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def _backoff(attempt: int, retry_after: float | None) -> float:
+    """Seconds to wait before retry number `attempt` (starting at 1)."""
+    delay = random.uniform(0, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(delay, MAX_BACKOFF_SECONDS)
+
+
+def get(
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+    stream: bool = False,
+    timeout: tuple[float, float] | None = None,
+    max_retries: int | None = None,
+) -> requests.Response:
+    """
+    Sends a GET request through the shared session.
+
+    Args:
+        url: The URL to fetch.
+        params: Query string parameters.
+        headers: Extra request headers.
+        stream: If True, the body is not downloaded until it is read.
+        timeout: A (connect, read) timeout tuple. Defaults to
+                 (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS).
+        max_retries: Retries after the first attempt (default MAX_RETRIES).
+
+    Returns:
+        The response. If every attempt was answered with a retryable
+        status, the last such response is returned.
+
+    Raises:
+        RateLimitExceeded: If the rate limit, or a Retry-After header, would
+            delay the request by more than MAX_BACKOFF_SECONDS. A longer
+            Retry-After keeps the host blocked for as long as it asks.
+        requests.exceptions.RequestException: If the last attempt failed
+            to connect or timed out.
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+    if max_retries is None:
+        max_retries = MAX_RETRIES
+    host = urlsplit(url).hostname or ""
+    session = get_session()
+
+    attempt = 0
+    while True:
+        _wait_for_token(host)
+        try:
+            response = session.get(
+                url,
+                params=params,
+                headers=headers,
+                stream=stream,
+                timeout=timeout,
+            )
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ) as e:
+            kind = (
+                "timeout"
+                if isinstance(e, requests.exceptions.Timeout)
+                else "connection"
+            )
+            metrics.UPSTREAM_ERRORS.inc(host=host, kind=kind)
+            if attempt >= max_retries:
+                metrics.UPSTREAM_REQUESTS.inc(host=host, status="error")
+                raise
+            attempt += 1
+            delay = _backoff(attempt, None)
+            print(
+                f"Request to {host} failed ({e}); retrying in {delay:.1f}s..."
+            )
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES:
+            metrics.UPSTREAM_ERRORS.inc(
+                host=host, kind=str(response.status_code)
+            )
+        if (
+            response.status_code not in RETRY_STATUSES
+            or attempt >= max_retries
+        ):
+            metrics.UPSTREAM_REQUESTS.inc(
+                host=host, status=str(response.status_code)
+            )
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        response.close()
+        if retry_after is not None and retry_after > MAX_BACKOFF_SECONDS:
+            # Retrying sooner than asked would only be answered with
+            # another 429, so give up and keep the host blocked.
+            _block_host(host, retry_after)
+            metrics.UPSTREAM_ERRORS.inc(host=host, kind="rate_limited")
+            raise RateLimitExceeded(
+                f"{host} answered {response.status_code} and asked to wait "
+                f"{retry_after:.0f}s before retrying.",
+                retry_after,
+            )
+        attempt += 1
+        delay = _backoff(attempt, retry_after)
+        print(
+            f"{host} answered {response.status_code}; "
+            f"retrying in {delay:.1f}s..."
+        )
+        if response.status_code == 429:
+            # Slow down every request to the host, not just this one. The
+            # next attempt waits for the block in _wait_for_token.
+            _block_host(host, delay)
+        else:
+            time.sleep(delay)
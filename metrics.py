@@ -0,0 +1,322 @@
+"""
+Lightweight in-process metrics, exported in the Prometheus text format.
+
+Counters, gauges and histograms are kept in memory per process (each
+gunicorn worker reports its own). Stage timings are recorded with
+`timer()` or the `timed()` decorator; with METRICS_ENABLED=false these do
+nothing beyond one flag check, so the instrumentation can stay in place.
+"""
+
+import abc
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _escape(value) -> str:
+    """Escapes a label value for the text format."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _format_labels(
+    labelnames: tuple, labelvalues: tuple, extra: str = ""
+) -> str:
+    """Formats a label set as {name="value",...}."""
+    pairs = [
+        f'{name}="{_escape(value)}"'
+        for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value, e.g. 3, 0.25 or +Inf."""
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric(abc.ABC):
+    """Base class: a named metric with one value per set of label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    @abc.abstractmethod
+    def samples(self) -> list[str]:
+        """Returns the metric's sample lines in the text format."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. a number of requests."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} "
+            f"{_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """A value that can go up and down, e.g. a number of rows."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Counts observations (e.g. durations in seconds) in buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket (the last one is +Inf), sum, count]
+                state = self._values[key] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def get(self, **labels) -> tuple[int, float]:
+        """Returns the (count, sum) of the observations with these labels."""
+        state = self._values.get(self._key(labels))
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(
+                (key, ([*counts], total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (float("inf"),), counts
+            ):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(
+    metric_class, name: str, documentation: str, labelnames, **kwargs
+):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_class(
+                name, documentation, labelnames, **kwargs
+            )
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+    """Returns the counter with this name, creating it on first use."""
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+    """Returns the gauge with this name, creating it on first use."""
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: tuple = (),
+    buckets: tuple = DEFAULT_BUCKETS,
+) -> Histogram:
+    """Returns the histogram with this name, creating it on first use."""
+    return _register(
+        Histogram, name, documentation, labelnames, buckets=buckets
+    )
+
+
+# Metrics shared by the modules of the tracker.
+STAGE_SECONDS = histogram(
+    "tracker_stage_seconds",
+    "Time spent in each stage of a request.",
+    ("stage",),
+)
+UPSTREAM_REQUESTS = counter(
+    "upstream_requests_total",
+    "HTTP requests sent to upstream APIs, by final status code.",
+    ("host", "status"),
+)
+UPSTREAM_ERRORS = counter(
+    "upstream_errors_total",
+    "Failed upstream attempts "
+    "(connection errors, timeouts, 429 and 5xx answers).",
+    ("host", "kind"),
+)
+CACHE_LOOKUPS = counter(
+    "cache_lookups_total",
+    "Cache lookups, by cache and result (hit, stale, miss, coalesced).",
+    ("cache", "result"),
+)
+DB_ROWS = gauge(
+    "db_rows",
+    "Rows in each database table, "
+    "counted at most every METRICS_ROW_COUNT_TTL s.",
+    ("table",),
+)
+
+
+@contextmanager
+def _stage_timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timer(stage: str):
+    """
+    Returns a context manager recording how long its block takes as a
+    tracker_stage_seconds observation.
+
+    Example:
+        with metrics.timer("render"):
+            html = render_template(...)
+    """
+    if not ENABLED:
+        return _NULL_CONTEXT
+    return _stage_timer(stage)
+
+
+def timed(stage: str):
+    """Decorator recording each call of a function as a stage timing."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+        return wrapper
+
+    return decorator
+
+
+def cache_lookup(cache: str, result: str):
+    """Counts one lookup in a cache ('hit', 'stale', 'miss' or 'coalesced')."""
+    CACHE_LOOKUPS.inc(cache=cache, result=result)
+
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+def reset():
+    """Clears the values of every metric (used by tests)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        metric.clear()
+
+
+if __name__ == "__main__":
+    # Example usage
+    with timer("example"):
+        time.sleep(0.01)
+    cache_lookup("catalog", "hit")
+    print(render())
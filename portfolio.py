@@ -0,0 +1,162 @@
+"""
+Value history of each SteamID's inventory.
+
+The database keeps a materialized series of portfolio values (see
+database.update_holdings): the holdings of each SteamID are stored with the
+last price applied to each item, and every price or inventory change that
+moves the total adds one point. Reading a year of values is therefore a
+single range read of one SteamID's points, however much price history lies
+behind them.
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import database
+import fx
+
+# How many days of value history are shown by default.
+PORTFOLIO_DAYS = int(os.environ.get("PORTFOLIO_DAYS", "365"))
+
+
+def record_inventory(
+    steam_id: str, quantities: dict[str, int]
+) -> float | None:
+    """
+    Stores the current inventory of a SteamID as its portfolio holdings.
+
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        quantities: A dictionary mapping each item name to its quantity.
+
+    Returns:
+        The value of the holdings in the base currency, or None if none of
+        them has a price yet.
+    """
+    return database.update_holdings(steam_id, quantities)
+
+
+def get_value_series(
+    steam_id: str,
+    days: int | None = None,
+    currency: str = "USD",
+    now: float | None = None,
+) -> list[tuple[int, float]] | None:
+    """
+    Returns the value history of a SteamID's inventory.
+
+    By default the window ends at the last stored point, so the series
+    (and pages showing it) only changes when a new value is recorded. With
+    `now`, the window ends there and the last value is repeated at `now`.
+
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        days: How far back to read (default PORTFOLIO_DAYS).
+        currency: The currency to convert the values to.
+        now: The end of the window, as a Unix timestamp. Defaults to the
+             last stored point.
+
+    Returns:
+        A list of (ts_epoch, value) tuples in time order (empty if the
+        SteamID has no history), or None if `currency` has no exchange
+        rate.
+    """
+    if days is None:
+        days = PORTFOLIO_DAYS
+    rate = fx.get_rate(currency)
+    if rate is None:
+        return None
+
+    if now is not None:
+        end = int(now)
+    else:
+        end = database.get_last_portfolio_time(steam_id)
+        if end is None:
+            return []
+    points = database.get_portfolio_values(
+        steam_id, end - days * database.SECONDS_PER_DAY, end
+    )
+    series = [
+        (ts_epoch, fx.convert(value, rate)) for ts_epoch, value in points
+    ]
+    if series and series[-1][0] < end:
+        series.append((end, series[-1][1]))
+    return series
+
+
+def build_chart(
+    series: list[tuple[int, float]], width: int = 600, height: int = 160
+) -> dict | None:
+    """
+    Lays out a value series as an SVG step line.
+
+    Args:
+        series: The (ts_epoch, value) tuples returned by get_value_series.
+        width: The width of the chart, in SVG units.
+        height: The height of the chart, in SVG units.
+
+    Returns:
+        A dictionary with the keys 'points' (the "x,y x,y ..." attribute
+        of an SVG polyline), 'width', 'height', 'first', 'last', 'min' and
+        'max' (values), 'change' (the relative change from first to last,
+        or None if the first value is 0), 'start' and 'end' (dates as
+        YYYY-MM-DD), or None if the series has fewer than two points.
+    """
+    if len(series) < 2:
+        return None
+
+    start, end = series[0][0], series[-1][0]
+    values = [value for _, value in series]
+    low, high = min(values), max(values)
+    time_span = (end - start) or 1
+    value_span = (high - low) or 1
+
+    def x(ts_epoch):
+        return round((ts_epoch - start) / time_span * width, 1)
+
+    def y(value):
+        if high == low:
+            return round(height / 2, 1)
+        return round(height - (value - low) / value_span * height, 1)
+
+    points = []
+    for i, (ts_epoch, value) in enumerate(series):
+        if i:
+            # Values hold until the next point, so draw a step.
+            points.append(f"{x(ts_epoch)},{y(series[i - 1][1])}")
+        points.append(f"{x(ts_epoch)},{y(value)}")
+
+    def date(ts_epoch):
+        return datetime.fromtimestamp(ts_epoch, timezone.utc).strftime(
+            "%Y-%m-%d"
+        )
+
+    return {
+        "points": " ".join(points),
+        "width": width,
+        "height": height,
+        "first": values[0],
+        "last": values[-1],
+        "min": low,
+        "max": high,
+        "change": (values[-1] - values[0]) / values[0] if values[0] else None,
+        "start": date(start),
+        "end": date(end),
+    }
+
+
+if __name__ == "__main__":
+    # Prints the value history of a SteamID, e.g.:
+    # python portfolio.py 76561198000000000 [days]
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python portfolio.py <steam_id> [days]")
+    database.create_tables()
+    history = get_value_series(
+        sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None
+    )
+    for ts_epoch, value in history or []:
+        when = datetime.fromtimestamp(ts_epoch, timezone.utc)
+        print(f"{when:%Y-%m-%d %H:%M} {value:>12.2f}")
+    if not history:
+        print(f"No value history for {sys.argv[1]}.")
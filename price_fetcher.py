@@ -2,19 +2,642 @@
 Handles fetching item prices from various sources.
 """
 
+import codecs
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
 import requests
 
+import catalog_index
+import database
+import fx
+import http_client
+import metrics
+
 SKINPORT_API_URL = "https://api.skinport.com/v1/items"
 
+# Size of the (already brotli-decoded) chunks read from the catalog response.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Whitespace and element separators between the objects of a JSON array.
+_JSON_ARRAY_SEPARATORS = re.compile(r"[\s,]*")
+
+# How long (in seconds) a downloaded Skinport catalog is served without
+# contacting the API again. Skinport caches /v1/items for 5 minutes on its
+# side, so refreshing more often than that only returns the same data.
+# Set to 0 to disable the catalog cache entirely.
+CATALOG_TTL_SECONDS = int(os.environ.get("SKINPORT_CATALOG_TTL", "300"))
+
+# For how long after expiring a catalog may still be served while a
+# background refresh fetches a new one (stale-while-revalidate).
+CATALOG_STALE_SECONDS = int(os.environ.get("SKINPORT_CATALOG_STALE", "600"))
+
+# Keeps cached catalogs on disk as memory-mapped binary indexes (see
+# catalog_index.py) instead of JSON, so worker processes share one copy of
+# the catalog and a worker picks up a catalog another one downloaded.
+CATALOG_INDEX = (
+    os.environ.get("SKINPORT_CATALOG_INDEX", "true").lower() == "true"
+)
+
+# A compact catalog snapshot (see write_catalog_snapshot) that can be
+# shipped with the deployment, so a cold start with no cached catalog can
+# answer at once instead of downloading the full catalog first. It is served
+# while a fresh catalog is downloaded in the background, for as long as it
+# is younger than CATALOG_SNAPSHOT_MAX_AGE seconds.
+CATALOG_SNAPSHOT_FILE = os.environ.get(
+    "SKINPORT_CATALOG_SNAPSHOT",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "catalog_snapshot.json.gz"
+    ),
+)
+CATALOG_SNAPSHOT_MAX_AGE = int(
+    os.environ.get("SKINPORT_CATALOG_SNAPSHOT_MAX_AGE", "86400")
+)
+
+# Defaults for registered price sources: how long fetch_all_prices waits
+# for a source, and how many times a failed fetch is retried within that
+# deadline.
+SOURCE_TIMEOUT_SECONDS = float(os.environ.get("PRICE_SOURCE_TIMEOUT", "30"))
+SOURCE_RETRIES = int(os.environ.get("PRICE_SOURCE_RETRIES", "1"))
+# Threads each source is queried on. Every source has its own threads, so
+# fetches stuck in a slow source cannot hold up the others.
+SOURCE_WORKERS = int(os.environ.get("PRICE_SOURCE_WORKERS", "2"))
+
+# Circuit breaker: after this many consecutive failures a source is skipped
+# for BREAKER_COOLDOWN_SECONDS, then tried again once.
+BREAKER_THRESHOLD = int(os.environ.get("PRICE_SOURCE_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN_SECONDS = float(
+    os.environ.get("PRICE_SOURCE_BREAKER_COOLDOWN", "60")
+)
+
+# Process-wide catalog cache, keyed by currency. Each entry is a dict with
+# the keys 'prices' (a {market_hash_name: price} mapping: a dict, or a
+# CatalogIndex with CATALOG_INDEX), 'etag', 'last_modified' and
+# 'fetched_at' (a Unix timestamp). Index-backed entries also record the
+# 'file_mtime' of their index file and its revalidation file.
+_catalog_cache = {}
+_catalog_cache_lock = threading.Lock()
+_catalog_fetch_locks = {}
+_catalog_refreshing = set()
+
+
+def _catalog_cache_path(currency: str) -> str:
+    """Returns the on-disk location of the cached catalog for a currency."""
+    extension = "idx" if CATALOG_INDEX else "json"
+    return os.path.join(
+        os.path.dirname(database.DB_FILE),
+        f"skinport_catalog_{currency}.{extension}",
+    )
+
+
+def _revalidation_path(currency: str) -> str:
+    """
+    Returns where the last revalidation of a cached catalog is recorded.
+
+    A 304 answer only moves 'fetched_at', so it is written to this small
+    file instead of rewriting the whole catalog.
+    """
+    return _catalog_cache_path(currency) + ".revalidated"
+
+
+def _apply_revalidation(currency: str, entry: dict) -> dict:
+    """
+    Moves the 'fetched_at' of an entry loaded from disk to its last
+    revalidation, if one was recorded for the same validators since.
+    """
+    path = _revalidation_path(currency)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as f:
+            revalidated = json.load(f)
+    except (OSError, ValueError):
+        revalidated, mtime = {}, None
+    if (
+        isinstance(revalidated, dict)
+        and revalidated.get("etag") == entry.get("etag")
+        and revalidated.get("last_modified") == entry.get("last_modified")
+        and revalidated.get("fetched_at", 0) > entry["fetched_at"]
+    ):
+        entry["fetched_at"] = revalidated["fetched_at"]
+    if "file_mtime" in entry:
+        entry["file_mtime"] = (entry["file_mtime"], mtime)
+    return entry
+
+
+def _save_revalidation(currency: str, entry: dict) -> dict:
+    """
+    Records that a cached catalog was revalidated (answered with a 304).
+
+    Returns:
+        The entry, with its 'file_mtime' updated if it is index-backed.
+    """
+    path = _revalidation_path(currency)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    key: entry[key]
+                    for key in ("etag", "last_modified", "fetched_at")
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        print(f"Could not record the Skinport catalog revalidation: {e}")
+        return entry
+    if "file_mtime" in entry:
+        entry["file_mtime"] = (entry["file_mtime"][0], mtime)
+    return entry
+
+
+def _load_catalog_index(currency: str) -> dict | None:
+    """Maps the catalog index of a currency as a cache entry, if any."""
+    path = _catalog_cache_path(currency)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    index = catalog_index.open_index(path)
+    if index is None or "fetched_at" not in index.metadata:
+        return None
+    return _apply_revalidation(
+        currency,
+        {
+            "prices": index,
+            "etag": index.metadata.get("etag"),
+            "last_modified": index.metadata.get("last_modified"),
+            "fetched_at": index.metadata["fetched_at"],
+            "file_mtime": mtime,
+        },
+    )
+
+
+def _load_catalog_from_disk(currency: str) -> dict | None:
+    """Loads a previously saved catalog entry, or None if there is none."""
+    if CATALOG_INDEX:
+        return _load_catalog_index(currency)
+    try:
+        with open(_catalog_cache_path(currency), encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(entry.get("prices"), dict) or "fetched_at" not in entry:
+        return None
+    return _apply_revalidation(currency, entry)
+
+
+def _save_catalog_to_disk(currency: str, entry: dict) -> dict:
+    """
+    Writes a catalog entry to disk, replacing any previous copy atomically.
+
+    Returns:
+        The entry to keep in memory: with CATALOG_INDEX, one backed by the
+        new index file, so the parsed catalog can be freed.
+    """
+    path = _catalog_cache_path(currency)
+    if CATALOG_INDEX:
+        metadata = {
+            key: entry[key] for key in ("etag", "last_modified", "fetched_at")
+        }
+        try:
+            catalog_index.write_index(path, entry["prices"], metadata)
+        except OSError as e:
+            print(f"Could not write the Skinport catalog index to disk: {e}")
+            return entry
+        return _load_catalog_index(currency) or entry
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write the Skinport catalog cache to disk: {e}")
+    return entry
+
+
+def _load_catalog_snapshot(currency: str) -> dict | None:
+    """
+    Loads the catalog snapshot as a cache entry marked 'snapshot', or None
+    if there is no snapshot for the currency or it is too old.
+    """
+    try:
+        with gzip.open(CATALOG_SNAPSHOT_FILE, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        snapshot.get("currency") != currency
+        or not isinstance(snapshot.get("prices"), dict)
+        or time.time() - snapshot.get("fetched_at", 0)
+        >= CATALOG_SNAPSHOT_MAX_AGE
+    ):
+        return None
+    return {
+        "prices": snapshot["prices"],
+        "etag": None,
+        "last_modified": None,
+        "fetched_at": snapshot["fetched_at"],
+        "snapshot": True,
+    }
+
+
+def write_catalog_snapshot(
+    path: str, currency: str | None = None
+) -> int | None:
+    """
+    Downloads the catalog and writes it as a compact gzipped snapshot, to
+    be shipped with the deployment (see CATALOG_SNAPSHOT_FILE).
+
+    Args:
+        path: Where to write the snapshot.
+        currency: The currency of the catalog. Defaults to the base currency.
+
+    Returns:
+        The number of items written, or None if the download failed.
+    """
+    currency = currency or fx.BASE_CURRENCY
+    try:
+        entry = _download_catalog(currency)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Could not download the Skinport catalog: {e}")
+        return None
+
+    snapshot = {
+        "currency": currency,
+        "fetched_at": entry["fetched_at"],
+        "prices": entry["prices"],
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return len(entry["prices"])
+
+
+def _iter_json_array(chunks):
+    """
+    Incrementally decodes a JSON array of objects from an iterable of bytes.
+
+    Only the undecoded tail of the input and the object being parsed are
+    held in memory, so the full document is never materialized.
+
+    Args:
+        chunks: An iterable of UTF-8 encoded byte strings.
+
+    Yields:
+        Each element of the top-level array, in order.
+
+    Raises:
+        ValueError: If the input is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    in_array = False
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+        while True:
+            pos = _JSON_ARRAY_SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+
+            if not in_array:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array.")
+                in_array = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # The element continues in the next chunk
+            yield element
+
+    raise ValueError("Unexpected end of JSON array.")
+
+
+@metrics.timed("catalog")
+def _download_catalog(
+    currency: str,
+    cached: dict | None = None,
+    item_names: list[str] | None = None,
+) -> dict:
+    """
+    Downloads the Skinport catalog for a currency.
+
+    The response body is streamed and decoded incrementally; each entry is
+    reduced to a name -> price pair as it is parsed, so memory use does not
+    depend on how verbose the catalog is.
+
+    If a cached entry is given, the request is made conditional on its
+    ETag/Last-Modified validators, and a 304 answer re-uses its prices.
+
+    Args:
+        currency: The currency for pricing (e.g., 'EUR', 'USD').
+        cached: A previous catalog entry to revalidate.
+        item_names: If given, only these items are kept.
+
+    Returns:
+        A new catalog entry. After a 304 answer it holds the cached prices
+        and the key 'not_modified' set to True.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+        ValueError: If the response is not valid JSON.
+    """
+    params = {"app_id": 730, "currency": currency}
+    headers = {"Accept-Encoding": "br"}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = http_client.get(
+        SKINPORT_API_URL, params=params, headers=headers, stream=True
+    )
+
+    not_modified = bool(cached) and response.status_code == 304
+    try:
+        if not_modified:
+            print(f"Skinport catalog ({currency}) not modified.")
+            prices = cached["prices"]
+        else:
+            response.raise_for_status()
+            wanted = set(item_names) if item_names is not None else None
+            prices = {}
+            for item in _iter_json_array(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            ):
+                name = item.get("market_hash_name")
+                price = item.get("suggested_price")
+                if price is None or (
+                    wanted is not None and name not in wanted
+                ):
+                    continue
+                prices[name] = float(price)
+    finally:
+        response.close()
+
+    # A 304 may omit the validators, in which case the old ones still apply.
+    previous = cached or {}
+    entry = {
+        "prices": prices,
+        "etag": response.headers.get("ETag") or previous.get("etag"),
+        "last_modified": response.headers.get("Last-Modified")
+        or previous.get("last_modified"),
+        "fetched_at": time.time(),
+    }
+    if not_modified:
+        entry["not_modified"] = True
+    return entry
+
+
+def _refresh_catalog(currency: str) -> dict | None:
+    """
+    Fetches a new catalog for a currency and stores it in the cache.
+
+    Only one refresh per currency runs at a time; concurrent callers wait for
+    it and then re-use its result. If the download fails, the previous entry
+    (if any) is returned so callers can keep serving stale prices.
+    """
+    with _catalog_cache_lock:
+        fetch_lock = _catalog_fetch_locks.setdefault(
+            currency, threading.Lock()
+        )
+
+    with fetch_lock:
+        cached = _catalog_cache.get(currency)
+        if cached and time.time() - cached["fetched_at"] < CATALOG_TTL_SECONDS:
+            return cached  # Someone else refreshed it while we waited
+
+        if CATALOG_INDEX:
+            # Another worker process may have written a newer index.
+            on_disk = _load_catalog_index(currency)
+            if (
+                on_disk
+                and on_disk["file_mtime"] != (cached or {}).get("file_mtime")
+                and time.time() - on_disk["fetched_at"] < CATALOG_TTL_SECONDS
+            ):
+                _catalog_cache[currency] = on_disk
+                return on_disk
+
+        try:
+            entry = _download_catalog(currency, cached)
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred while fetching from Skinport API: {e}")
+            return cached
+        except ValueError:
+            print("Failed to decode JSON from Skinport API response.")
+            return cached
+
+        if entry.pop("not_modified", False) and all(
+            entry[key] == cached.get(key) for key in ("etag", "last_modified")
+        ):
+            # Same catalog as on disk: only record when it was revalidated.
+            entry = _save_revalidation(currency, {**cached, **entry})
+        else:
+            entry = _save_catalog_to_disk(currency, entry)
+        _catalog_cache[currency] = entry
+        return entry
+
+
+def _refresh_catalog_in_background(currency: str):
+    """Starts a background refresh of a catalog unless one is running."""
+    with _catalog_cache_lock:
+        if currency in _catalog_refreshing:
+            return
+        _catalog_refreshing.add(currency)
+
+    def worker():
+        try:
+            _refresh_catalog(currency)
+        finally:
+            with _catalog_cache_lock:
+                _catalog_refreshing.discard(currency)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def download_catalog(
+    currency: str, item_names: list[str] | None = None
+) -> dict[str, float] | None:
+    """
+    Downloads the Skinport catalog for a currency, bypassing the cache.
+
+    Args:
+        currency: The currency for pricing (e.g., 'EUR', 'USD').
+        item_names: If given, only these items are kept.
+
+    Returns:
+        A {market_hash_name: price} mapping, or None if an error occurs.
+    """
+    try:
+        return _download_catalog(currency, item_names=item_names)["prices"]
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred while fetching from Skinport API: {e}")
+    except ValueError:
+        print("Failed to decode JSON from Skinport API response.")
+    return None
+
+
+def get_skinport_catalog(currency: str = "USD") -> Mapping[str, float] | None:
+    """
+    Returns the full Skinport catalog as a {market_hash_name: price} mapping
+    (a read-only CatalogIndex with CATALOG_INDEX).
+
+    Catalogs are cached per currency in memory and on disk next to the
+    database file. A cached catalog is served as-is for CATALOG_TTL_SECONDS,
+    then served stale for up to CATALOG_STALE_SECONDS more while it is
+    revalidated in the background. Older catalogs are revalidated before
+    returning. Without any cached catalog, the deployment's catalog snapshot
+    (if any) is served stale in the same way.
+
+    Args:
+        currency: The currency for pricing (e.g., 'EUR', 'USD').
+
+    Returns:
+        The catalog mapping, or None if no catalog could be obtained.
+    """
+    if CATALOG_TTL_SECONDS <= 0:
+        return download_catalog(currency)
+
+    entry = _catalog_cache.get(currency)
+    if entry is None:
+        entry = _load_catalog_from_disk(currency)
+        if entry is not None:
+            print(f"Loaded Skinport catalog ({currency}) from disk cache.")
+            _catalog_cache.setdefault(currency, entry)
+    if entry is None:
+        entry = _load_catalog_snapshot(currency)
+        if entry is not None:
+            print(f"Loaded Skinport catalog ({currency}) from the snapshot.")
+            _catalog_cache.setdefault(currency, entry)
+
+    if entry is not None:
+        age = time.time() - entry["fetched_at"]
+        stale_limit = (
+            CATALOG_SNAPSHOT_MAX_AGE
+            if entry.get("snapshot")
+            else CATALOG_TTL_SECONDS + CATALOG_STALE_SECONDS
+        )
+        if age < CATALOG_TTL_SECONDS:
+            metrics.cache_lookup("catalog", "hit")
+            return entry["prices"]
+        if age < stale_limit:
+            metrics.cache_lookup("catalog", "stale")
+            _refresh_catalog_in_background(currency)
+            return entry["prices"]
+
+    metrics.cache_lookup("catalog", "miss")
+    entry = _refresh_catalog(currency)
+    return entry["prices"] if entry is not None else None
+
+
+def refresh_catalog(
+    currency: str,
+) -> tuple[Mapping[str, float], float] | None:
+    """
+    Revalidates the catalog of a currency now, instead of serving a cached
+    copy while it is refreshed in the background.
+
+    A catalog fetched by another caller within CATALOG_TTL_SECONDS is
+    re-used. If the download fails the cached catalog is returned, so
+    callers should check its age.
+
+    Args:
+        currency: The currency for pricing (e.g., 'EUR', 'USD').
+
+    Returns:
+        A (prices, fetched_at) tuple, where fetched_at is the Unix time
+        the prices were fetched, or None if no catalog could be obtained.
+    """
+    if CATALOG_TTL_SECONDS <= 0:
+        fetched_at = time.time()
+        prices = download_catalog(currency)
+        return (prices, fetched_at) if prices is not None else None
+    entry = _refresh_catalog(currency)
+    if entry is None:
+        return None
+    return entry["prices"], entry["fetched_at"]
+
+
+def is_snapshot_catalog(currency: str) -> bool:
+    """
+    Tells whether the catalog served for a currency is still the
+    deployment's catalog snapshot. Its prices may be up to
+    CATALOG_SNAPSHOT_MAX_AGE seconds old, so they are shown but must not
+    be recorded as current prices or used to derive exchange rates.
+    """
+    entry = _catalog_cache.get(currency)
+    return bool(entry and entry.get("snapshot"))
+
+
+def get_live_catalog(currency: str) -> Mapping[str, float] | None:
+    """
+    Same as get_skinport_catalog, but returns None while the catalog served
+    is the deployment's snapshot, whose prices are not current.
+    """
+    catalog = get_skinport_catalog(currency)
+    if catalog is None or is_snapshot_catalog(currency):
+        return None
+    return catalog
+
+
+def prefetch_catalog(currency: str = "USD") -> bool:
+    """
+    Loads the base-currency Skinport catalog into the cache ahead of time,
+    and the stored exchange rate to `currency` (starting its background
+    refresh if it is missing or old), so a later price lookup does not have
+    to wait for either. Does nothing if the catalog cache is disabled.
+
+    Returns:
+        True if a catalog is available in the cache.
+    """
+    if CATALOG_TTL_SECONDS <= 0:
+        return False
+    if get_skinport_catalog(fx.BASE_CURRENCY) is None:
+        return False
+    fx.get_rate(currency)
+    return True
+
+
+def clear_catalog_cache():
+    """Drops all in-memory catalogs. Files on disk are left untouched."""
+    with _catalog_cache_lock:
+        _catalog_cache.clear()
 
 
 def get_prices_from_skinport(
     item_names: list[str], currency: str = "USD"
 ) -> dict[str, float] | None:
-
     """
     Fetches prices for a list of items from the Skinport API.
 
+    Only the catalog in the base currency (fx.BASE_CURRENCY) is downloaded;
+    prices in any other currency are converted from it with the locally
+    stored exchange rate.
+
     Args:
         item_names: A list of 'market_hash_name' to look up.
         currency: The currency for pricing (e.g., 'EUR', 'USD').
@@ -23,99 +646,268 @@ def get_prices_from_skinport(
         A dictionary mapping item name to its suggested price.
         Returns None if an error occurs.
     """
-    prices = {}
     print(f"Fetching prices from Skinport in {currency}...")
 
-    try:
-        # Skinport API returns all items, so we fetch once and then filter.
-        params = {"app_id": 730, "currency": currency}
+    # Without a catalog cache there is no point in keeping the whole
+    # catalog, so only the requested items are kept while parsing.
+    if CATALOG_TTL_SECONDS <= 0:
+        prices = download_catalog(fx.BASE_CURRENCY, item_names=item_names)
+    else:
+        # Skinport API returns all items, so we fetch the (cached) catalog
+        # once and then filter.
+        skinport_prices = get_skinport_catalog(fx.BASE_CURRENCY)
+        if skinport_prices is None:
+            return None
+        # One lookup per item: with a catalog index, only these items are
+        # read from the catalog.
+        prices = {}
+        for item_name in item_names:
+            price = skinport_prices.get(item_name)
+            if price is not None:
+                prices[item_name] = price
+    if prices is None:
+        return None
 
-        headers = {"Accept-Encoding": "br"}
-        response = requests.get(
-            SKINPORT_API_URL, params=params, headers=headers
+    rate = fx.get_rate(currency)
+    if rate is None:
+        print(
+            f"No exchange rate available from {fx.BASE_CURRENCY} "
+            f"to {currency}."
         )
-        response.raise_for_status()
+        return None
+    if rate == 1.0:
+        return prices
+    return {
+        item_name: fx.convert(price, rate)
+        for item_name, price in prices.items()
+    }
 
-        all_items = response.json()
 
-        # Create a lookup table for faster access
-        skinport_prices = {
-            item["market_hash_name"]: item.get("suggested_price")
-            for item in all_items
-        }
+class PriceSource:
+    """
+    A price provider queried by fetch_all_prices.
 
-        for item_name in item_names:
-            if item_name in skinport_prices:
-                price = skinport_prices[item_name]
-                if price is not None:
-                    prices[item_name] = float(price)
+    Attributes:
+        name: The key the source's prices are stored under (e.g. 'skinport').
+        fetch: A callable taking (item_names, currency) and returning a
+               {market_hash_name: price} mapping, or None on failure.
+        timeout: Seconds fetch_all_prices waits for this source.
+        retries: How many times a failed fetch is retried before the
+                 deadline.
 
-        return prices
+    A fetch still running when its deadline passes cannot be stopped; it
+    keeps one of the source's SOURCE_WORKERS threads until it returns.
+    """
 
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while fetching from Skinport API: {e}")
-        return None
-    except ValueError:
-        print("Failed to decode JSON from Skinport API response.")
+    def __init__(self, name, fetch, timeout=None, retries=None):
+        self.name = name
+        self.fetch = fetch
+        self.timeout = SOURCE_TIMEOUT_SECONDS if timeout is None else timeout
+        self.retries = SOURCE_RETRIES if retries is None else retries
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def is_available(self) -> bool:
+        """Returns False while the circuit breaker is open."""
+        with self._lock:
+            return time.monotonic() >= self.open_until
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= BREAKER_THRESHOLD:
+                print(
+                    f"Price source '{self.name}' failed "
+                    f"{self.consecutive_failures} times in a row; skipping it "
+                    f"for {BREAKER_COOLDOWN_SECONDS:.0f}s."
+                )
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+
+    def submit(
+        self, item_names: list[str], currency: str, deadline: float
+    ) -> Future:
+        """Starts a query on this source's own threads."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=SOURCE_WORKERS,
+                    thread_name_prefix=f"price-source-{self.name}",
+                )
+        return self._executor.submit(
+            self.query, item_names, currency, deadline
+        )
+
+    def query(
+        self, item_names: list[str], currency: str, deadline: float
+    ) -> dict[str, float] | None:
+        """
+        Fetches prices, retrying failures while there is time left before
+        `deadline` (a time.monotonic() value).
+
+        Returns:
+            The fetched prices, or None if every attempt failed.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt and time.monotonic() >= deadline:
+                break
+            try:
+                prices = self.fetch(item_names, currency)
+            except Exception as e:  # A broken source must not break the others
+                print(f"Price source '{self.name}' raised an error: {e}")
+                prices = None
+            if prices is not None:
+                return prices
         return None
 
 
+# Registered price sources, by name, in the order they were registered.
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def register_source(
+    name: str,
+    fetch,
+    timeout: float | None = None,
+    retries: int | None = None,
+) -> PriceSource:
+    """
+    Registers (or replaces) a price source.
+
+    Args:
+        name: The key the source's prices are stored under.
+        fetch: A callable taking (item_names, currency) and returning a
+               {market_hash_name: price} mapping, or None on failure.
+        timeout: Seconds to wait for the source (default
+                 SOURCE_TIMEOUT_SECONDS).
+        retries: Retries of a failed fetch (default SOURCE_RETRIES).
+
+    Returns:
+        The registered source.
+    """
+    source = PriceSource(name, fetch, timeout=timeout, retries=retries)
+    with _sources_lock:
+        _sources[name] = source
+    return source
+
+
+def unregister_source(name: str):
+    """Removes a price source, if registered."""
+    with _sources_lock:
+        _sources.pop(name, None)
+
+
+def get_sources() -> list[PriceSource]:
+    """Returns the registered price sources."""
+    with _sources_lock:
+        return list(_sources.values())
+
+
 def fetch_all_prices(
     item_names: list[str], currency: str = "USD"
 ) -> dict[str, dict[str, float]] | None:
     """
     Fetches prices from all available sources for the given items.
 
+    Sources are queried concurrently, each with its own deadline. A source
+    that fails or misses its deadline is left out of the result, so the
+    other sources' prices are still returned.
+
     Args:
         item_names: A list of 'market_hash_name' to look up.
         currency: The currency to fetch prices in.
 
     Returns:
         A dictionary where keys are item names and values are another
-        dictionary mapping the source ('skinport', 'csfloat', etc.) to its price.
-        Returns None on failure.
+        dictionary mapping the source ('skinport', 'csfloat', etc.) to its
+        price.
+        Returns None if no source returned prices.
     """
     all_prices = {item: {} for item in item_names}
 
-    # --- Skinport ---
-    skinport_prices = get_prices_from_skinport(item_names, currency=currency)
+    sources = [source for source in get_sources() if source.is_available()]
+    if not sources:
+        print("No price source is available.")
+        return None
 
+    start = time.monotonic()
+    futures = {
+        source: source.submit(item_names, currency, start + source.timeout)
+        for source in sources
+    }
 
-    # If the API call failed, propagate the failure signal
-    if skinport_prices is None:
-        return None
+    succeeded = False
+    for source, future in futures.items():
+        remaining = source.timeout - (time.monotonic() - start)
+        try:
+            prices = future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            print(
+                f"Price source '{source.name}' timed out "
+                f"after {source.timeout}s."
+            )
+            future.cancel()
+            prices = None
+
+        # If the source failed, leave it out of the results
+        if prices is None:
+            source.record_failure()
+            continue
+        source.record_success()
+        succeeded = True
+
+        for item, price in prices.items():
+            if item in all_prices:
+                all_prices[item][source.name] = price
 
-    for item, price in skinport_prices.items():
-        if item in all_prices:
-            all_prices[item]["skinport"] = price
+    return all_prices if succeeded else None
 
-    # --- Other sources would be called here ---
-    # e.g., csfloat_prices = get_prices_from_csfloat(item_names, currency)
 
-    return all_prices
+register_source("skinport", get_prices_from_skinport)
+# Exchange rates are derived from the live base catalog and a download of
+# the catalog in the other currency.
+fx.set_catalog_source(get_live_catalog, download_catalog)
 
 
 if __name__ == "__main__":
-    # Example Usage
-    example_items = [
-        "AK-47 | Redline (Field-Tested)",
-        "AWP | Asiimov (Field-Tested)",
-        "Glock-18 | Water Elemental (Minimal Wear)",
-        "Non-existent Item 123",  # To test filtering
-    ]
-
-    print(f"Fetching prices for {len(example_items)} items in EUR...")
-    retrieved_prices = fetch_all_prices(example_items, currency="EUR")
-
-    if retrieved_prices is not None:
-        print("\n--- Retrieved Prices (EUR) ---")
-        for item, sources in retrieved_prices.items():
-            if sources:
-                print(f"- {item}:")
-                for source, price in sources.items():
-                    print(f"  - {source}: €{price:.2f}")
-            else:
-                print(f"- {item}: Not found on any source.")
-        print("------------------------")
+    if sys.argv[1:2] == ["snapshot"]:
+        # Builds the catalog snapshot shipped with the deployment, e.g.
+        # `python price_fetcher.py snapshot [path]`.
+        snapshot_path = (
+            sys.argv[2] if len(sys.argv) > 2 else CATALOG_SNAPSHOT_FILE
+        )
+        written = write_catalog_snapshot(snapshot_path)
+        if written is None:
+            sys.exit(1)
+        print(f"Wrote {written} items to {snapshot_path}.")
     else:
-        print("Failed to retrieve prices.")
+        # Example Usage
+        example_items = [
+            "AK-47 | Redline (Field-Tested)",
+            "AWP | Asiimov (Field-Tested)",
+            "Glock-18 | Water Elemental (Minimal Wear)",
+            "Non-existent Item 123",  # To test filtering
+        ]
+
+        print(f"Fetching prices for {len(example_items)} items in EUR...")
+        retrieved_prices = fetch_all_prices(example_items, currency="EUR")
+
+        if retrieved_prices is not None:
+            print("\n--- Retrieved Prices (EUR) ---")
+            for item, sources in retrieved_prices.items():
+                if sources:
+                    print(f"- {item}:")
+                    for source, price in sources.items():
+                        print(f"  - {source}: €{price:.2f}")
+                else:
+                    print(f"- {item}: Not found on any source.")
+            print("------------------------")
+        else:
+            print("Failed to retrieve prices.")
@@ -0,0 +1,196 @@
+"""
+Write-behind persistence of price snapshots.
+
+Instead of committing each snapshot on the request thread, snapshots are put
+on a bounded in-process queue. A background thread drains the queue and
+writes everything it finds in a single transaction. Enable it with the
+PRICE_WRITE_BEHIND environment variable.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import database
+
+WRITE_BEHIND = os.environ.get("PRICE_WRITE_BEHIND", "false").lower() == "true"
+MAX_QUEUE_SIZE = int(os.environ.get("PRICE_WRITE_QUEUE_SIZE", "64"))
+# Most snapshots coalesced into one transaction.
+MAX_BATCH_SIZE = 32
+# How long submit() waits for room in a full queue before giving up.
+ENQUEUE_TIMEOUT_SECONDS = 2.0
+
+_STOP = object()
+
+
+class PriceWriter:
+    """A background thread persisting queued price snapshots in batches."""
+
+    def __init__(
+        self,
+        max_queue_size: int = MAX_QUEUE_SIZE,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        enqueue_timeout: float = ENQUEUE_TIMEOUT_SECONDS,
+    ):
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._max_batch_size = max_batch_size
+        self._enqueue_timeout = enqueue_timeout
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {
+            "enqueued": 0,
+            "rejected": 0,
+            "batches": 0,
+            "snapshots_written": 0,
+            "rows_written": 0,
+            "errors": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    def start(self):
+        """Starts the writer thread if it is not running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="price-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(
+        self,
+        price_data: dict[str, dict[str, float]],
+        timestamp: datetime | None = None,
+    ) -> bool:
+        """
+        Queues a snapshot for writing, waiting for room if the queue is full.
+
+        Args:
+            price_data: The snapshot, structured as for database.save_prices.
+            timestamp: When the prices were observed. Defaults to now.
+
+        Returns:
+            True if the snapshot was queued, or False if the queue stayed
+            full, in which case the caller should write it itself.
+        """
+        snapshot = (timestamp or datetime.now(timezone.utc), price_data)
+        try:
+            self._queue.put(snapshot, timeout=self._enqueue_timeout)
+        except queue.Full:
+            self._count("rejected")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Waits until every queued snapshot has been written.
+
+        Returns:
+            True if the queue drained within the timeout.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout
+            )
+
+    def stop(self, timeout: float | None = 10.0):
+        """Writes the pending snapshots and stops the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> dict[str, float]:
+        """Returns the writer's counters, plus the current queue depth."""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            snapshots = [item for item in batch if item is not _STOP]
+            try:
+                if snapshots:
+                    self._write(snapshots)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if len(snapshots) < len(batch):
+                database.close_connection()
+                return
+
+    def _write(self, snapshots: list[tuple]):
+        start = time.perf_counter()
+        try:
+            rows = database.save_price_snapshots(snapshots)
+        except Exception as e:
+            # Any failure only loses this batch: the thread keeps draining
+            # the queue, so submit() does not start blocking on it.
+            print(
+                f"Failed to write {len(snapshots)} queued price snapshots: {e}"
+            )
+            self._count("errors")
+            return
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            counters = self._counters
+            counters["batches"] += 1
+            counters["snapshots_written"] += len(snapshots)
+            counters["rows_written"] += rows
+            counters["last_flush_seconds"] = elapsed
+            counters["max_flush_seconds"] = max(
+                counters["max_flush_seconds"], elapsed
+            )
+            counters["total_flush_seconds"] += elapsed
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> PriceWriter:
+    """
+    Returns the process-wide writer, starting it on first use and
+    restarting its thread if it died.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = PriceWriter()
+            # Flush whatever is still queued when the process exits.
+            atexit.register(_writer.stop)
+        _writer.start()
+        return _writer
+
+
+def save_prices(price_data: dict[str, dict[str, float]]):
+    """
+    Persists a price snapshot, through the write-behind queue if enabled.
+
+    If write-behind is disabled, or the queue stays full for longer than
+    ENQUEUE_TIMEOUT_SECONDS, the snapshot is written synchronously.
+    """
+    if WRITE_BEHIND and get_writer().submit(price_data):
+        print(f"Queued {len(price_data)} item prices for writing.")
+        return
+    database.save_prices(price_data)
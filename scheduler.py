@@ -0,0 +1,151 @@
+"""
+Background snapshots of the full Skinport catalog.
+
+Run `python scheduler.py` next to the web app to record the price of every
+item in the catalog every SNAPSHOT_INTERVAL_SECONDS, so price history does
+not depend on which items users happen to look up. Combine it with
+TRACKER_PERSIST_PRICES=false so /track only reads prices.
+
+`python scheduler.py once` takes a single snapshot and exits.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import database
+import fx
+import price_fetcher
+
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("SNAPSHOT_INTERVAL", "900"))
+# Up to this many seconds are added to each wait, so several schedulers
+# (or restarts) do not all hit the API at the same moment.
+SNAPSHOT_JITTER_SECONDS = int(os.environ.get("SNAPSHOT_JITTER", "60"))
+# Exchange rates kept fresh alongside the snapshots.
+SNAPSHOT_FX_CURRENCIES = [
+    code.strip().upper()
+    for code in os.environ.get("SNAPSHOT_FX_CURRENCIES", "EUR").split(",")
+    if code.strip()
+]
+
+
+def take_snapshot() -> dict | None:
+    """
+    Saves the current price of every catalog item in one transaction.
+
+    The catalog is revalidated first, and its prices are recorded at the
+    time they were fetched. A catalog older than SNAPSHOT_INTERVAL_SECONDS
+    (because the download failed) is not recorded again.
+
+    Returns:
+        A dictionary with the snapshot's 'started_at' (Unix timestamp),
+        'duration' (seconds), 'items' and 'rows_written', or None if no
+        current catalog could be fetched.
+    """
+    started = time.time()
+    start = time.monotonic()
+
+    fetched = price_fetcher.refresh_catalog(fx.BASE_CURRENCY)
+    if fetched is None:
+        print("Snapshot skipped: the Skinport catalog is not available.")
+        return None
+    catalog, fetched_at = fetched
+    if price_fetcher.is_snapshot_catalog(fx.BASE_CURRENCY):
+        # Its prices are not current; the live catalog is downloading.
+        print("Snapshot skipped: only the bundled catalog snapshot is loaded.")
+        return None
+    if started - fetched_at > SNAPSHOT_INTERVAL_SECONDS:
+        print(
+            "Snapshot skipped: the Skinport catalog could not be refreshed "
+            f"and is {(started - fetched_at) / 60:.0f} minutes old."
+        )
+        return None
+
+    rows_written = database.save_prices(
+        {name: {"skinport": price} for name, price in catalog.items()},
+        timestamp=datetime.fromtimestamp(fetched_at, timezone.utc),
+    )
+    # Refreshed here, off the request path, so requests find fresh rates.
+    for currency in SNAPSHOT_FX_CURRENCIES:
+        fx.refresh_rate(currency)
+
+    run = {
+        "started_at": int(started),
+        "duration": time.monotonic() - start,
+        "items": len(catalog),
+        "rows_written": rows_written,
+    }
+    database.record_snapshot_run(**run)
+    print(
+        f"Snapshot of {run['items']} items took {run['duration']:.2f}s "
+        f"({run['rows_written']} rows written)."
+    )
+    return run
+
+
+def seconds_until_next_run(
+    last_started_at: int | None,
+    now: float,
+    interval: float | None = None,
+    jitter: float | None = None,
+) -> float:
+    """
+    Computes how long to wait before the next snapshot.
+
+    A run that is overdue (because the scheduler was stopped or a snapshot
+    took too long) is started right away. Past prices cannot be fetched
+    afterwards, so missed runs are caught up with a single snapshot rather
+    than one per missed interval.
+    """
+    if interval is None:
+        interval = SNAPSHOT_INTERVAL_SECONDS
+    if jitter is None:
+        jitter = SNAPSHOT_JITTER_SECONDS
+    if last_started_at is None:
+        return 0.0
+    remaining = last_started_at + interval - now
+    if remaining <= 0:
+        return 0.0
+    return remaining + random.uniform(0, jitter)
+
+
+def run_forever(stop_event: threading.Event | None = None):
+    """
+    Takes snapshots every SNAPSHOT_INTERVAL_SECONDS until `stop_event` is
+    set. The time of the last snapshot is read from the database, so a
+    restarted scheduler continues the same schedule.
+    """
+    stop_event = stop_event or threading.Event()
+    database.create_tables()
+    print(
+        f"Snapshot scheduler started (every {SNAPSHOT_INTERVAL_SECONDS}s, "
+        f"up to {SNAPSHOT_JITTER_SECONDS}s jitter)."
+    )
+
+    while not stop_event.is_set():
+        last_run = database.get_last_snapshot_run()
+        wait = seconds_until_next_run(
+            last_run["started_at"] if last_run else None, time.time()
+        )
+        if wait > 0:
+            print(f"Next snapshot in {wait:.0f}s.")
+            if stop_event.wait(wait):
+                break
+
+        if take_snapshot() is None:
+            # Do not retry in a tight loop while the API is down.
+            stop_event.wait(min(SNAPSHOT_INTERVAL_SECONDS, 60))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["once"]:
+        database.create_tables()
+        take_snapshot()
+    else:
+        try:
+            run_forever()
+        except KeyboardInterrupt:
+            print("Snapshot scheduler stopped.")
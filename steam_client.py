@@ -2,121 +2,469 @@
 Handles fetching a user's Steam inventory.
 """
 
+import json
+import os
+import threading
+import time
+
 import requests
 
+import database
+import http_client
+import metrics
 
+# For CS2, the app_id is 730 and the context_id is 2.
+STEAM_INVENTORY_URL = "https://steamcommunity.com/inventory/{steam_id}/730/2"
 
-def get_inventory(
+# Assets requested per page. Steam rejects pages larger than 2000.
+INVENTORY_PAGE_SIZE = int(os.environ.get("STEAM_INVENTORY_PAGE_SIZE", "2000"))
+
+# How long (in seconds) a downloaded inventory is re-used for the same
+# SteamID, whatever filters are requested. Set to 0 to disable the cache.
+INVENTORY_CACHE_TTL_SECONDS = int(
+    os.environ.get("STEAM_INVENTORY_CACHE_TTL", "300")
+)
+
+# A cached inventory requested at least this many times is refreshed in the
+# background once half of its TTL has passed, so hot SteamIDs never expire.
+HOT_INVENTORY_HITS = 2
+
+# Cache hits per SteamID since its inventory was last downloaded.
+_inventory_hits = {}
+_inventory_refreshing = set()
+_inventory_lock = threading.Lock()
+
+# This test data is assumed to be tradable and of various types
+TEST_ITEMS = [
+    "AK-47 | Redline (Field-Tested)",  # Rifle
+    "AWP | Asiimov (Field-Tested)",  # Rifle
+    "Glock-18 | Water Elemental (Minimal Wear)",  # Pistol
+    "USP-S | Kill Confirmed (Field-Tested)",  # Pistol
+    "★ Karambit | Doppler (Factory New)",  # Knife
+    "Sticker | Natus Vincere (Holo) | Katowice 2014",  # Sticker
+]
+
+
+class IncompleteInventoryError(Exception):
+    """
+    Raised when Steam stops answering partway through an inventory.
+
+    Attributes:
+        quantities: The {market_hash_name: quantity} counted before the
+                    failure, when raised by get_inventory_quantities.
+    """
+
+    def __init__(self, message: str, quantities: dict[str, int] | None = None):
+        super().__init__(message)
+        self.quantities = quantities or {}
+
+
+def iter_inventory_pages(steam_id: str, count: int | None = None):
+    """
+    Fetches a user's CS2 inventory page by page, following 'last_assetid'
+    for as long as Steam reports 'more_items'.
+
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        count: The number of assets to request per page.
+               Defaults to INVENTORY_PAGE_SIZE.
+
+    Yields:
+        The decoded JSON of each page, with 'assets' and 'descriptions'.
+        Yields nothing (after printing why) if the first page cannot be
+        fetched, e.g. because the inventory is private.
+
+    Raises:
+        http_client.RateLimitExceeded: If Steam asked to wait longer than
+            HTTP_MAX_BACKOFF before sending the first page.
+        IncompleteInventoryError: If a later page cannot be fetched, so the
+            pages already yielded are not the whole inventory.
+    """
+    inventory_url = STEAM_INVENTORY_URL.format(steam_id=steam_id)
+    params = {"l": "english", "count": count or INVENTORY_PAGE_SIZE}
+    page_number = 0
+
+    while True:
+        page_number += 1
+        try:
+            response = http_client.get(inventory_url, params=params)
+            # Raise an exception for bad status codes
+            response.raise_for_status()
+            data = response.json()
+        except http_client.RateLimitExceeded as e:
+            if page_number == 1:
+                raise
+            error = f"Steam rate limited the inventory download: {e}"
+            data = None
+        except requests.exceptions.RequestException as e:
+            error = f"An error occurred while fetching the inventory: {e}"
+            data = None
+        except ValueError:  # Catches JSON decoding errors
+            error = (
+                "Failed to decode JSON from response. "
+                "The user's inventory might be private."
+            )
+            data = None
+        if data is not None and (
+            data.get("success") != 1 or "descriptions" not in data
+        ):
+            reason = data.get("error", "No descriptions found")
+            error = f"Failed to fetch inventory. Response: {reason}"
+            data = None
+
+        if data is None:
+            if page_number > 1:
+                raise IncompleteInventoryError(
+                    f"Inventory page {page_number} of {steam_id} "
+                    f"failed: {error}"
+                )
+            print(error)
+            return
+
+        yield data
+
+        if not data.get("more_items") or not data.get("last_assetid"):
+            return
+        print(
+            f"Fetched inventory page {page_number}, requesting the next one..."
+        )
+        params["start_assetid"] = data["last_assetid"]
+
+
+def _parse_description(description: dict) -> dict:
+    """
+    Extracts the attributes used for filtering and display from an item
+    description. This is done once per description, however many assets
+    share it.
+    """
+    # Safely get the name of each tag, checking common keys
+    tags = {
+        tag.get("category"): tag.get("name") or tag.get("localized_tag_name")
+        for tag in description.get("tags", [])
+    }
+    return {
+        "market_hash_name": description["market_hash_name"],
+        "type": tags.get("Type"),
+        "rarity": tags.get("Rarity"),
+        "exterior": tags.get("Exterior"),
+        "tradable": description.get("tradable", 0) == 1,
+        "marketable": description.get("marketable", 0) == 1,
+    }
+
+
+def _description_key(entry: dict) -> str:
+    """Returns the classid_instanceid key shared by assets and descriptions."""
+    return f"{entry['classid']}_{entry.get('instanceid', '0')}"
+
+
+def _index_descriptions(descriptions: list[dict]) -> dict[str, dict]:
+    """Maps classid_instanceid to the parsed attributes of each description."""
+    return {
+        _description_key(desc): _parse_description(desc)
+        for desc in descriptions
+    }
+
+
+def _matches_filters(
+    attributes: dict, filter_tradable: bool, filter_item_type: str | None
+) -> bool:
+    """Checks a parsed description against the inventory filters."""
+    # Apply tradable filter
+    if filter_tradable and not attributes["tradable"]:
+        return False
+
+    # Apply item type filter. Items without a Type tag never match.
+    if filter_item_type:
+        type_name = attributes["type"]
+        return (
+            bool(type_name) and filter_item_type.lower() in type_name.lower()
+        )
+
+    return True
+
+
+def _count_items(
+    assets: list[dict],
+    attributes: dict[str, dict],
+    filter_tradable: bool,
+    filter_item_type: str | None,
+) -> dict[str, int]:
+    """
+    Returns {market_hash_name: quantity} for the assets matching the filters.
+    Assets are grouped by description first, so the filters run once per
+    unique description rather than once per asset.
+    """
+    asset_counts = {}
+    for asset in assets:
+        key = _description_key(asset)
+        asset_counts[key] = asset_counts.get(key, 0) + int(
+            asset.get("amount", 1)
+        )
+
+    quantities = {}
+    for key, amount in asset_counts.items():
+        item = attributes.get(key)
+        if item is None or not _matches_filters(
+            item, filter_tradable, filter_item_type
+        ):
+            continue
+        name = item["market_hash_name"]
+        quantities[name] = quantities.get(name, 0) + amount
+    return quantities
+
+
+def _add_page(inventory: dict, page: dict):
+    """Adds the assets and descriptions of a page to a raw inventory."""
+    inventory["assets"].extend(
+        {
+            "classid": asset["classid"],
+            "instanceid": asset.get("instanceid", "0"),
+            "amount": asset.get("amount", "1"),
+        }
+        for asset in page.get("assets", [])
+    )
+    for desc in page["descriptions"]:
+        key = _description_key(desc)
+        if key not in inventory["descriptions"]:
+            inventory["descriptions"][key] = desc
+            inventory["attributes"][key] = _parse_description(desc)
+
+
+def _load_cached_inventory(steam_id: str) -> tuple[dict, float] | None:
+    """Returns (raw_inventory, age_in_seconds) from the cache, if any."""
+    if INVENTORY_CACHE_TTL_SECONDS <= 0:
+        return None
+    cached = database.get_cached_inventory(steam_id)
+    if cached is None:
+        return None
+    payload, fetched_at = cached
+    return json.loads(payload), time.time() - fetched_at
+
+
+def _store_inventory(steam_id: str, inventory: dict):
+    """Saves a fully downloaded raw inventory to the cache."""
+    if INVENTORY_CACHE_TTL_SECONDS <= 0:
+        return
+    payload = {
+        "assets": inventory["assets"],
+        "descriptions": list(inventory["descriptions"].values()),
+    }
+    database.save_cached_inventory(
+        steam_id, json.dumps(payload), int(time.time())
+    )
+    with _inventory_lock:
+        _inventory_hits.pop(steam_id, None)
+
+
+def _refresh_inventory(steam_id: str, count: int | None):
+    """Downloads a whole inventory and stores it in the cache."""
+    try:
+        inventory = {"assets": [], "descriptions": {}, "attributes": {}}
+        complete = False
+        for page in iter_inventory_pages(steam_id, count=count):
+            _add_page(inventory, page)
+            complete = not (
+                page.get("more_items") and page.get("last_assetid")
+            )
+        if complete:
+            _store_inventory(steam_id, inventory)
+            print(
+                f"Refreshed cached inventory for {steam_id} in the background."
+            )
+    except (IncompleteInventoryError, http_client.RateLimitExceeded) as e:
+        print(f"Could not refresh the cached inventory: {e}")
+    finally:
+        with _inventory_lock:
+            _inventory_refreshing.discard(steam_id)
+        database.close_connection()
+
+
+def _note_cache_hit(steam_id: str, age: float, count: int | None):
+    """Counts a cache hit and refreshes hot entries past half their TTL."""
+    with _inventory_lock:
+        hits = _inventory_hits.get(steam_id, 0) + 1
+        _inventory_hits[steam_id] = hits
+        if (
+            hits < HOT_INVENTORY_HITS
+            or age < INVENTORY_CACHE_TTL_SECONDS / 2
+            or steam_id in _inventory_refreshing
+        ):
+            return
+        _inventory_refreshing.add(steam_id)
+
+    threading.Thread(
+        target=_refresh_inventory, args=(steam_id, count), daemon=True
+    ).start()
+
+
+def iter_inventory(
     steam_id: str,
     use_test_data: bool = False,
     filter_tradable: bool = False,
     filter_item_type: str = None,
-) -> list[str]:
-
+    count: int | None = None,
+):
     """
-    Fetches a user's CS2 inventory and returns a list of market_hash_names.
+    Fetches a user's CS2 inventory and yields matching market_hash_names
+    one page at a time, so callers can start working on the first page
+    while later pages are still being downloaded.
+
+    Complete downloads are cached per SteamID for INVENTORY_CACHE_TTL_SECONDS
+    as raw assets and descriptions, so later calls with any filters are
+    answered from the cache in a single page.
 
     Args:
         steam_id: The 64-bit SteamID of the user.
-        use_test_data: If True, returns a hardcoded list of items for testing.
-        filter_tradable: If True, only returns tradable items.
-        filter_item_type: If set, only returns items with this type tag.
-
-    Returns:
-        A list of 'market_hash_name' for all matching items in the inventory.
-        Returns an empty list if the inventory is private or an error occurs.
+        use_test_data: If True, yields a hardcoded list of items for testing.
+        filter_tradable: If True, only yields tradable items.
+        filter_item_type: If set, only yields items with this type tag.
+        count: The number of assets to request per page.
+               Defaults to INVENTORY_PAGE_SIZE.
+
+    Yields:
+        A {market_hash_name: quantity} dictionary with the matching items
+        of each page. The same item may appear on several pages.
+
+    Raises:
+        http_client.RateLimitExceeded: If Steam asked to wait longer than
+            HTTP_MAX_BACKOFF and no expired copy is cached.
+        IncompleteInventoryError: If Steam stops answering after the first
+            page. Incomplete inventories are not cached.
     """
     if use_test_data:
         print("[Debug] Using hardcoded test inventory data.")
+        yield {
+            item: 1
+            for item in TEST_ITEMS
+            if not filter_item_type or filter_item_type.lower() in item.lower()
+        }
+        return
+
+    cached = _load_cached_inventory(steam_id)
+    if cached is not None:
+        payload, age = cached
+        if age < INVENTORY_CACHE_TTL_SECONDS:
+            print(f"Using cached inventory for {steam_id} ({age:.0f}s old).")
+            metrics.cache_lookup("inventory", "hit")
+            _note_cache_hit(steam_id, age, count)
+            yield _count_items(
+                payload["assets"],
+                _index_descriptions(payload["descriptions"]),
+                filter_tradable,
+                filter_item_type,
+            )
+            return
 
-        # This test data is assumed to be tradable and of various types
-        test_items = [
-            "AK-47 | Redline (Field-Tested)",  # Rifle
-            "AWP | Asiimov (Field-Tested)",  # Rifle
-            "Glock-18 | Water Elemental (Minimal Wear)",  # Pistol
-            "USP-S | Kill Confirmed (Field-Tested)",  # Pistol
-            "★ Karambit | Doppler (Factory New)",  # Knife
-            "Sticker | Natus Vincere (Holo) | Katowice 2014",  # Sticker
-
-        ]
-        if filter_item_type:
-            return [
-                item
-                for item in test_items
-                if filter_item_type.lower() in item.lower()
-            ]
-        return test_items
-
-    # For CS2, the app_id is 730 and the context_id is 2.
-    inventory_url = f"https://steamcommunity.com/inventory/{steam_id}/730/2"
-    market_hash_names = []
+    metrics.cache_lookup("inventory", "miss")
+    # Raw inventory accumulated for the cache, plus the parsed attributes of
+    # each description. Descriptions are kept across pages in case an asset's
+    # description was sent with an earlier page.
+    inventory = {"assets": [], "descriptions": {}, "attributes": {}}
+    complete = False
 
     try:
-        response = requests.get(inventory_url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        data = response.json()
+        for page in iter_inventory_pages(steam_id, count=count):
+            _add_page(inventory, page)
+            complete = not (
+                page.get("more_items") and page.get("last_assetid")
+            )
+            yield _count_items(
+                page.get("assets", []),
+                inventory["attributes"],
+                filter_tradable,
+                filter_item_type,
+            )
+    except http_client.RateLimitExceeded as e:
+        if cached is None:
+            raise
+        print(f"Steam is rate limiting requests: {e}")
+
+    if complete:
+        _store_inventory(steam_id, inventory)
+    elif not inventory["assets"] and cached is not None:
+        # Steam failed (e.g. rate limited us): an expired copy beats nothing.
+        print(f"Serving expired cached inventory for {steam_id}.")
+        payload, _ = cached
+        yield _count_items(
+            payload["assets"],
+            _index_descriptions(payload["descriptions"]),
+            filter_tradable,
+            filter_item_type,
+        )
 
 
-        if data.get("success") != 1 or "descriptions" not in data:
-            print(
-                f"Failed to fetch inventory. Response: {data.get('error', 'No descriptions found')}"
-            )
-            return []
+@metrics.timed("inventory")
+def get_inventory_quantities(
+    steam_id: str,
+    use_test_data: bool = False,
+    filter_tradable: bool = False,
+    filter_item_type: str = None,
+) -> dict[str, int]:
+    """
+    Fetches a user's CS2 inventory and counts the assets of each item.
 
-        # Create a mapping from classid_instanceid to the description object
-        descriptions = {
-            f"{desc['classid']}_{desc.get('instanceid', '0')}": desc
-            for desc in data["descriptions"]
-        }
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        use_test_data: If True, uses a hardcoded list of items for testing.
+        filter_tradable: If True, only counts tradable items.
+        filter_item_type: If set, only counts items with this type tag.
 
-        for asset in data.get("assets", []):
-            asset_key = f"{asset['classid']}_{asset['instanceid']}"
-            description = descriptions.get(asset_key)
-
-            if not description:
-                continue
-
-            # Apply tradable filter
-            is_tradable = description.get("tradable", 0) == 1
-            if filter_tradable and not is_tradable:
-                continue
-
-            # Apply item type filter
-            if filter_item_type:
-                item_tags = description.get("tags", [])
-                # Find the 'Type' tag dictionary safely
-                type_tag_dict = next(
-                    (tag for tag in item_tags if tag.get("category") == "Type"),
-                    None,
-                )
+    Returns:
+        A dictionary mapping 'market_hash_name' to the number of matching
+        assets. Empty if the inventory is private or an error occurs.
 
-                if not type_tag_dict:
-                    continue  # Skip item if it has no Type tag and we are filtering
+    Raises:
+        IncompleteInventoryError: If Steam stops answering after the first
+            page; its 'quantities' holds the assets counted until then.
+    """
+    quantities = {}
+    try:
+        for page in iter_inventory(
+            steam_id,
+            use_test_data=use_test_data,
+            filter_tradable=filter_tradable,
+            filter_item_type=filter_item_type,
+        ):
+            for item, quantity in page.items():
+                quantities[item] = quantities.get(item, 0) + quantity
+    except IncompleteInventoryError as e:
+        e.quantities = quantities
+        raise
+    return quantities
 
-                # Safely get the name of the type, checking common keys
-                type_name = type_tag_dict.get(
-                    "name"
-                ) or type_tag_dict.get("localized_tag_name")
 
-                if (
-                    not type_name
-                    or filter_item_type.lower() not in type_name.lower()
-                ):
-                    continue
+def get_inventory(
+    steam_id: str,
+    use_test_data: bool = False,
+    filter_tradable: bool = False,
+    filter_item_type: str = None,
+) -> list[str]:
+    """
+    Fetches a user's CS2 inventory and returns a list of market_hash_names.
 
-            market_hash_names.append(description["market_hash_name"])
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        use_test_data: If True, returns a hardcoded list of items for testing.
+        filter_tradable: If True, only returns tradable items.
+        filter_item_type: If set, only returns items with this type tag.
 
-        return market_hash_names
+    Returns:
+        A list of 'market_hash_name' for all matching items in the inventory.
+        Returns an empty list if the inventory is private or an error occurs.
 
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while fetching the inventory: {e}")
-        return []
-    except ValueError:  # Catches JSON decoding errors
-        print(
-            "Failed to decode JSON from response. The user's inventory might be private."
-        )
-        return []
+    Raises:
+        IncompleteInventoryError: If Steam stops answering after the first
+            page.
+    """
+    quantities = get_inventory_quantities(
+        steam_id,
+        use_test_data=use_test_data,
+        filter_tradable=filter_tradable,
+        filter_item_type=filter_item_type,
+    )
+    return [
+        item for item, quantity in quantities.items() for _ in range(quantity)
+    ]
 
 
 if __name__ == "__main__":
@@ -153,4 +501,3 @@ if __name__ == "__main__":
             print(f"- {item}")
     else:
         print("No weapon items found or could not fetch inventory.")
-
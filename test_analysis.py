@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import analysis
+import database
+
+ITEM = "AK-47 | Redline (Field-Tested)"
+
+
+def insert_history(rows):
+    """Saves (item_name, price, days_ago) rows into the price history."""
+    now = datetime.now(timezone.utc)
+    for name, price, days in rows:
+        database.save_prices(
+            {name: {"skinport": price}}, timestamp=now - timedelta(days=days)
+        )
+
+
+def test_analyze_items_trend_batch(db):
+    insert_history(
+        [
+            (ITEM, 50.0, 10),
+            (ITEM, 52.5, 5),
+            (ITEM, 51.0, 2),
+            ("Old Item", 10.0, 40),
+            ("Old Item", 10.0, 35),
+            ("Quiet Item", 20.0, 20),
+            ("Quiet Item", 22.0, 15),
+        ]
+    )
+
+    trends = analysis.analyze_items_trend(
+        [ITEM, "Old Item", "Quiet Item", "Unpriced Item"],
+        {
+            ITEM: 45.0,
+            "Old Item": 10.0,
+            "Quiet Item": 30.0,
+            "Unpriced Item": None,
+        },
+    )
+
+    assert set(trends) == {ITEM, "Old Item", "Quiet Item"}
+    assert trends[ITEM].startswith("Low: Current price ($45.00)")
+    # Only the price in effect when the window starts.
+    assert trends["Old Item"] == "Not enough data to analyze trend."
+    # Without recent samples, the price that still holds is the average.
+    assert trends["Quiet Item"] == (
+        "High: Current price ($30.00) is >10% above 7-day average ($22.00)."
+    )
+
+
+def test_averages_are_weighted_by_time(db):
+    insert_history([(ITEM, 50.0, 10), (ITEM, 52.5, 5), (ITEM, 51.0, 2)])
+    now = datetime.now(timezone.utc)
+    # Days of the 7-day window (which starts at midnight) before 52.5.
+    before = 2 + (
+        now - now.replace(hour=0, minute=0, second=0, microsecond=0)
+    ) / (timedelta(days=1))
+
+    samples, _, recent = analysis.get_price_averages([ITEM])[ITEM]
+
+    assert samples == 3
+    expected = (50.0 * before + 52.5 * 3 + 51.0 * 2) / (before + 5)
+    assert recent == pytest.approx(expected, rel=1e-4)
+
+
+def test_analyze_item_trend_matches_batch(db):
+    insert_history([(ITEM, 50.0, 10), (ITEM, 52.5, 5), (ITEM, 51.0, 2)])
+
+    for price in (45.0, 51.5, 60.0):
+        assert analysis.analyze_item_trend(ITEM, price) == (
+            analysis.analyze_items_trend([ITEM], {ITEM: price})[ITEM]
+        )
+
+
+def test_get_price_history_is_a_step_function(db):
+    insert_history([(ITEM, 50.0, 40), (ITEM, 52.5, 5), (ITEM, 51.0, 2)])
+
+    history = analysis.get_price_history(ITEM, days=30)
+
+    # The price set 40 days ago still held when the window started.
+    assert [price for _, price in history] == [50.0, 52.5, 51.0]
+    assert all(ts.tzinfo is timezone.utc for ts, _ in history)
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    assert abs((history[0][0] - start).total_seconds()) < 5
+
+
+def test_price_history_reads_one_source_in_the_requested_currency(mocker):
+    now = datetime.now(timezone.utc)
+    database.save_prices(
+        {ITEM: {"skinport": 50.0, "steam": 60.0, "skinport:legacy": 45.0}},
+        timestamp=now - timedelta(days=2),
+    )
+    mocker.patch(
+        "fx.get_rate",
+        side_effect=lambda c: {"USD": 1.0, "EUR": 0.5}.get(c),
+    )
+
+    assert [p for _, p in analysis.get_price_history(ITEM)] == [50.0]
+    assert [
+        p for _, p in analysis.get_price_history(ITEM, source="steam")
+    ] == [60.0]
+    assert [
+        p for _, p in analysis.get_price_history(ITEM, currency="EUR")
+    ] == [25.0]
+    assert analysis.get_price_history(ITEM, currency="SEK") == []
+
+
+def test_history_is_converted_to_the_requested_currency(db, mocker):
+    insert_history([(ITEM, 100.0, 3), (ITEM, 100.0, 2)])
+    mocker.patch(
+        "fx.get_rate", side_effect=lambda c: {"USD": 1.0, "EUR": 0.5}[c]
+    )
+
+    in_eur = analysis.analyze_items_trend([ITEM], {ITEM: 50.0}, currency="EUR")
+    in_usd = analysis.analyze_items_trend([ITEM], {ITEM: 50.0}, currency="USD")
+
+    assert in_eur[ITEM].startswith("Stable")
+    assert in_usd[ITEM].startswith("Low")
@@ -0,0 +1,109 @@
+import math
+import statistics
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import analytics
+import database
+
+NOW = 1_750_000_000
+HOUR = 3600
+
+
+@pytest.fixture(autouse=True)
+def no_dedup(monkeypatch):
+    """Stores every sample, so the series below are kept as written."""
+    monkeypatch.setattr(database, "PRICE_DEDUP", False)
+
+
+def save(name, price, hours_ago):
+    database.save_prices(
+        {name: {"skinport": price}},
+        timestamp=datetime.fromtimestamp(NOW - hours_ago * HOUR, timezone.utc),
+    )
+
+
+def test_history_is_resampled_as_a_step_function():
+    save("A", 5.0, 30)  # Before the window: carried in
+    save("A", 7.0, 3.5)
+    save("A", 8.0, 3.2)  # Same step as 7.0: the later price wins
+    save("B", 2.0, 1)
+
+    names, grid, prices = analytics.load_price_matrix(
+        ["A", "B", "Unknown"], days=1, now=NOW
+    )
+
+    assert names == ["A", "B", "Unknown"]
+    assert len(grid) == 24 and grid[-1] == NOW
+    assert prices[0].tolist() == [5.0] * 20 + [8.0] * 4
+    # A price saved exactly at a step's end counts for that step.
+    assert np.isnan(prices[1, :22]).all() and prices[1, 22:].tolist() == [
+        2.0,
+        2.0,
+    ]
+    assert np.isnan(prices[2]).all()
+
+
+def test_vectorized_statistics_match_plain_python():
+    series = [10.0, 12.0, 11.0, 13.0, 12.5, 14.0]
+    for hours_ago, price in zip(range(len(series) - 1, -1, -1), series):
+        save("A", price, hours_ago)
+
+    values = np.array([series])
+    assert analytics.rolling_mean(values, 3)[0].tolist() == pytest.approx(
+        [10.0, 11.0, 11.0, 12.0, 12.1666667, 13.1666667]
+    )
+
+    expected_ema = series[0]
+    for price in series[1:]:
+        expected_ema += (price - expected_ema) * 2 / 4
+    assert analytics.ema(values, 3)[0, -1] == pytest.approx(expected_ema)
+
+    stats = analytics.summarize(
+        ["A", "B"], {"A": 15.0}, days=6 / 24, recent_days=3 / 24, now=NOW
+    )
+    assert list(stats) == ["A"]
+    a = stats["A"]
+    returns = [math.log(b / a) for a, b in zip(series, series[1:])]
+    assert a["samples"] == 6
+    assert a["mean"] == pytest.approx(statistics.fmean(series))
+    assert a["mean_recent"] == pytest.approx(statistics.fmean(series[-3:]))
+    assert a["ema"] == pytest.approx(expected_ema)
+    assert a["volatility"] == pytest.approx(
+        statistics.pstdev(returns) * math.sqrt(24)
+    )
+    assert a["zscore"] == pytest.approx(
+        (15.0 - statistics.fmean(series)) / statistics.pstdev(series)
+    )
+    assert a["p50"] == pytest.approx(statistics.median(series))
+
+
+def test_statistics_are_converted_to_the_requested_currency(mocker):
+    save("A", 10.0, 2)
+    save("A", 20.0, 1)
+    mocker.patch(
+        "fx.get_rate", side_effect=lambda c: {"USD": 1.0, "EUR": 0.5}[c]
+    )
+
+    usd = analytics.summarize(["A"], days=2 / 24, now=NOW)["A"]
+    eur = analytics.summarize(["A"], currency="EUR", days=2 / 24, now=NOW)["A"]
+
+    assert eur["mean"] == pytest.approx(usd["mean"] * 0.5)
+    assert eur["p90"] == pytest.approx(usd["p90"] * 0.5)
+    assert eur["volatility"] == pytest.approx(usd["volatility"])
+
+
+def test_percentiles_match_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(1, 100, (5, 40))
+    values[1, :10] = np.nan
+    values[3] = np.nan
+
+    result = analytics.percentiles(values, [10, 50, 90])
+
+    expected = np.full((3, 5), np.nan)
+    for row in (0, 1, 2, 4):
+        expected[:, row] = np.nanpercentile(values[row], [10, 50, 90])
+    np.testing.assert_allclose(result, expected)
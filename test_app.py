@@ -1,6 +1,14 @@
+import gzip
+import json
 import pytest
 import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 import database
+import price_fetcher
+import tracker
 
 # Import the Flask app instance and the function to be tested
 from app import app
@@ -55,7 +63,9 @@ def test_track_route_test_mode(client, mocker):
                 "Item 1": {"current_price": 10.0, "trend": "Stable"},
                 "Item 2": {"current_price": 25.0, "trend": "High"},
             },
-            None,  # The third return value is the error message, which is None in a success case
+            # The third return value is the error message, which is None
+            # in a success case
+            None,
         ),
     )
 
@@ -66,3 +76,247 @@ def test_track_route_test_mode(client, mocker):
     )  # "Resultados del Análisis"
     assert b"Item 1" in response.data
     assert b"Stable" in response.data
+
+
+def test_track_stream_page(client, mocker):
+    """
+    With stream=true, /track renders the page shell without running the
+    tracker.
+    """
+    run_tracker = mocker.patch("tracker.run_tracker")
+
+    response = client.post(
+        "/track",
+        data={"use_test_data": "true", "stream": "true", "currency": "EUR"},
+    )
+
+    assert response.status_code == 200
+    assert b"/api/track/stream" in response.data
+    run_tracker.assert_not_called()
+
+
+def test_track_stream_api(client, mocker):
+    """
+    The stream endpoint sends each tracker event as soon as it is yielded.
+    """
+    events = [
+        {
+            "event": "item",
+            "item": "Item 1",
+            "current_price": 10.0,
+            "quantity": 2,
+            "total_value": 20.0,
+            "trend": "Stable",
+        },
+        {
+            "event": "done",
+            "items": 1,
+            "total_quantity": 2,
+            "total_value": 20.0,
+        },
+    ]
+    mocker.patch("tracker.iter_tracker", return_value=iter(events))
+
+    response = client.get("/api/track/stream?use_test_data=true")
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in response.data.splitlines()] == events
+
+    mocker.patch("tracker.iter_tracker", return_value=iter(events))
+    response = client.get("/api/track/stream?use_test_data=true&format=sse")
+    assert response.mimetype == "text/event-stream"
+    assert response.data.decode().startswith(
+        'event: item\ndata: {"event": "item"'
+    )
+
+    assert client.get("/api/track/stream").status_code == 400
+    assert client.get("/track").status_code == 400
+
+
+def test_track_route_etag_and_coalescing(client, mocker):
+    """Repeat views are answered with 304 and share one tracker run."""
+    tracker.clear_result_cache()
+    run_tracker = mocker.patch(
+        "tracker.run_tracker",
+        return_value=(
+            ["Item 1"],
+            {
+                "Item 1": {
+                    "current_price": 10.0,
+                    "quantity": 1,
+                    "total_value": 10.0,
+                    "trend": "Stable",
+                }
+            },
+            None,
+        ),
+    )
+
+    first = client.get("/track?use_test_data=true&currency=EUR")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("private, max-age=")
+
+    repeat = client.get(
+        "/track?use_test_data=true&currency=EUR",
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+    assert repeat.status_code == 304
+    assert run_tracker.call_count == 1
+    tracker.clear_result_cache()
+
+
+def test_metrics_route(client, mocker, monkeypatch):
+    """/metrics reports stage timings, cache lookups and table sizes."""
+    tracker.clear_result_cache()
+    mocker.patch("tracker.run_tracker", return_value=([], {}, None))
+
+    client.get("/track?use_test_data=true")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.data.decode()
+    assert 'tracker_stage_seconds_count{stage="render"}' in body
+    assert 'cache_lookups_total{cache="result",result="miss"}' in body
+    assert 'db_rows{table="price_history"} 0' in body
+    tracker.clear_result_cache()
+
+    monkeypatch.setattr("metrics.ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_portfolio_route(client):
+    """/api/portfolio returns the recorded value history of a SteamID."""
+    database.create_tables()
+    item = "AK-47 | Redline (Field-Tested)"
+    database.save_prices({item: {"skinport": 10.0}})
+    database.update_holdings("76561198000000000", {item: 2})
+
+    response = client.get("/api/portfolio?steam_id=76561198000000000&days=30")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["currency"] == "USD"
+    assert [point["value"] for point in data["values"]][0] == 20.0
+    assert client.get("/api/portfolio").status_code == 400
+    assert client.get("/api/portfolio?steam_id=1&days=x").status_code == 400
+
+
+def test_track_with_a_portfolio_is_revalidated(client, mocker, monkeypatch):
+    """The portfolio chart does not change the page (and ETag) over time."""
+    tracker.clear_result_cache()
+    item = "AK-47 | Redline (Field-Tested)"
+    now = datetime.now(timezone.utc)
+    database.save_prices({item: {"skinport": 10.0}}, now - timedelta(hours=2))
+    database.update_holdings(
+        "76561198000000000", {item: 2}, now - timedelta(hours=2)
+    )
+    database.save_prices({item: {"skinport": 12.0}}, now - timedelta(hours=1))
+    mocker.patch(
+        "tracker.run_tracker",
+        return_value=(
+            [item],
+            {
+                item: {
+                    "current_price": 12.0,
+                    "quantity": 2,
+                    "total_value": 24.0,
+                    "trend": "Stable",
+                }
+            },
+            None,
+        ),
+    )
+    url = "/track?steam_id=76561198000000000"
+
+    first = client.get(url)
+    later = time.time() + 3600
+    monkeypatch.setattr("time.time", lambda: later)
+    repeat = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert b"<polyline" in first.data
+    assert repeat.status_code == 304
+    tracker.clear_result_cache()
+
+
+def test_snapshot_served_track_does_not_record_prices(
+    client, mocker, tmp_path, monkeypatch
+):
+    """Day-old snapshot prices are shown by /track but not saved as current."""
+    item = "AK-47 | Redline (Field-Tested)"
+    snapshot_path = str(tmp_path / "catalog_snapshot.json.gz")
+    with gzip.open(snapshot_path, "wt", encoding="utf-8") as f:
+        json.dump(
+            {
+                "currency": "USD",
+                "fetched_at": time.time() - 20 * 3600,
+                "prices": {item: 12.5},
+            },
+            f,
+        )
+    monkeypatch.setattr(price_fetcher, "CATALOG_SNAPSHOT_FILE", snapshot_path)
+    monkeypatch.setattr(price_fetcher, "CATALOG_TTL_SECONDS", 300)
+    price_fetcher.clear_catalog_cache()
+    tracker.clear_result_cache()
+    mocker.patch("price_fetcher._refresh_catalog_in_background")
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value={item: 2}
+    )
+    mocker.patch("price_writer.save_prices", side_effect=database.save_prices)
+
+    response = client.post("/track", data={"steam_id": "76561198000000000"})
+
+    assert response.status_code == 200
+    assert b"25.00" in response.data
+    conn = database.get_db_connection()
+    for table in ("price_history", "latest_prices", "price_daily"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    assert database.get_portfolio_values("76561198000000000") == []
+    price_fetcher.clear_catalog_cache()
+    tracker.clear_result_cache()
+
+
+# Import time allowed for app.py and the project modules it imports at
+# startup, on top of Flask itself, in milliseconds.
+IMPORT_TIME_BUDGET_MS = 50
+
+
+def test_app_import_stays_within_budget():
+    """A cold start only imports Flask and a few light project modules."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    project_modules = {
+        name[:-3] for name in os.listdir(root) if name.endswith(".py")
+    }
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines look like "import time:  self [us] | cumulative | <indent>name".
+    imported = {}
+    app_self_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        level = (len(name) - len(name.lstrip())) // 2
+        imported[name.strip()] = (level, int(cumulative_us))
+        if name.strip() == "app":
+            app_self_us = int(self_us)
+
+    for heavy in ("tracker", "requests", "sqlite3", "numpy", "brotli"):
+        assert heavy not in imported, f"app imports {heavy} at startup"
+
+    # Direct imports of app are one level deeper than app itself.
+    app_level = imported["app"][0]
+    project_us = app_self_us + sum(
+        cumulative
+        for name, (level, cumulative) in imported.items()
+        if level == app_level + 1 and name in project_modules
+    )
+    assert project_us / 1000 < IMPORT_TIME_BUDGET_MS
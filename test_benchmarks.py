@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import database
+import price_fetcher
+import steam_client
+import tracker
+from benchmarks import bench_tracker
+from benchmarks.synthetic import make_catalog, make_inventory, populate_history
+from benchmarks.upstream_stub import UpstreamStub
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Starts each benchmark test with empty caches."""
+    price_fetcher.clear_catalog_cache()
+    tracker.clear_result_cache()
+    yield
+    price_fetcher.clear_catalog_cache()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with UpstreamStub(make_catalog(200)) as stub:
+        stub.add_inventory(bench_tracker.STEAM_ID, *make_inventory(50, 200))
+        monkeypatch.setattr(
+            price_fetcher, "SKINPORT_API_URL", stub.skinport_url
+        )
+        monkeypatch.setattr(
+            steam_client, "STEAM_INVENTORY_URL", stub.steam_inventory_url
+        )
+        yield stub
+
+
+def test_tracker_runs_against_the_stub(stub, monkeypatch):
+    monkeypatch.setattr(steam_client, "INVENTORY_PAGE_SIZE", 20)
+    populate_history(200, 10, database.to_epoch(datetime.now(timezone.utc)))
+
+    measured = bench_tracker.track_once(stub)
+
+    assert measured["items"] > 0
+    assert measured["priced"] == measured["items"]
+    # 50 assets in pages of 20.
+    assert measured["requests"] == {"skinport": 1, "steam": 3}
+    assert set(measured["stages"]) >= {
+        "inventory",
+        "catalog",
+        "prices",
+        "trends",
+        "total",
+    }
+    assert measured["db_mb"] > 0
+
+
+def test_stub_revalidates_the_catalog_with_its_etag(stub):
+    first = price_fetcher._download_catalog("USD")
+    second = price_fetcher._download_catalog("USD", cached=first)
+
+    assert len(first["prices"]) == 200
+    assert second["prices"] is first["prices"]
+    assert stub.requests["skinport"] == 2
+
+
+def test_find_regressions_ignores_noise_and_reports_slowdowns():
+    baseline = {
+        "small": {
+            "cold": {
+                "stages": {"inventory": 0.100, "trends": 0.001},
+                "peak_mb": 10.0,
+            }
+        }
+    }
+    results = {
+        "small": {
+            "cold": {
+                "stages": {"inventory": 0.200, "trends": 0.003},
+                "peak_mb": 11.0,
+            }
+        }
+    }
+
+    regressions = bench_tracker.find_regressions(
+        results, baseline, tolerance=0.25
+    )
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("small/cold inventory time")
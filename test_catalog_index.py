@@ -0,0 +1,60 @@
+import pytest
+
+import catalog_index
+
+PRICES = {
+    "AK-47 | Redline (Field-Tested)": 49.19,
+    "AWP | Asiimov (Field-Tested)": 171.13,
+    "★ Karambit | Doppler (Factory New)": 890.5,
+    "Zeus x27": 0.03,
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "catalog.idx")
+    catalog_index.write_index(
+        path, PRICES, {"fetched_at": 1700000000, "etag": '"v1"'}
+    )
+    index = catalog_index.CatalogIndex(path)
+    yield index
+    index.close()
+
+
+def test_lookup_by_name(index):
+    for name, price in PRICES.items():
+        assert index[name] == price
+    assert "Missing Item" not in index
+    assert index.get("Missing Item") is None
+    with pytest.raises(KeyError):
+        index["AK-47"]  # A prefix of a stored name
+
+
+def test_index_behaves_like_the_catalog_dict(index):
+    assert len(index) == 4
+    assert index == PRICES
+    assert list(index) == sorted(PRICES, key=lambda name: name.encode("utf-8"))
+    assert dict(index.items()) == PRICES
+    assert index.metadata == {"fetched_at": 1700000000, "etag": '"v1"'}
+
+
+def test_lookup_returns_only_known_items(index):
+    assert index.lookup(["Zeus x27", "Missing Item"]) == {"Zeus x27": 0.03}
+
+
+def test_empty_catalog(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    catalog_index.write_index(path, {})
+
+    index = catalog_index.CatalogIndex(path)
+
+    assert len(index) == 0
+    assert "Anything" not in index
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    path = tmp_path / "catalog.idx"
+    path.write_bytes(b'{"prices": {}}')
+
+    assert catalog_index.open_index(str(path)) is None
+    assert catalog_index.open_index(str(tmp_path / "missing.idx")) is None
@@ -0,0 +1,347 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import analysis
+import database
+import steam_client
+import tracker
+
+ITEM = "AWP | Asiimov (Field-Tested)"
+
+
+def fetch_rollups():
+    conn = database.get_db_connection()
+    rows = conn.execute(
+        "SELECT items.name, sources.name, "
+        "day, count, area, min, max, open, close "
+        "FROM price_daily "
+        "JOIN items ON items.id = price_daily.item_id "
+        "JOIN sources ON sources.id = price_daily.source_id "
+        "ORDER BY items.name, sources.name, day"
+    ).fetchall()
+    return [tuple(row) for row in rows]
+
+
+def day_of(timestamp: datetime) -> int:
+    return database.epoch_day(database.to_epoch(timestamp))
+
+
+def test_save_prices_updates_daily_rollups():
+    database.create_tables()
+    noon = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0)
+
+    # Saved out of order: open/close must still follow the timestamps.
+    for minutes, price in ((1, 170.0), (0, 168.5), (2, 175.0)):
+        database.save_prices(
+            {ITEM: {"skinport": price}},
+            timestamp=noon + timedelta(minutes=minutes),
+        )
+
+    assert fetch_rollups() == [
+        # Each price holds until the next sample: 168.5 and 170.0 for 60s.
+        (
+            ITEM,
+            "skinport",
+            day_of(noon),
+            3,
+            20310.0,
+            168.5,
+            175.0,
+            168.5,
+            175.0,
+        )
+    ]
+
+
+def test_rebuild_daily_rollups_matches_incremental_rollups():
+    database.create_tables()
+    now = datetime.now(timezone.utc)
+    for days, price in ((3, 10.0), (2, 14.0), (2, 12.0), (0, 20.0)):
+        database.save_prices(
+            {ITEM: {"skinport": price, "other": price + 1}},
+            timestamp=now - timedelta(days=days, minutes=price),
+        )
+    incremental = fetch_rollups()
+
+    assert database.rebuild_daily_rollups() == len(incremental)
+    assert fetch_rollups() == incremental
+
+
+def test_imported_history_matches_saved_history(monkeypatch):
+    monkeypatch.setattr(database, "IMPORT_BATCH_ROWS", 2)
+    now = datetime.now(timezone.utc)
+    samples = [
+        (now - timedelta(days=days, minutes=price), price)
+        for days, price in ((3, 10.0), (2, 14.0), (2, 12.0), (0, 20.0))
+    ]
+    for timestamp, price in samples:
+        database.save_prices({ITEM: {"skinport": price}}, timestamp=timestamp)
+    saved = fetch_rollups()
+    monkeypatch.setattr(database, "DB_FILE", database.DB_FILE + ".imported")
+
+    imported = database.import_price_history(
+        (ITEM, "skinport", database.to_epoch(timestamp), price)
+        for timestamp, price in samples
+    )
+
+    assert imported == len(samples)
+    assert fetch_rollups() == saved
+    latest = database.get_db_connection().execute(
+        "SELECT price FROM latest_prices"
+    )
+    assert [row[0] for row in latest] == [20.0]
+
+
+def history_rows():
+    conn = database.get_db_connection()
+    rows = conn.execute(
+        "SELECT item_id, source_id, ts_epoch, price FROM price_history "
+        "ORDER BY item_id, source_id, ts_epoch"
+    )
+    return [tuple(row) for row in rows]
+
+
+@pytest.mark.parametrize("dedup", [True, False])
+def test_same_second_saves_keep_rollups_consistent(monkeypatch, dedup):
+    monkeypatch.setattr(database, "PRICE_DEDUP", dedup)
+    database.create_tables()
+    now = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+
+    database.save_prices({ITEM: {"skinport": 10.0}}, timestamp=now)
+    assert database.save_prices({ITEM: {"skinport": 20.0}}, timestamp=now) == 0
+
+    # The first price of the second is kept, everywhere.
+    assert [row[3] for row in history_rows()] == [10.0]
+    assert fetch_rollups() == [
+        (ITEM, "skinport", day_of(now), 1, 0.0, 10.0, 10.0, 10.0, 10.0)
+    ]
+    conn = database.get_db_connection()
+    assert (
+        conn.execute("SELECT price FROM latest_prices").fetchone()[0] == 10.0
+    )
+    incremental = fetch_rollups()
+    database.rebuild_daily_rollups()
+    assert fetch_rollups() == incremental
+
+
+def create_v1_database(then):
+    """Builds a database with the original, pre-versioning layout."""
+    conn = sqlite3.connect(database.DB_FILE)
+    conn.execute(
+        "CREATE TABLE price_history (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "item_name TEXT NOT NULL, source TEXT NOT NULL, price REAL NOT NULL, "
+        "timestamp DATETIME NOT NULL)"
+    )
+    conn.execute("CREATE INDEX idx_item_name ON price_history (item_name)")
+    conn.executemany(
+        "INSERT INTO price_history (item_name, source, price, timestamp) "
+        "VALUES (?, 'skinport', ?, ?)",
+        [(ITEM, 171.0, then), (ITEM, 173.0, then + timedelta(hours=1))],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_create_tables_migrates_v1_schema(monkeypatch):
+    monkeypatch.setattr(database, "LEGACY_PRICES_IN_BASE", True)
+    then = datetime(2026, 10, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    create_v1_database(then)
+
+    database.create_tables()
+
+    conn = database.get_db_connection()
+    version = conn.execute("SELECT version FROM schema_version").fetchone()[0]
+    assert version == database.SCHEMA_VERSION
+    history = conn.execute(
+        "SELECT ts_epoch, price FROM price_history ORDER BY ts_epoch"
+    ).fetchall()
+    assert [tuple(row) for row in history] == [
+        (database.to_epoch(then), 171.0),
+        (database.to_epoch(then) + 3600, 173.0),
+    ]
+    assert fetch_rollups() == [
+        (
+            ITEM,
+            "skinport",
+            day_of(then),
+            2,
+            615600.0,
+            171.0,
+            173.0,
+            171.0,
+            173.0,
+        )
+    ]
+
+    # Running it again is a no-op.
+    database.create_tables()
+    assert len(fetch_rollups()) == 1
+
+
+def test_prices_stored_before_the_base_currency_are_set_aside():
+    then = datetime(2026, 10, 1, 12, 30, 15, tzinfo=timezone.utc)
+    create_v1_database(then)
+
+    database.create_tables()
+
+    # They were stored in whatever currency each request used.
+    assert [row[1] for row in fetch_rollups()] == ["skinport:legacy"]
+    conn = database.get_db_connection()
+    latest = conn.execute(
+        "SELECT sources.name FROM latest_prices "
+        "JOIN sources ON sources.id = source_id"
+    ).fetchall()
+    assert [row[0] for row in latest] == ["skinport:legacy"]
+    assert ITEM not in analysis.get_price_averages([ITEM])
+
+
+def test_up_to_date_schema_is_recognized_by_its_marker(mocker):
+    database.create_tables()
+    conn = database.get_db_connection()
+    assert (
+        conn.execute("PRAGMA user_version").fetchone()[0]
+        == database.SCHEMA_VERSION
+    )
+
+    # A new process opening the database only reads the marker.
+    database.close_connection()
+    database._schema_ready.clear()
+    setup = mocker.spy(database, "_setup_schema")
+    database.create_tables()
+
+    assert setup.call_count == 0
+
+
+def history_prices():
+    conn = database.get_db_connection()
+    rows = conn.execute("SELECT price FROM price_history ORDER BY ts_epoch")
+    return [row[0] for row in rows]
+
+
+def test_unchanged_prices_are_not_stored_again(monkeypatch):
+    monkeypatch.setattr(database, "PRICE_DEDUP", True)
+    monkeypatch.setattr(database, "PRICE_HEARTBEAT_SECONDS", 3600)
+    start = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+
+    written = [
+        database.save_prices(
+            {ITEM: {"skinport": price}},
+            timestamp=start + timedelta(minutes=minutes),
+        )
+        for minutes, price in (
+            (0, 170.0),
+            (10, 170.0),
+            (20, 170.0),
+            (30, 172.0),
+            (95, 172.0),
+        )
+    ]
+
+    # The 95-minute sample is a heartbeat: over an hour since the last row.
+    assert written == [1, 0, 0, 1, 1]
+    assert history_prices() == [170.0, 172.0, 172.0]
+    # The rollup is built from the stored rows alone, weighted by time.
+    assert fetch_rollups()[0][3:5] == (3, 170.0 * 1800 + 172.0 * 3900)
+    incremental = fetch_rollups()
+    database.rebuild_daily_rollups()
+    assert fetch_rollups() == incremental
+
+
+def test_dedup_sees_prices_written_by_other_connections(monkeypatch):
+    monkeypatch.setattr(database, "PRICE_DEDUP", True)
+    start = datetime(2026, 10, 17, 9, 0, tzinfo=timezone.utc)
+    database.save_prices({ITEM: {"skinport": 170.0}}, timestamp=start)
+
+    # Another thread (with its own connection) records a different price.
+    thread = threading.Thread(
+        target=database.save_prices,
+        args=({ITEM: {"skinport": 180.0}}, start + timedelta(minutes=1)),
+    )
+    thread.start()
+    thread.join()
+
+    # Back to the first price: it is a change and must be stored.
+    assert (
+        database.save_prices(
+            {ITEM: {"skinport": 170.0}}, timestamp=start + timedelta(minutes=2)
+        )
+        == 1
+    )
+
+
+def test_connection_is_reused_per_thread():
+    conn = database.get_db_connection()
+    assert database.get_db_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+    thread = threading.Thread(
+        target=lambda: other.append(database.get_db_connection())
+    )
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_transaction_rolls_back_on_error():
+    with pytest.raises(RuntimeError):
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('Rolled Back')")
+            raise RuntimeError("boom")
+
+    conn = database.get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+
+def test_row_counts_are_cached(monkeypatch):
+    monkeypatch.setattr(database, "ROW_COUNT_TTL_SECONDS", 300)
+    assert database.count_rows()["price_history"] == 0
+
+    database.save_prices({ITEM: {"skinport": 10.0}})
+    assert database.count_rows()["price_history"] == 0
+
+    monkeypatch.setattr(database, "ROW_COUNT_TTL_SECONDS", 0)
+    assert database.count_rows()["price_history"] == 1
+
+
+def test_concurrent_tracking_does_not_lock(mocker, monkeypatch):
+    # Every observation is a row, so the rollups can be checked against it.
+    monkeypatch.setattr(database, "PRICE_DEDUP", False)
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        side_effect=lambda items, currency="USD": {
+            item: {"skinport": 10.0 + i} for i, item in enumerate(items)
+        },
+    )
+    threads_count, runs_per_thread = 8, 5
+    errors = []
+
+    def track():
+        try:
+            for _ in range(runs_per_thread):
+                _, _, error = tracker.run_tracker("TEST", use_test_data=True)
+                assert error is None
+        except Exception as e:  # Collected so the main thread can fail
+            errors.append(e)
+
+    threads = [threading.Thread(target=track) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    conn = database.get_db_connection()
+    samples = conn.execute("SELECT SUM(count) FROM price_daily").fetchone()[0]
+    rows = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+    items = steam_client.get_inventory("TEST", use_test_data=True)
+    # Runs in the same second share one row per item.
+    assert 0 < rows <= threads_count * runs_per_thread * len(items)
+    assert samples == rows
+    incremental = fetch_rollups()
+    database.rebuild_daily_rollups()
+    assert fetch_rollups() == incremental
@@ -0,0 +1,135 @@
+import json
+import time
+
+import pytest
+
+import database
+import fx
+import price_fetcher
+
+BASE_CATALOG = {"A": 10.0, "B": 20.0, "C": 40.0, "Cheap": 0.03}
+EUR_CATALOG = {"A": 9.0, "B": 18.6, "C": 36.0, "Cheap": 0.02}
+
+
+@pytest.fixture(autouse=True)
+def isolated_rates(monkeypatch):
+    """Uses no rates file and an empty rate cache for each test."""
+    monkeypatch.setattr(fx, "BASE_CURRENCY", "USD")
+    monkeypatch.setattr(fx, "FX_RATES_FILE", None)
+    fx.clear_rate_cache()
+    yield
+    fx.clear_rate_cache()
+
+
+@pytest.fixture
+def skinport(mocker, monkeypatch):
+    """Serves the base catalog from cache and EUR prices as downloads."""
+    download = mocker.Mock(
+        side_effect=lambda currency, item_names=None: {
+            name: EUR_CATALOG[name] for name in item_names
+        }
+    )
+    monkeypatch.setattr(
+        fx, "_catalog_source", (lambda currency: dict(BASE_CATALOG), download)
+    )
+    return download
+
+
+def test_rate_is_derived_from_skinport_and_stored(skinport):
+    assert fx.refresh_rate("EUR") == pytest.approx(0.9)
+    # Cheap items are left out of the comparison.
+    assert "Cheap" not in skinport.call_args.kwargs["item_names"]
+
+    fx.clear_rate_cache()
+    assert fx.get_rate("usd") == 1.0
+    assert fx.get_rate("EUR") == pytest.approx(0.9)
+    assert skinport.call_count == 1
+    assert database.get_fx_rate("EUR")[0] == pytest.approx(0.9)
+
+
+def test_rates_are_refreshed_off_the_callers_thread(skinport, mocker):
+    refresh = mocker.patch("fx._refresh_rate_in_background")
+    database.save_fx_rate(
+        "EUR", 0.8, int(time.time()) - fx.FX_REFRESH_SECONDS - 1
+    )
+
+    # The stale rate is used while it is refreshed.
+    assert fx.get_rate("EUR") == 0.8
+    assert [call.args[0] for call in refresh.call_args_list] == ["EUR"]
+    skinport.assert_not_called()
+
+
+def test_first_rate_of_a_currency_is_derived_before_returning(
+    skinport, mocker
+):
+    refresh = mocker.patch("fx._refresh_rate_in_background")
+
+    assert fx.get_rate("EUR") == pytest.approx(0.9)
+    refresh.assert_not_called()
+    assert database.get_fx_rate("EUR")[0] == pytest.approx(0.9)
+
+
+def test_background_refresh_stores_the_new_rate(skinport):
+    database.save_fx_rate(
+        "EUR", 0.8, int(time.time()) - fx.FX_REFRESH_SECONDS - 1
+    )
+    assert fx.get_rate("EUR") == 0.8
+
+    deadline = time.monotonic() + 5
+    while fx.get_rate("EUR") == 0.8 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fx.get_rate("EUR") == pytest.approx(0.9)
+    assert skinport.call_count == 1
+
+
+def test_failed_refresh_keeps_the_stored_rate(skinport):
+    database.save_fx_rate(
+        "EUR", 0.8, int(time.time()) - fx.FX_REFRESH_SECONDS - 1
+    )
+    skinport.side_effect = None
+    skinport.return_value = None
+
+    assert fx.refresh_rate("EUR") is None
+    assert database.get_fx_rate("EUR")[0] == 0.8
+
+
+def test_rates_are_derived_from_the_live_catalog_only(mocker):
+    mocker.patch(
+        "price_fetcher.get_skinport_catalog", return_value=BASE_CATALOG
+    )
+    mocker.patch("price_fetcher.is_snapshot_catalog", return_value=True)
+
+    assert price_fetcher.get_live_catalog("USD") is None
+
+
+def test_rates_file_stand_in(tmp_path, monkeypatch, mocker):
+    download = mocker.Mock()
+    monkeypatch.setattr(fx, "_catalog_source", (download, download))
+    rates_file = tmp_path / "rates.json"
+    rates_file.write_text(
+        json.dumps({"base": "EUR", "rates": {"USD": 1.25, "GBP": 0.85}})
+    )
+    monkeypatch.setattr(fx, "FX_RATES_FILE", str(rates_file))
+
+    assert fx.get_rate("EUR") == pytest.approx(0.8)
+    assert fx.get_rate("GBP") == pytest.approx(0.68)
+    assert fx.get_rate("SEK") is None
+    download.assert_not_called()
+
+
+def test_prices_are_converted_from_a_single_base_catalog(mocker, monkeypatch):
+    monkeypatch.setattr(price_fetcher, "CATALOG_TTL_SECONDS", 300)
+    price_fetcher.clear_catalog_cache()
+    get_catalog = mocker.patch(
+        "price_fetcher.get_skinport_catalog", return_value=dict(BASE_CATALOG)
+    )
+    mocker.patch(
+        "fx.get_rate", side_effect=lambda c: {"USD": 1.0, "EUR": 0.9}[c]
+    )
+
+    usd = price_fetcher.fetch_all_prices(["A", "B"], currency="USD")
+    eur = price_fetcher.fetch_all_prices(["A", "B"], currency="EUR")
+
+    assert usd == {"A": {"skinport": 10.0}, "B": {"skinport": 20.0}}
+    assert eur == {"A": {"skinport": 9.0}, "B": {"skinport": 18.0}}
+    assert {call.args[0] for call in get_catalog.call_args_list} == {"USD"}
@@ -0,0 +1,164 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_client
+import metrics
+
+
+class FlakyUpstream(BaseHTTPRequestHandler):
+    """
+    Answers /rate-limited with 429s (and a Retry-After) for the first
+    `failures` requests, sleeps before answering /slow, and records the
+    client port of every request.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connections are reused
+    failures = 0
+    retry_after = "0"
+    ports = []
+
+    def do_GET(self):
+        self.ports.append(self.client_address[1])
+        if (
+            self.path.startswith("/rate-limited")
+            and FlakyUpstream.failures > 0
+        ):
+            FlakyUpstream.failures -= 1
+            self.reply(429, b"slow down", {"Retry-After": self.retry_after})
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        self.reply(200, b"ok")
+
+    def reply(self, status, payload, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Runs the stub upstream and yields its base URL."""
+    monkeypatch.setattr(http_client, "_buckets", {})
+    monkeypatch.setattr(http_client, "_blocked_until", {})
+    monkeypatch.setattr(http_client, "HOST_RATE_LIMITS", {})
+    FlakyUpstream.failures = 0
+    FlakyUpstream.retry_after = "0"
+    FlakyUpstream.ports = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyUpstream)
+    thread = threading.Thread(
+        target=server.serve_forever,
+        kwargs={"poll_interval": 0.05},
+        daemon=True,
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_429s_are_retried_honouring_retry_after(upstream, mocker):
+    FlakyUpstream.failures = 2
+    FlakyUpstream.retry_after = "3"
+    sleeps = mocker.patch("http_client.time.sleep")
+
+    response = http_client.get(f"{upstream}/rate-limited")
+
+    assert response.status_code == 200
+    assert [call.args[0] for call in sleeps.call_args_list] == pytest.approx(
+        [3.0, 3.0], abs=0.1
+    )
+
+
+def test_long_retry_after_gives_up_and_blocks_the_host(upstream, mocker):
+    FlakyUpstream.failures = 1
+    FlakyUpstream.retry_after = "600"
+    sleeps = mocker.patch("http_client.time.sleep")
+
+    with pytest.raises(http_client.RateLimitExceeded) as excinfo:
+        http_client.get(f"{upstream}/rate-limited")
+
+    assert excinfo.value.retry_after == 600.0
+    sleeps.assert_not_called()
+    # Later requests to the host give up without calling it.
+    with pytest.raises(http_client.RateLimitExceeded):
+        http_client.get(f"{upstream}/")
+    assert len(FlakyUpstream.ports) == 1
+
+
+def test_last_429_is_returned_when_retries_run_out(upstream, mocker):
+    FlakyUpstream.failures = 10
+    mocker.patch("http_client.time.sleep")
+
+    metrics.reset()
+
+    response = http_client.get(f"{upstream}/rate-limited", max_retries=2)
+
+    assert response.status_code == 429
+    assert len(FlakyUpstream.ports) == 3
+    assert metrics.UPSTREAM_ERRORS.get(host="127.0.0.1", kind="429") == 3
+    assert metrics.UPSTREAM_REQUESTS.get(host="127.0.0.1", status="429") == 1
+
+
+def test_slow_responses_hit_the_read_timeout(upstream, monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE_SECONDS", 0.01)
+    start = time.monotonic()
+
+    with pytest.raises(requests.exceptions.Timeout):
+        http_client.get(f"{upstream}/slow", timeout=(1, 0.1), max_retries=1)
+
+    assert len(FlakyUpstream.ports) == 2
+    assert time.monotonic() - start < 0.45
+
+
+def test_connections_are_pooled(upstream):
+    for _ in range(3):
+        http_client.get(f"{upstream}/")
+
+    assert len(set(FlakyUpstream.ports)) == 1
+
+
+def test_requests_are_rate_limited_per_host(upstream, monkeypatch):
+    monkeypatch.setattr(
+        http_client, "HOST_RATE_LIMITS", {"127.0.0.1": (20, 2)}
+    )
+    start = time.monotonic()
+
+    for _ in range(5):
+        http_client.get(f"{upstream}/")
+
+    # Two requests fit in the burst; the other three wait 50 ms each.
+    assert time.monotonic() - start >= 0.14
+
+
+def test_rate_limit_gives_up_instead_of_waiting_too_long(monkeypatch):
+    monkeypatch.setattr(http_client, "_buckets", {})
+    monkeypatch.setattr(http_client, "_blocked_until", {})
+    monkeypatch.setattr(
+        http_client, "HOST_RATE_LIMITS", {"example.com": (0.001, 1)}
+    )
+
+    http_client._get_bucket("example.com").reserve()
+    with pytest.raises(http_client.RateLimitExceeded):
+        http_client.get("http://example.com/")
+
+
+def test_retry_after_formats():
+    assert http_client.parse_retry_after("120") == 120.0
+    assert http_client.parse_retry_after(None) is None
+    assert http_client.parse_retry_after("soon") is None
+    in_a_minute = http_client.parse_retry_after(
+        formatdate(time.time() + 60, usegmt=True)
+    )
+    assert 55 <= in_a_minute <= 60
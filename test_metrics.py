@@ -0,0 +1,80 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.histogram(
+        "test_seconds", "Test.", ("stage",), buckets=(0.1, 1)
+    )
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, stage="a")
+
+    lines = histogram.render().splitlines()
+
+    assert lines[:2] == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+    ]
+    assert lines[2:] == [
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1"} 3',
+        'test_seconds_bucket{stage="a",le="+Inf"} 4',
+        'test_seconds_sum{stage="a"} 6.05',
+        'test_seconds_count{stage="a"} 4',
+    ]
+
+
+def test_metric_types_must_define_their_samples():
+    class Incomplete(metrics._Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Test.")
+
+
+def test_timers_and_counters():
+    @metrics.timed("decorated")
+    def work():
+        return 42
+
+    assert work() == 42
+    with metrics.timer("block"):
+        pass
+    metrics.cache_lookup("catalog", "hit")
+    metrics.cache_lookup("catalog", "hit")
+
+    assert metrics.STAGE_SECONDS.get(stage="decorated")[0] == 1
+    assert metrics.STAGE_SECONDS.get(stage="block")[0] == 1
+    assert (
+        'cache_lookups_total{cache="catalog",result="hit"} 2'
+        in metrics.render()
+    )
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+
+    with metrics.timer("block"):
+        pass
+    metrics.cache_lookup("catalog", "miss")
+    metrics.DB_ROWS.set(5, table="items")
+
+    assert metrics.STAGE_SECONDS.get(stage="block") == (0, 0.0)
+    assert metrics.CACHE_LOOKUPS.get(cache="catalog", result="miss") == 0
+    assert "db_rows{" not in metrics.render()
+
+
+def test_label_values_are_escaped():
+    counter = metrics.counter("test_total", "Test.", ("name",))
+    counter.inc(name='say "hi"\n')
+
+    assert 'test_total{name="say \\"hi\\"\\n"} 1' in counter.render()
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta, timezone
+
+import database
+import fx
+import portfolio
+import tracker
+
+STEAM_ID = "76561198000000000"
+AK = "AK-47 | Redline (Field-Tested)"
+AWP = "AWP | Asiimov (Field-Tested)"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def at(hours: int) -> datetime:
+    return START + timedelta(hours=hours)
+
+
+def values():
+    return [
+        (ts_epoch - database.to_epoch(START), value)
+        for ts_epoch, value in database.get_portfolio_values(STEAM_ID)
+    ]
+
+
+def test_holdings_are_valued_at_the_latest_prices():
+    database.save_prices(
+        {AK: {"skinport": 10.0}, AWP: {"skinport": 100.0}}, at(0)
+    )
+
+    value = database.update_holdings(STEAM_ID, {AK: 2, AWP: 1}, at(1))
+
+    assert value == 120.0
+    assert values() == [(3600, 120.0)]
+
+
+def test_saving_prices_updates_the_value_incrementally():
+    database.update_holdings(STEAM_ID, {AK: 2, AWP: 1}, at(0))
+    assert values() == []  # Nothing is priced yet.
+
+    database.save_prices(
+        {AK: {"skinport": 10.0}, AWP: {"skinport": 100.0}}, at(1)
+    )
+    # Unchanged prices, other sources and other items do not add points.
+    database.save_prices(
+        {AK: {"skinport": 10.0, "steam": 12.0}, "Other": {"skinport": 1.0}},
+        at(2),
+    )
+    database.save_prices({AWP: {"skinport": 90.0}}, at(3))
+
+    assert values() == [(3600, 120.0), (3 * 3600, 110.0)]
+
+
+def test_late_price_samples_do_not_rewrite_history():
+    database.update_holdings(STEAM_ID, {AK: 1, AWP: 1}, at(0))
+    database.save_prices(
+        {AK: {"skinport": 10.0}, AWP: {"skinport": 100.0}}, at(5)
+    )
+
+    # Older than the AK price already applied: ignored.
+    database.save_prices({AK: {"skinport": 50.0}}, at(4))
+    assert values() == [(5 * 3600, 110.0)]
+
+
+def test_inventory_changes_add_points():
+    database.save_prices(
+        {AK: {"skinport": 10.0}, AWP: {"skinport": 100.0}}, at(0)
+    )
+    database.update_holdings(STEAM_ID, {AK: 1}, at(1))
+    database.update_holdings(STEAM_ID, {AK: 1}, at(2))  # Same inventory
+    database.update_holdings(STEAM_ID, {AK: 1, AWP: 1}, at(3))
+
+    assert values() == [(3600, 10.0), (3 * 3600, 110.0)]
+    # Sold items stop following price changes.
+    database.update_holdings(STEAM_ID, {AWP: 1}, at(4))
+    database.save_prices({AK: {"skinport": 20.0}}, at(5))
+    assert values()[-1] == (4 * 3600, 100.0)
+
+
+def test_range_reads_carry_the_opening_value():
+    database.save_prices({AK: {"skinport": 10.0}}, at(0))
+    database.update_holdings(STEAM_ID, {AK: 1}, at(0))
+    database.save_prices({AK: {"skinport": 20.0}}, at(48))
+    start = database.to_epoch(at(24))
+
+    points = database.get_portfolio_values(
+        STEAM_ID, start, database.to_epoch(at(72))
+    )
+
+    assert points == [(start, 10.0), (database.to_epoch(at(48)), 20.0)]
+
+
+def test_value_series_is_converted_and_extends_to_now(monkeypatch):
+    monkeypatch.setattr(fx, "get_rate", lambda currency: 0.5)
+    database.save_prices({AK: {"skinport": 10.0}}, at(0))
+    database.update_holdings(STEAM_ID, {AK: 3}, at(0))
+    now = database.to_epoch(at(24))
+
+    series = portfolio.get_value_series(
+        STEAM_ID, days=7, currency="EUR", now=now
+    )
+
+    assert series == [(database.to_epoch(at(0)), 15.0), (now, 15.0)]
+
+
+def test_value_series_ends_at_the_last_stored_point(monkeypatch):
+    database.save_prices({AK: {"skinport": 10.0}}, at(0))
+    database.update_holdings(STEAM_ID, {AK: 1}, at(0))
+    database.save_prices({AK: {"skinport": 20.0}}, at(48))
+    first = portfolio.get_value_series(STEAM_ID, days=1)
+
+    # The series does not depend on when it is read.
+    monkeypatch.setattr("time.time", lambda: database.to_epoch(at(1000)))
+    assert portfolio.get_value_series(STEAM_ID, days=1) == first
+    assert first == [
+        (database.to_epoch(at(24)), 10.0),
+        (database.to_epoch(at(48)), 20.0),
+    ]
+    assert portfolio.get_value_series("76561198000000001") == []
+
+
+def test_build_chart_draws_steps():
+    chart = portfolio.build_chart(
+        [(0, 100.0), (50, 200.0), (100, 200.0)], 100, 10
+    )
+
+    assert chart["points"] == "0.0,10.0 50.0,10.0 50.0,0.0 100.0,0.0 100.0,0.0"
+    assert chart["change"] == 1.0
+    assert (chart["min"], chart["max"]) == (100.0, 200.0)
+    assert portfolio.build_chart([(0, 100.0)]) is None
+
+
+def test_tracker_records_real_inventories_only(mocker):
+    mocker.patch.object(tracker, "CONCURRENT_FETCH", False)
+    mocker.patch(
+        "tracker.steam_client.get_inventory_quantities", return_value={AK: 2}
+    )
+    mocker.patch(
+        "tracker.price_fetcher.fetch_all_prices",
+        return_value={AK: {"skinport": 10.0}},
+    )
+    mocker.patch(
+        "tracker.price_writer.save_prices", side_effect=database.save_prices
+    )
+
+    tracker.run_tracker(STEAM_ID)
+    tracker.run_tracker("TEST_DATA_MODE", use_test_data=True)
+
+    assert [value for _, value in database.get_portfolio_values(STEAM_ID)] == [
+        20.0
+    ]
+    assert database.get_portfolio_values("TEST_DATA_MODE") == []
+
+
+def test_tracker_does_not_record_incomplete_inventories(mocker):
+    database.update_holdings(STEAM_ID, {AK: 2, AWP: 1})
+    mocker.patch.object(tracker, "CONCURRENT_FETCH", False)
+    mocker.patch(
+        "tracker.steam_client.get_inventory_quantities",
+        side_effect=tracker.steam_client.IncompleteInventoryError(
+            "page 2", {AK: 2}
+        ),
+    )
+    mocker.patch("tracker.price_fetcher.fetch_all_prices", return_value={})
+
+    tracker.run_tracker(STEAM_ID)
+
+    holdings = database.get_db_connection().execute(
+        "SELECT COUNT(*) FROM portfolio_holdings WHERE steam_id = ?",
+        (STEAM_ID,),
+    )
+    assert holdings.fetchone()[0] == 2
@@ -0,0 +1,349 @@
+import json
+import threading
+import time
+
+import pytest
+
+import catalog_index
+import price_fetcher
+
+CATALOG = [
+    {
+        "market_hash_name": "AK-47 | Redline (Field-Tested)",
+        "suggested_price": 49.19,
+    },
+    {
+        "market_hash_name": "AWP | Asiimov (Field-Tested)",
+        "suggested_price": 171.13,
+    },
+    {"market_hash_name": "Unpriced Item", "suggested_price": None},
+    {
+        "market_hash_name": "★ Karambit | Doppler (Factory New)",
+        "suggested_price": 890.5,
+    },
+]
+
+
+def chunked(data: bytes, size: int = 7) -> list[bytes]:
+    """Splits a payload into small chunks, cutting through tokens and UTF-8."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.fixture(autouse=True)
+def isolated_catalog_cache(monkeypatch):
+    """Starts each test with an empty catalog cache."""
+    monkeypatch.setattr(price_fetcher, "CATALOG_TTL_SECONDS", 300)
+    price_fetcher.clear_catalog_cache()
+    yield
+    price_fetcher.clear_catalog_cache()
+
+
+def make_response(mocker, status_code=200, payload=None, headers=None):
+    response = mocker.Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    response.iter_content.return_value = chunked(body)
+    return response
+
+
+def test_catalog_is_cached_between_requests(mocker):
+    get = mocker.patch(
+        "http_client.get",
+        return_value=make_response(mocker, payload=CATALOG),
+    )
+
+    first = price_fetcher.get_prices_from_skinport(
+        ["AK-47 | Redline (Field-Tested)", "Unpriced Item"]
+    )
+    second = price_fetcher.get_prices_from_skinport(
+        ["AWP | Asiimov (Field-Tested)"]
+    )
+
+    assert first == {"AK-47 | Redline (Field-Tested)": 49.19}
+    assert second == {"AWP | Asiimov (Field-Tested)": 171.13}
+    assert get.call_count == 1
+
+
+def test_expired_catalog_is_revalidated_with_etag(mocker, monkeypatch):
+    get = mocker.patch(
+        "http_client.get",
+        return_value=make_response(
+            mocker, payload=CATALOG, headers={"ETag": '"v1"'}
+        ),
+    )
+    price_fetcher.get_skinport_catalog("EUR")
+
+    # Pretend the entry expired long ago, beyond the stale window.
+    monkeypatch.setitem(
+        price_fetcher._catalog_cache["EUR"], "fetched_at", time.time() - 10_000
+    )
+    get.return_value = make_response(mocker, status_code=304)
+
+    catalog = price_fetcher.get_skinport_catalog("EUR")
+
+    assert catalog["AK-47 | Redline (Field-Tested)"] == 49.19
+    assert get.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+    assert price_fetcher._catalog_cache["EUR"]["etag"] == '"v1"'
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_revalidation_does_not_rewrite_the_catalog(
+    mocker, monkeypatch, use_index
+):
+    monkeypatch.setattr(price_fetcher, "CATALOG_INDEX", use_index)
+    get = mocker.patch(
+        "http_client.get",
+        return_value=make_response(
+            mocker, payload=CATALOG, headers={"ETag": '"v1"'}
+        ),
+    )
+    assert len(price_fetcher.get_skinport_catalog("EUR")) == 3
+    monkeypatch.setitem(
+        price_fetcher._catalog_cache["EUR"], "fetched_at", time.time() - 10_000
+    )
+    get.return_value = make_response(mocker, status_code=304)
+    write_index = mocker.spy(catalog_index, "write_index")
+    dump = mocker.spy(price_fetcher.json, "dump")
+
+    price_fetcher.get_skinport_catalog("EUR")
+
+    write_index.assert_not_called()
+    assert "prices" not in dump.call_args.args[0]
+    # Another worker (or a restart) sees the revalidated copy as fresh.
+    price_fetcher.clear_catalog_cache()
+    assert len(price_fetcher.get_skinport_catalog("EUR")) == 3
+    assert get.call_count == 2
+
+
+def test_catalog_is_loaded_from_disk_after_restart(mocker):
+    get = mocker.patch(
+        "http_client.get",
+        return_value=make_response(mocker, payload=CATALOG),
+    )
+    price_fetcher.get_skinport_catalog("USD")
+
+    # A fresh worker starts with an empty in-memory cache.
+    price_fetcher.clear_catalog_cache()
+    catalog = price_fetcher.get_skinport_catalog("USD")
+
+    assert catalog["AWP | Asiimov (Field-Tested)"] == 171.13
+    assert get.call_count == 1
+
+
+def test_catalog_is_kept_as_a_memory_mapped_index(mocker):
+    mocker.patch(
+        "http_client.get", return_value=make_response(mocker, payload=CATALOG)
+    )
+
+    catalog = price_fetcher.get_skinport_catalog("USD")
+
+    assert isinstance(catalog, catalog_index.CatalogIndex)
+    assert catalog.path == price_fetcher._catalog_cache_path("USD")
+    assert len(catalog) == 3
+
+
+def test_worker_adopts_an_index_written_by_another_process(
+    mocker, monkeypatch
+):
+    get = mocker.patch(
+        "http_client.get", return_value=make_response(mocker, payload=CATALOG)
+    )
+    price_fetcher.get_skinport_catalog("USD")
+    # Our copy expired; meanwhile another worker wrote a fresh index.
+    monkeypatch.setitem(
+        price_fetcher._catalog_cache["USD"], "fetched_at", time.time() - 10_000
+    )
+    catalog_index.write_index(
+        price_fetcher._catalog_cache_path("USD"),
+        {"AK-47 | Redline (Field-Tested)": 50.0},
+        {"fetched_at": time.time(), "etag": None, "last_modified": None},
+    )
+
+    catalog = price_fetcher.get_skinport_catalog("USD")
+
+    assert catalog == {"AK-47 | Redline (Field-Tested)": 50.0}
+    assert get.call_count == 1
+
+
+def test_json_disk_cache_without_index(mocker, monkeypatch):
+    monkeypatch.setattr(price_fetcher, "CATALOG_INDEX", False)
+    get = mocker.patch(
+        "http_client.get", return_value=make_response(mocker, payload=CATALOG)
+    )
+    price_fetcher.get_skinport_catalog("USD")
+    price_fetcher.clear_catalog_cache()
+
+    catalog = price_fetcher.get_skinport_catalog("USD")
+
+    assert price_fetcher._catalog_cache_path("USD").endswith(".json")
+    assert type(catalog) is dict and len(catalog) == 3
+    assert get.call_count == 1
+
+
+def test_snapshot_is_served_while_the_catalog_downloads(
+    mocker, tmp_path, monkeypatch
+):
+    snapshot_path = str(tmp_path / "catalog_snapshot.json.gz")
+    monkeypatch.setattr(price_fetcher, "CATALOG_SNAPSHOT_FILE", snapshot_path)
+    mocker.patch(
+        "http_client.get", return_value=make_response(mocker, payload=CATALOG)
+    )
+    assert price_fetcher.write_catalog_snapshot(snapshot_path, "USD") == 3
+
+    # A cold start, an hour later, with no cached catalog.
+    price_fetcher.clear_catalog_cache()
+    mocker.patch("time.time", return_value=time.time() + 3600)
+    refresh = mocker.patch("price_fetcher._refresh_catalog_in_background")
+
+    catalog = price_fetcher.get_skinport_catalog("USD")
+
+    assert catalog["AWP | Asiimov (Field-Tested)"] == 171.13
+    refresh.assert_called_once_with("USD")
+
+
+def test_old_or_foreign_snapshots_are_ignored(mocker, tmp_path, monkeypatch):
+    snapshot_path = str(tmp_path / "catalog_snapshot.json.gz")
+    monkeypatch.setattr(price_fetcher, "CATALOG_SNAPSHOT_FILE", snapshot_path)
+    mocker.patch(
+        "http_client.get", return_value=make_response(mocker, payload=CATALOG)
+    )
+    price_fetcher.write_catalog_snapshot(snapshot_path, "USD")
+
+    assert price_fetcher._load_catalog_snapshot("EUR") is None
+    monkeypatch.setattr(price_fetcher, "CATALOG_SNAPSHOT_MAX_AGE", 0)
+    assert price_fetcher._load_catalog_snapshot("USD") is None
+
+
+def test_failed_fetch_without_cache_returns_none(mocker):
+    mocker.patch(
+        "http_client.get",
+        side_effect=price_fetcher.requests.exceptions.ConnectionError("down"),
+    )
+
+    assert price_fetcher.get_prices_from_skinport(["Any"]) is None
+
+
+def test_iter_json_array_handles_split_chunks():
+    body = json.dumps(CATALOG, ensure_ascii=False, indent=2).encode("utf-8")
+
+    for size in (1, 3, 64):
+        assert (
+            list(price_fetcher._iter_json_array(chunked(body, size)))
+            == CATALOG
+        )
+
+
+def test_iter_json_array_rejects_truncated_input():
+    body = json.dumps(CATALOG).encode("utf-8")[:-20]
+
+    with pytest.raises(ValueError):
+        list(price_fetcher._iter_json_array(chunked(body)))
+
+
+def test_uncached_lookup_keeps_only_requested_items(mocker, monkeypatch):
+    monkeypatch.setattr(price_fetcher, "CATALOG_TTL_SECONDS", 0)
+    mocker.patch(
+        "http_client.get",
+        return_value=make_response(mocker, payload=CATALOG),
+    )
+
+    prices = price_fetcher.get_prices_from_skinport(
+        ["★ Karambit | Doppler (Factory New)", "Non-existent Item"]
+    )
+
+    assert prices == {"★ Karambit | Doppler (Factory New)": 890.5}
+    assert price_fetcher._catalog_cache == {}
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Replaces the registered sources with none, for fake providers."""
+    monkeypatch.setattr(price_fetcher, "_sources", {})
+    monkeypatch.setattr(price_fetcher, "BREAKER_THRESHOLD", 2)
+
+
+def test_sources_are_queried_concurrently_with_partial_results(sources):
+    def fast(item_names, currency):
+        return {"A": 1.0, "Unknown": 5.0}
+
+    def slow(item_names, currency):
+        time.sleep(0.5)
+        return {"A": 2.0}
+
+    def fallback(item_names, currency):
+        time.sleep(0.1)
+        return {"B": 3.0}
+
+    price_fetcher.register_source("fast", fast)
+    price_fetcher.register_source("slow", slow, timeout=0.2)
+    price_fetcher.register_source("fallback", fallback)
+
+    start = time.monotonic()
+    prices = price_fetcher.fetch_all_prices(["A", "B"])
+    elapsed = time.monotonic() - start
+
+    assert prices == {"A": {"fast": 1.0}, "B": {"fallback": 3.0}}
+    assert elapsed < 0.4
+
+
+def test_a_hung_source_does_not_hold_up_the_others(sources, monkeypatch):
+    monkeypatch.setattr(price_fetcher, "BREAKER_THRESHOLD", 100)
+    release = threading.Event()
+
+    def hung(item_names, currency):
+        release.wait(5)
+        return None
+
+    price_fetcher.register_source("hung", hung, timeout=0.05, retries=0)
+    price_fetcher.register_source(
+        "healthy", lambda names, cur: {"A": 1.0}, timeout=0.5
+    )
+
+    try:
+        # More hung fetches than the threads a shared pool would have.
+        for _ in range(10):
+            assert price_fetcher.fetch_all_prices(["A"]) == {
+                "A": {"healthy": 1.0}
+            }
+    finally:
+        release.set()
+
+
+def test_failed_fetches_are_retried_within_budget(sources):
+    attempts = []
+
+    def flaky(item_names, currency):
+        attempts.append(currency)
+        if len(attempts) < 2:
+            raise ConnectionError("reset")
+        return {"A": 1.0}
+
+    price_fetcher.register_source("flaky", flaky, retries=1)
+
+    assert price_fetcher.fetch_all_prices(["A"], currency="EUR") == {
+        "A": {"flaky": 1.0}
+    }
+    assert attempts == ["EUR", "EUR"]
+
+
+def test_circuit_breaker_skips_a_failing_source(sources, monkeypatch):
+    calls = []
+
+    def down(item_names, currency):
+        calls.append(1)
+        return None
+
+    source = price_fetcher.register_source("down", down, retries=0)
+
+    assert price_fetcher.fetch_all_prices(["A"]) is None
+    assert price_fetcher.fetch_all_prices(["A"]) is None
+    assert price_fetcher.fetch_all_prices(["A"]) is None
+    assert len(calls) == 2
+    assert not source.is_available()
+
+    # Once the cooldown is over the source is tried again.
+    monkeypatch.setattr(source, "open_until", time.monotonic() - 1)
+    source.fetch = lambda item_names, currency: {"A": 1.0}
+    assert price_fetcher.fetch_all_prices(["A"]) == {"A": {"down": 1.0}}
+    assert source.consecutive_failures == 0
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+import database
+import price_writer
+
+ITEM = "AK-47 | Redline (Field-Tested)"
+
+
+def stored_samples():
+    conn = database.get_db_connection()
+    return conn.execute(
+        "SELECT COALESCE(SUM(count), 0) FROM price_daily"
+    ).fetchone()[0]
+
+
+def test_queued_snapshots_are_coalesced_into_one_batch():
+    writer = price_writer.PriceWriter()
+    start = datetime.now(timezone.utc)
+    # Queued before the thread starts, so they are all drained at once.
+    for i in range(5):
+        assert writer.submit(
+            {ITEM: {"skinport": 50.0 + i}},
+            timestamp=start + timedelta(seconds=i),
+        )
+
+    writer.start()
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["batches"] == 1
+    assert stats["snapshots_written"] == 5
+    assert stats["queue_depth"] == 0
+    assert stored_samples() == 5
+
+
+def test_full_queue_rejects_after_timeout():
+    writer = price_writer.PriceWriter(max_queue_size=2, enqueue_timeout=0.01)
+
+    results = [writer.submit({ITEM: {"skinport": 50.0}}) for _ in range(3)]
+
+    assert results == [True, True, False]
+    assert writer.stats()["rejected"] == 1
+
+
+def test_stop_writes_pending_snapshots():
+    writer = price_writer.PriceWriter()
+    writer.submit({ITEM: {"skinport": 50.0}})
+    writer.start()
+
+    writer.stop()
+
+    assert stored_samples() == 1
+
+
+def test_save_prices_falls_back_to_synchronous_write(mocker, monkeypatch):
+    monkeypatch.setattr(price_writer, "WRITE_BEHIND", True)
+    writer = mocker.Mock()
+    writer.submit.return_value = False
+    mocker.patch("price_writer.get_writer", return_value=writer)
+
+    price_writer.save_prices({ITEM: {"skinport": 50.0}})
+
+    assert stored_samples() == 1
+
+
+def test_writer_survives_a_failed_batch(mocker):
+    writer = price_writer.PriceWriter()
+    mocker.patch(
+        "database.save_price_snapshots",
+        side_effect=[ValueError("bad snapshot"), 1],
+    )
+    writer.start()
+
+    writer.submit({ITEM: {"skinport": 50.0}})
+    assert writer.flush(timeout=5)
+    writer.submit({ITEM: {"skinport": 51.0}})
+    assert writer.flush(timeout=5)
+
+    stats = writer.stats()
+    assert stats["errors"] == 1
+    assert stats["snapshots_written"] == 1
+    assert writer._thread.is_alive()
+    writer.stop()
+
+
+def test_get_writer_restarts_a_dead_thread(monkeypatch):
+    writer = price_writer.PriceWriter()
+    writer.start()
+    writer.stop()
+    monkeypatch.setattr(price_writer, "_writer", writer)
+
+    assert price_writer.get_writer() is writer
+    assert writer._thread.is_alive()
+    writer.stop()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import database
+import scheduler
+
+CATALOG = {
+    "AK-47 | Redline (Field-Tested)": 49.19,
+    "AWP | Asiimov (Field-Tested)": 171.13,
+}
+
+
+@pytest.fixture(autouse=True)
+def catalog(monkeypatch, mocker):
+    """Serves a fake catalog, fetched just now."""
+    monkeypatch.setattr(scheduler, "SNAPSHOT_FX_CURRENCIES", [])
+    return mocker.patch(
+        "price_fetcher.refresh_catalog",
+        side_effect=lambda currency: (dict(CATALOG), time.time()),
+    )
+
+
+def test_snapshot_saves_the_whole_catalog_and_is_recorded():
+    run = scheduler.take_snapshot()
+
+    assert run["items"] == 2
+    assert run["rows_written"] == 2
+    assert database.get_last_snapshot_run() == run
+
+    conn = database.get_db_connection()
+    assert (
+        conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0] == 2
+    )
+
+
+def test_failed_snapshot_is_not_recorded(catalog):
+    catalog.side_effect = None
+    catalog.return_value = None
+
+    assert scheduler.take_snapshot() is None
+    assert database.get_last_snapshot_run() is None
+
+
+def test_prices_are_recorded_when_they_were_fetched(catalog):
+    fetched_at = int(time.time()) - 120
+    catalog.side_effect = None
+    catalog.return_value = (dict(CATALOG), fetched_at)
+
+    assert scheduler.take_snapshot()["items"] == 2
+    conn = database.get_db_connection()
+    rows = conn.execute("SELECT ts_epoch FROM price_history").fetchall()
+    assert [row[0] for row in rows] == [fetched_at, fetched_at]
+
+    # A catalog that could not be refreshed is not recorded as new prices.
+    catalog.return_value = (
+        {name: price + 1 for name, price in CATALOG.items()},
+        time.time() - scheduler.SNAPSHOT_INTERVAL_SECONDS - 60,
+    )
+    assert scheduler.take_snapshot() is None
+    assert (
+        conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0] == 2
+    )
+
+
+def test_bundled_catalog_snapshot_is_not_recorded(mocker):
+    mocker.patch("price_fetcher.is_snapshot_catalog", return_value=True)
+
+    assert scheduler.take_snapshot() is None
+    conn = database.get_db_connection()
+    assert (
+        conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0] == 0
+    )
+
+
+def test_next_run_is_jittered_and_missed_runs_start_immediately():
+    assert scheduler.seconds_until_next_run(None, 1000.0) == 0.0
+    # Overdue by many intervals: a single catch-up run, right away.
+    assert scheduler.seconds_until_next_run(0, 100_000.0, interval=900) == 0.0
+
+    wait = scheduler.seconds_until_next_run(
+        1000, 1300.0, interval=900, jitter=60
+    )
+    assert 600.0 <= wait <= 660.0
+
+
+def test_run_forever_continues_the_stored_schedule(mocker, monkeypatch):
+    monkeypatch.setattr(scheduler, "SNAPSHOT_INTERVAL_SECONDS", 3600)
+    stop = threading.Event()
+    waits = []
+
+    def fake_wait(timeout):
+        waits.append(timeout)
+        return True  # Stop instead of sleeping
+
+    monkeypatch.setattr(stop, "wait", fake_wait)
+    snapshot = mocker.spy(scheduler, "take_snapshot")
+
+    scheduler.take_snapshot()
+    scheduler.run_forever(stop)
+
+    # The snapshot just taken is recent, so the restarted loop waits.
+    assert snapshot.call_count == 1
+    assert 3500 < waits[0] <= 3600 + scheduler.SNAPSHOT_JITTER_SECONDS
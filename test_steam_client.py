@@ -0,0 +1,267 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import database
+import http_client
+import steam_client
+
+STEAM_ID = "76561197960435530"
+ASSET_COUNT = 5000
+
+
+def make_inventory(asset_count: int):
+    """
+    Builds assets cycling over a few descriptions, every third untradable.
+    """
+    descriptions = [
+        {
+            "classid": str(100 + i),
+            "instanceid": "0",
+            "market_hash_name": f"Skin {i} (Field-Tested)",
+            "tradable": 0 if i % 3 == 0 else 1,
+            "tags": [
+                {
+                    "category": "Type",
+                    "localized_tag_name": "Rifle" if i % 2 else "Pistol",
+                }
+            ],
+        }
+        for i in range(10)
+    ]
+    assets = [
+        {
+            "assetid": str(1_000_000 + n),
+            "classid": str(100 + n % 10),
+            "instanceid": "0",
+        }
+        for n in range(asset_count)
+    ]
+    return assets, descriptions
+
+
+class InventoryStub(BaseHTTPRequestHandler):
+    """Serves a paginated inventory like steamcommunity.com/inventory."""
+
+    assets, descriptions = make_inventory(ASSET_COUNT)
+    requests_seen = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.requests_seen.append(query)
+
+        count = int(query.get("count", 2000))
+        start = 0
+        if "start_assetid" in query:
+            ids = [asset["assetid"] for asset in self.assets]
+            start = ids.index(query["start_assetid"]) + 1
+
+        page = self.assets[start : start + count]
+        classids = {asset["classid"] for asset in page}
+        body = {
+            "success": 1,
+            "assets": page,
+            "descriptions": [
+                d for d in self.descriptions if d["classid"] in classids
+            ],
+            "total_inventory_count": len(self.assets),
+        }
+        if start + count < len(self.assets):
+            body["more_items"] = 1
+            body["last_assetid"] = page[-1]["assetid"]
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def inventory_cache(monkeypatch):
+    """Starts each test with an empty inventory cache."""
+    monkeypatch.setattr(steam_client, "INVENTORY_CACHE_TTL_SECONDS", 300)
+    steam_client._inventory_hits.clear()
+    steam_client._inventory_refreshing.clear()
+
+
+@pytest.fixture
+def steam_stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), InventoryStub)
+    thread = threading.Thread(
+        target=server.serve_forever, args=(0.05,), daemon=True
+    )
+    thread.start()
+    InventoryStub.requests_seen = []
+    monkeypatch.setattr(
+        steam_client,
+        "STEAM_INVENTORY_URL",
+        f"http://127.0.0.1:{server.server_port}/inventory/{{steam_id}}/730/2",
+    )
+    yield InventoryStub
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_inventory_follows_all_pages(steam_stub, monkeypatch):
+    monkeypatch.setattr(steam_client, "INVENTORY_PAGE_SIZE", 1000)
+
+    items = steam_client.get_inventory(STEAM_ID)
+
+    assert len(items) == ASSET_COUNT
+    assert len(steam_stub.requests_seen) == 5
+    assert steam_stub.requests_seen[1]["start_assetid"] == "1000999"
+
+
+def test_iter_inventory_yields_pages_as_they_arrive(steam_stub):
+    pages = steam_client.iter_inventory(STEAM_ID, count=2000)
+
+    first_page = next(pages)
+    assert sum(first_page.values()) == 2000
+    assert len(steam_stub.requests_seen) == 1  # Later pages not fetched yet
+
+    assert [sum(page.values()) for page in pages] == [2000, 1000]
+
+
+def test_filters_apply_across_pages(steam_stub, monkeypatch):
+    monkeypatch.setattr(steam_client, "INVENTORY_CACHE_TTL_SECONDS", 0)
+
+    tradable = steam_client.get_inventory(STEAM_ID, filter_tradable=True)
+    rifles = steam_client.get_inventory(STEAM_ID, filter_item_type="rifle")
+
+    # Descriptions 0, 3, 6 and 9 are untradable; odd ones are rifles.
+    assert len(tradable) == ASSET_COUNT * 6 // 10
+    assert len(rifles) == ASSET_COUNT // 2
+    assert all(int(name.split()[1]) % 2 for name in rifles)
+
+
+def test_failed_later_page_reports_an_incomplete_inventory(steam_stub, mocker):
+    real_get = http_client.get
+    calls = []
+
+    def flaky_get(url, params=None, **kwargs):
+        calls.append(params)
+        if len(calls) == 2:
+            raise steam_client.requests.exceptions.ConnectionError("reset")
+        return real_get(url, params=params, **kwargs)
+
+    mocker.patch("http_client.get", side_effect=flaky_get)
+
+    with pytest.raises(steam_client.IncompleteInventoryError) as excinfo:
+        steam_client.get_inventory_quantities(STEAM_ID)
+
+    assert sum(excinfo.value.quantities.values()) == 2000
+    # The truncated inventory is not cached.
+    assert database.get_cached_inventory(STEAM_ID) is None
+
+
+def test_cached_inventory_answers_other_filters(steam_stub):
+    everything = steam_client.get_inventory(STEAM_ID)
+    tradable = steam_client.get_inventory(STEAM_ID, filter_tradable=True)
+    rifles = steam_client.get_inventory(STEAM_ID, filter_item_type="Rifle")
+
+    assert len(steam_stub.requests_seen) == 3  # Only the first call's pages
+    assert len(everything) == ASSET_COUNT
+    assert len(tradable) == ASSET_COUNT * 6 // 10
+    assert len(rifles) == ASSET_COUNT // 2
+
+
+def test_expired_inventory_is_downloaded_again(steam_stub, monkeypatch):
+    steam_client.get_inventory(STEAM_ID)
+    monkeypatch.setattr(steam_client.time, "time", lambda: 10**10)
+
+    steam_client.get_inventory(STEAM_ID)
+
+    assert len(steam_stub.requests_seen) == 6
+
+
+def test_expired_inventory_is_served_when_steam_fails(
+    steam_stub, mocker, monkeypatch
+):
+    steam_client.get_inventory(STEAM_ID)
+    monkeypatch.setattr(steam_client.time, "time", lambda: 10**10)
+    mocker.patch(
+        "http_client.get",
+        side_effect=steam_client.requests.exceptions.HTTPError("429"),
+    )
+
+    assert len(steam_client.get_inventory(STEAM_ID)) == ASSET_COUNT
+
+
+def test_long_rate_limit_is_raised_unless_a_copy_is_cached(
+    steam_stub, mocker, monkeypatch
+):
+    mocker.patch(
+        "http_client.get",
+        side_effect=http_client.RateLimitExceeded("wait", retry_after=600),
+    )
+    with pytest.raises(http_client.RateLimitExceeded):
+        steam_client.get_inventory(STEAM_ID)
+
+    mocker.stopall()
+    steam_client.get_inventory(STEAM_ID)
+    monkeypatch.setattr(steam_client.time, "time", lambda: 10**10)
+    mocker.patch(
+        "http_client.get",
+        side_effect=http_client.RateLimitExceeded("wait", retry_after=600),
+    )
+    assert len(steam_client.get_inventory(STEAM_ID)) == ASSET_COUNT
+
+
+def test_hot_inventory_is_refreshed_in_background(steam_stub, mocker):
+    steam_client.get_inventory(STEAM_ID)
+    # Pretend the cached copy is older than half its TTL.
+    database.save_cached_inventory(
+        STEAM_ID,
+        database.get_cached_inventory(STEAM_ID)[0],
+        int(steam_client.time.time()) - 200,
+    )
+    refresh = mocker.patch("steam_client._refresh_inventory")
+
+    steam_client.get_inventory(STEAM_ID)
+    refresh.assert_not_called()  # A single hit is not hot yet
+    steam_client.get_inventory(STEAM_ID)
+
+    refresh.assert_called_once_with(STEAM_ID, None)
+
+
+def test_get_inventory_quantities_groups_assets(steam_stub):
+    quantities = steam_client.get_inventory_quantities(
+        STEAM_ID, filter_tradable=True
+    )
+
+    # 6 tradable descriptions, each shared by 500 assets.
+    assert quantities == {
+        f"Skin {i} (Field-Tested)": 500 for i in range(10) if i % 3
+    }
+
+
+def test_parse_description_reads_tags():
+    description = {
+        "classid": "1",
+        "market_hash_name": "AK-47 | Redline (Field-Tested)",
+        "tradable": 1,
+        "marketable": 1,
+        "tags": [
+            {"category": "Type", "localized_tag_name": "Rifle"},
+            {"category": "Rarity", "localized_tag_name": "Classified"},
+            {"category": "Exterior", "name": "Field-Tested"},
+        ],
+    }
+
+    assert steam_client._parse_description(description) == {
+        "market_hash_name": "AK-47 | Redline (Field-Tested)",
+        "type": "Rifle",
+        "rarity": "Classified",
+        "exterior": "Field-Tested",
+        "tradable": True,
+        "marketable": True,
+    }
@@ -0,0 +1,462 @@
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import database
+import fx
+import http_client
+import steam_client
+import tracker
+
+INVENTORY = {
+    "AK-47 | Redline (Field-Tested)": 2,
+    "AWP | Asiimov (Field-Tested)": 1,
+}
+
+
+def slow(result, seconds):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+
+    return call
+
+
+def test_inventory_and_catalog_are_fetched_concurrently(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "CONCURRENT_FETCH", True)
+    mocker.patch(
+        "steam_client.get_inventory_quantities",
+        side_effect=slow(INVENTORY, 0.3),
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", side_effect=slow(True, 0.3))
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+
+    start = time.monotonic()
+    items, results, error = tracker.run_tracker("76561197960435530")
+    elapsed = time.monotonic() - start
+
+    assert error is None
+    assert items == sorted(INVENTORY)
+    assert results["AK-47 | Redline (Field-Tested)"] == {
+        "current_price": 10.0,
+        "quantity": 2,
+        "total_value": 20.0,
+        "trend": "Not enough data to analyze trend.",
+    }
+    assert elapsed < 0.55  # max(0.3, 0.3) rather than 0.3 + 0.3
+
+
+def test_slow_catalog_returns_partial_results(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "CONCURRENT_FETCH", True)
+    monkeypatch.setattr(tracker, "CATALOG_TIMEOUT_SECONDS", 0.1)
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", side_effect=slow(True, 0.5))
+    fetch_all_prices = mocker.patch("price_fetcher.fetch_all_prices")
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    assert items == sorted(INVENTORY)
+    assert error == tracker.PRICES_ERROR_MESSAGE
+    assert (
+        results["AWP | Asiimov (Field-Tested)"]["trend"]
+        == "Price not available."
+    )
+    fetch_all_prices.assert_not_called()
+
+
+def test_failed_prefetch_is_not_retried(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "CONCURRENT_FETCH", True)
+    monkeypatch.setattr("price_fetcher.CATALOG_TTL_SECONDS", 300)
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=False)
+    fetch_all_prices = mocker.patch("price_fetcher.fetch_all_prices")
+
+    items, _, error = tracker.run_tracker("76561197960435530")
+
+    assert items == sorted(INVENTORY)
+    assert error == tracker.PRICES_ERROR_MESSAGE
+    fetch_all_prices.assert_not_called()
+
+    # Without a catalog cache there is nothing to prefetch.
+    monkeypatch.setattr("price_fetcher.CATALOG_TTL_SECONDS", 0)
+    fetch_all_prices.return_value = {
+        item: {"skinport": 10.0} for item in INVENTORY
+    }
+    _, _, error = tracker.run_tracker("76561197960435530")
+    assert error is None
+    fetch_all_prices.assert_called_once()
+
+
+def test_slow_inventory_times_out(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "CONCURRENT_FETCH", True)
+    monkeypatch.setattr(tracker, "INVENTORY_TIMEOUT_SECONDS", 0.1)
+    mocker.patch(
+        "steam_client.get_inventory_quantities",
+        side_effect=slow(INVENTORY, 0.5),
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    assert (items, results) == ([], {})
+    assert error == tracker.INVENTORY_TIMEOUT_MESSAGE
+
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_incomplete_inventory_is_reported(mocker, monkeypatch, concurrent):
+    monkeypatch.setattr(tracker, "CONCURRENT_FETCH", concurrent)
+    mocker.patch(
+        "steam_client.get_inventory_quantities",
+        side_effect=steam_client.IncompleteInventoryError(
+            "page 2 failed", INVENTORY
+        ),
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    assert items == sorted(INVENTORY)
+    assert results["AK-47 | Redline (Field-Tested)"]["total_value"] == 20.0
+    assert error == tracker.INCOMPLETE_INVENTORY_MESSAGE
+
+
+def test_long_steam_rate_limit_is_reported(mocker):
+    mocker.patch(
+        "steam_client.get_inventory_quantities",
+        side_effect=http_client.RateLimitExceeded("wait", retry_after=600),
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    assert (items, results) == ([], {})
+    assert error == tracker.STEAM_RATE_LIMIT_MESSAGE.format(minutes=10)
+
+
+def test_prices_are_not_saved_when_the_scheduler_records_them(
+    mocker, monkeypatch
+):
+    monkeypatch.setattr(tracker, "PERSIST_PRICES", False)
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+    save_prices = mocker.patch("price_writer.save_prices")
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    assert error is None
+    assert results["AK-47 | Redline (Field-Tested)"]["total_value"] == 20.0
+    save_prices.assert_not_called()
+
+
+def test_first_request_in_another_currency_is_priced(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "PERSIST_PRICES", False)
+    monkeypatch.setattr(fx, "BASE_CURRENCY", "USD")
+    monkeypatch.setattr(fx, "FX_RATES_FILE", None)
+    monkeypatch.setattr(
+        fx,
+        "_catalog_source",
+        (
+            lambda currency: {item: 10.0 for item in INVENTORY},
+            lambda currency, item_names=None: {
+                item: 9.0 for item in item_names
+            },
+        ),
+    )
+    fx.clear_rate_cache()
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+
+    items, results, error = tracker.run_tracker(
+        "76561197960435530", currency="EUR"
+    )
+
+    assert error is None
+    assert results["AK-47 | Redline (Field-Tested)"]["total_value"] == 18.0
+    fx.clear_rate_cache()
+
+
+def test_batch_fetches_shared_data_once(mocker):
+    inventories = {
+        "1": {"AK-47 | Redline (Field-Tested)": 2},
+        "2": {
+            "AK-47 | Redline (Field-Tested)": 1,
+            "AWP | Asiimov (Field-Tested)": 1,
+        },
+        "3": {},
+    }
+    running = []
+    peak = []
+
+    def get_inventory(steam_id, **kwargs):
+        running.append(steam_id)
+        peak.append(len(running))
+        time.sleep(0.05)
+        running.remove(steam_id)
+        return inventories[steam_id]
+
+    mocker.patch(
+        "steam_client.get_inventory_quantities", side_effect=get_inventory
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    fetch_all_prices = mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+    create_tables = mocker.spy(database, "create_tables")
+    analyze = mocker.spy(tracker.analysis, "analyze_items_trend")
+
+    batch = tracker.run_tracker_batch(["1", "2", "3", "2"], max_workers=2)
+
+    accounts = batch["accounts"]
+    assert set(accounts) == {"1", "2", "3"}
+    assert (
+        accounts["1"][1]["AK-47 | Redline (Field-Tested)"]["total_value"]
+        == 20.0
+    )
+    assert accounts["2"][0] == sorted(INVENTORY)
+    assert accounts["3"] == ([], {}, tracker.NO_ITEMS_MESSAGE)
+    assert max(peak) == 2
+    assert fetch_all_prices.call_count == 1
+    assert sorted(fetch_all_prices.call_args.args[0]) == sorted(INVENTORY)
+    assert create_tables.call_count == 1
+    assert analyze.call_count == 1
+    assert set(batch["timings"]) == {
+        "setup",
+        "inventories",
+        "prices",
+        "analysis",
+        "total",
+    }
+
+
+def test_batch_analysis_in_worker_processes_matches(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "PERSIST_PRICES", False)
+    database.create_tables()
+    now = datetime.now(timezone.utc)
+    for minutes, price in ((2, 20.0), (1, 21.0)):
+        database.save_prices(
+            {item: {"skinport": price} for item in INVENTORY},
+            timestamp=now - timedelta(minutes=minutes),
+        )
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+
+    in_process = tracker.run_tracker_batch(["1"], processes=0)
+    in_workers = tracker.run_tracker_batch(["1"], processes=2)
+
+    assert in_workers["accounts"] == in_process["accounts"]
+    assert in_workers["accounts"]["1"][1]["AWP | Asiimov (Field-Tested)"][
+        "trend"
+    ].startswith("Low")
+    # Later batches reuse the same workers, which are not forked.
+    pool = tracker._process_pool
+    assert tracker.run_tracker_batch(["1"], processes=2)["accounts"] == (
+        in_process["accounts"]
+    )
+    assert tracker._process_pool is pool
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_iter_tracker_yields_results_page_by_page(mocker):
+    pages = [
+        {"AK-47 | Redline (Field-Tested)": 1},
+        {
+            "AWP | Asiimov (Field-Tested)": 1,
+            "AK-47 | Redline (Field-Tested)": 1,
+        },
+    ]
+    mocker.patch("steam_client.iter_inventory", return_value=iter(pages))
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    fetch_all_prices = mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        side_effect=lambda names, currency: {
+            name: {"skinport": 10.0} for name in names
+        },
+    )
+
+    analyze = mocker.spy(tracker.analysis, "analyze_items_trend")
+
+    events = tracker.iter_tracker("76561197960435530")
+    first = next(events)
+    assert first["item"] == "AK-47 | Redline (Field-Tested)"
+    assert first["quantity"] == 1
+    # Sent once priced, before its trend is analyzed.
+    assert first["trend"] is None
+    assert fetch_all_prices.call_count == 1
+    analyze.assert_not_called()
+    assert next(events) == {
+        "event": "trend",
+        "item": "AK-47 | Redline (Field-Tested)",
+        "trend": "Not enough data to analyze trend.",
+    }
+
+    rest = list(events)
+    updated = [
+        e for e in rest if e.get("item") == "AK-47 | Redline (Field-Tested)"
+    ]
+    assert updated[-1]["quantity"] == 2
+    assert updated[-1]["trend"] == "Not enough data to analyze trend."
+    assert updated[-1]["total_value"] == 20.0
+    # Items already priced on an earlier page are not fetched again.
+    assert fetch_all_prices.call_args.args[0] == [
+        "AWP | Asiimov (Field-Tested)"
+    ]
+    assert rest[-1] == {
+        "event": "done",
+        "items": 2,
+        "total_quantity": 3,
+        "total_value": 30.0,
+    }
+
+
+def test_iter_tracker_reports_an_empty_inventory(mocker):
+    mocker.patch("steam_client.iter_inventory", return_value=iter([]))
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+
+    events = list(tracker.iter_tracker("76561197960435530"))
+
+    assert events[0] == {"event": "error", "message": tracker.NO_ITEMS_MESSAGE}
+    assert events[-1]["items"] == 0
+
+
+def test_iter_tracker_reports_an_incomplete_inventory(mocker):
+    def pages(*args, **kwargs):
+        yield {"AK-47 | Redline (Field-Tested)": 1}
+        raise steam_client.IncompleteInventoryError("page 2 failed")
+
+    mocker.patch("steam_client.iter_inventory", side_effect=pages)
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        side_effect=lambda names, currency: {
+            name: {"skinport": 10.0} for name in names
+        },
+    )
+
+    events = list(tracker.iter_tracker("76561197960435530"))
+
+    assert [event["event"] for event in events] == [
+        "item",
+        "trend",
+        "error",
+        "done",
+    ]
+    assert events[2]["message"] == tracker.INCOMPLETE_INVENTORY_MESSAGE
+    assert events[-1]["items"] == 1
+
+
+def test_iter_tracker_does_not_call_an_unfinished_inventory_empty(mocker):
+    def pages(*args, **kwargs):
+        raise steam_client.IncompleteInventoryError("page 1 failed")
+        yield
+
+    mocker.patch("steam_client.iter_inventory", side_effect=pages)
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+
+    events = list(tracker.iter_tracker("76561197960435530"))
+
+    assert events[:-1] == [
+        {"event": "error", "message": tracker.INCOMPLETE_INVENTORY_MESSAGE}
+    ]
+    assert events[-1]["items"] == 0
+
+
+def test_iter_tracker_announces_the_save_step_once(mocker, capsys):
+    pages = [
+        {"AK-47 | Redline (Field-Tested)": 1},
+        {"AWP | Asiimov (Field-Tested)": 1},
+    ]
+    mocker.patch("steam_client.iter_inventory", return_value=iter(pages))
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    fetch_all_prices = mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        side_effect=lambda names, currency: {
+            name: {"skinport": 10.0} for name in names
+        },
+    )
+
+    list(tracker.iter_tracker("76561197960435530"))
+
+    assert fetch_all_prices.call_count == 2
+    assert capsys.readouterr().out.count("[Step 4/4]") == 1
+
+
+def test_identical_runs_are_coalesced_and_cached(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "RESULT_CACHE_TTL_SECONDS", 60)
+    tracker.clear_result_cache()
+    result = (sorted(INVENTORY), {}, None)
+    run_tracker = mocker.patch(
+        "tracker.run_tracker", side_effect=slow(result, 0.2)
+    )
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(
+            pool.map(
+                lambda _: tracker.run_tracker_cached("1", currency="eur"),
+                range(4),
+            )
+        )
+    assert results == [result] * 4
+    assert run_tracker.call_count == 1
+
+    # Served from the cache afterwards; other parameters run again.
+    assert tracker.run_tracker_cached("1", currency="EUR") == result
+    tracker.run_tracker_cached("1", currency="USD")
+    assert run_tracker.call_count == 2
+
+    # Results with an error are not cached.
+    run_tracker.side_effect = None
+    run_tracker.return_value = ([], {}, "Error")
+    tracker.run_tracker_cached("2")
+    tracker.run_tracker_cached("2")
+    assert run_tracker.call_count == 4
+    tracker.clear_result_cache()
+
+
+def test_results_include_statistics_when_enabled(mocker, monkeypatch):
+    monkeypatch.setattr(tracker, "ANALYTICS", True)
+    mocker.patch(
+        "steam_client.get_inventory_quantities", return_value=INVENTORY
+    )
+    mocker.patch("price_fetcher.prefetch_catalog", return_value=True)
+    mocker.patch(
+        "price_fetcher.fetch_all_prices",
+        return_value={item: {"skinport": 10.0} for item in INVENTORY},
+    )
+
+    items, results, error = tracker.run_tracker("76561197960435530")
+
+    stats = results["AK-47 | Redline (Field-Tested)"]["stats"]
+    assert stats["samples"] >= 1
+    assert stats["mean"] == 10.0
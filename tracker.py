@@ -2,33 +2,411 @@
 Main tracking logic for the Steam Inventory Price Tracker.
 """
 
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError,
+)
+
 import steam_client
 import price_fetcher
 import database
+import price_writer
 import analysis
 import config
+import fx
+import http_client
+import metrics
+import portfolio
+
+# In concurrent mode the Skinport catalog is downloaded while the inventory
+# is being fetched, instead of after it.
+CONCURRENT_FETCH = (
+    os.environ.get("TRACKER_CONCURRENT_FETCH", "true").lower() == "true"
+)
+# Per-stage deadlines, counted from the start of the fetch stage.
+INVENTORY_TIMEOUT_SECONDS = float(
+    os.environ.get("TRACKER_INVENTORY_TIMEOUT", "30")
+)
+CATALOG_TIMEOUT_SECONDS = float(
+    os.environ.get("TRACKER_CATALOG_TIMEOUT", "30")
+)
+# Set to false when scheduler.py records the price history, so requests
+# only read prices.
+PERSIST_PRICES = (
+    os.environ.get("TRACKER_PERSIST_PRICES", "true").lower() == "true"
+)
+
+# Adds vectorized price statistics (see analytics.py) to each result.
+ANALYTICS = os.environ.get("TRACKER_ANALYTICS", "false").lower() == "true"
+
+# Batch mode: how many inventories are downloaded at once, and how many
+# worker processes share the trend analysis (0 analyzes in this process).
+BATCH_INVENTORY_CONCURRENCY = int(
+    os.environ.get("TRACKER_BATCH_CONCURRENCY", "4")
+)
+BATCH_ANALYSIS_PROCESSES = int(os.environ.get("TRACKER_BATCH_PROCESSES", "0"))
+
+# How long (in seconds) the result of run_tracker_cached is re-used for
+# identical requests, and how many results are kept. 0 disables the cache
+# (concurrent identical requests are still coalesced).
+RESULT_CACHE_TTL_SECONDS = int(
+    os.environ.get("TRACKER_RESULT_CACHE_TTL", "60")
+)
+RESULT_CACHE_MAX_ENTRIES = 256
+
+# Records each tracked inventory as its SteamID's portfolio holdings, so
+# its value history is kept up to date as prices are saved.
+RECORD_PORTFOLIO = (
+    os.environ.get("TRACKER_PORTFOLIO", "true").lower() == "true"
+)
+
+NO_ITEMS_MESSAGE = (
+    "No se encontraron artículos en el inventario que coincidan con los "
+    "filtros seleccionados (ej. 'solo intercambiables')."
+)
+INVENTORY_TIMEOUT_MESSAGE = (
+    "Error: Steam tardó demasiado en devolver el inventario. "
+    "Inténtalo de nuevo en unos minutos."
+)
+STEAM_RATE_LIMIT_MESSAGE = (
+    "Error: Steam ha limitado temporalmente las peticiones. "
+    "Inténtalo de nuevo en {minutes} minutos."
+)
+INCOMPLETE_INVENTORY_MESSAGE = (
+    "Error: Steam dejó de responder antes de devolver el inventario completo. "
+    "Solo se muestran los artículos recibidos. "
+    "Inténtalo de nuevo en unos minutos."
+)
+PRICES_ERROR_MESSAGE = (
+    "Error: No se pudieron obtener los datos de precios desde la API de "
+    "Skinport. El servicio puede estar temporalmente caído. "
+    "Los precios históricos podrían seguir visibles."
+)
+FX_ERROR_MESSAGE = (
+    "Error: No hay tipo de cambio disponible para {currency}. "
+    "Inténtalo de nuevo en unos minutos o prueba con otra divisa."
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Worker processes of run_tracker_batch's trend analysis, kept between
+# batches, and how many workers they have.
+_process_pool = None
+_process_pool_size = 0
+
+# Results of recent run_tracker_cached calls: key -> (stored_at, result),
+# and the calls still running: key -> Future.
+_result_cache = {}
+_result_inflight = {}
+_result_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Returns the thread pool shared by concurrent fetches."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=8, thread_name_prefix="tracker-fetch"
+            )
+        return _executor
+
+
+def _get_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Returns the worker processes shared by batch analyses, replacing them
+    if a different number of workers is requested.
+
+    Workers are started from a fork server (or spawned where there is
+    none) rather than forked from this process, whose fetch threads may
+    hold locks a forked child would inherit.
+    """
+    global _process_pool, _process_pool_size
+    with _executor_lock:
+        if _process_pool is None or _process_pool_size != processes:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            _process_pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context(method),
+            )
+            _process_pool_size = processes
+        return _process_pool
+
+
+def _catalog_prefetched(prefetched: bool) -> bool:
+    """
+    Tells whether prefetch_catalog's result means prices can be looked up.
+    It returns False both when the download failed and when the catalog
+    cache is disabled, in which case prices are downloaded on lookup.
+    """
+    return prefetched or price_fetcher.CATALOG_TTL_SECONDS <= 0
+
+
+def _rate_limit_message(error: http_client.RateLimitExceeded) -> str:
+    """Returns the message telling the user how long Steam asked to wait."""
+    return STEAM_RATE_LIMIT_MESSAGE.format(
+        minutes=math.ceil(error.retry_after / 60)
+    )
+
+
+def _get_inventory(
+    steam_id: str, use_test_data: bool, filter_tradable: bool
+) -> tuple[dict[str, int], str | None]:
+    """
+    Fetches the quantities of an inventory.
+
+    Returns:
+        A tuple of (inventory_quantities, error_message). If Steam stopped
+        answering partway through, the quantities counted so far are
+        returned with INCOMPLETE_INVENTORY_MESSAGE.
+    """
+    try:
+        inventory_items = steam_client.get_inventory_quantities(
+            steam_id,
+            use_test_data=use_test_data,
+            filter_tradable=filter_tradable,
+        )
+    except http_client.RateLimitExceeded as e:
+        print(f"Steam is rate limiting requests: {e}")
+        return {}, _rate_limit_message(e)
+    except steam_client.IncompleteInventoryError as e:
+        print(f"Incomplete inventory: {e}")
+        return e.quantities, INCOMPLETE_INVENTORY_MESSAGE
+    return inventory_items, None
+
+
+def _fetch_inventory_and_catalog(
+    steam_id: str, use_test_data: bool, currency: str, filter_tradable: bool
+) -> tuple[dict[str, int], str | None, bool, str | None]:
+    """
+    Fetches the inventory while the price catalog is prefetched.
+
+    Work that misses its deadline is cancelled if it has not started yet;
+    downloads already running finish in the background and still fill the
+    catalog cache for later requests.
+
+    Returns:
+        A tuple of (inventory_quantities, inventory_error, prices_available,
+        prices_error). inventory_error is None only if the whole inventory
+        was fetched.
+    """
+    executor = _get_executor()
+    start = time.monotonic()
+    catalog_future = executor.submit(price_fetcher.prefetch_catalog, currency)
+    inventory_future = executor.submit(
+        _get_inventory, steam_id, use_test_data, filter_tradable
+    )
+
+    try:
+        inventory_items, inventory_error = inventory_future.result(
+            timeout=INVENTORY_TIMEOUT_SECONDS
+        )
+    except TimeoutError:
+        print(f"Inventory fetch timed out after {INVENTORY_TIMEOUT_SECONDS}s.")
+        inventory_future.cancel()
+        catalog_future.cancel()
+        return {}, INVENTORY_TIMEOUT_MESSAGE, False, None
+
+    if not inventory_items:
+        catalog_future.cancel()
+        return {}, inventory_error, False, None
+
+    remaining = CATALOG_TIMEOUT_SECONDS - (time.monotonic() - start)
+    try:
+        prefetched = catalog_future.result(timeout=max(remaining, 0))
+    except TimeoutError:
+        print(f"Catalog fetch timed out after {CATALOG_TIMEOUT_SECONDS}s.")
+        catalog_future.cancel()
+        return inventory_items, inventory_error, False, PRICES_ERROR_MESSAGE
+    if not _catalog_prefetched(prefetched):
+        # The download just failed: trying again right away would only
+        # double the wait.
+        return inventory_items, inventory_error, False, PRICES_ERROR_MESSAGE
 
+    print(f"Inventory and catalog fetched in {time.monotonic() - start:.2f}s.")
+    return inventory_items, inventory_error, True, None
 
 
+def _fetch_and_save_prices(
+    item_names: list[str],
+    currency: str,
+    prices_available: bool = True,
+    log_step: bool = True,
+) -> tuple[dict[str, float | None], str | None]:
+    """
+    Fetches the current prices of some items, saves them to the price
+    history and converts them to the display currency.
+
+    Prices are always fetched and stored in the base currency. Skinport
+    prices served from the catalog snapshot are shown but not saved, as
+    they are not current. With log_step False the "[Step 4/4]" message is
+    not printed, for callers that fetch the prices of a run in parts.
+
+    Returns:
+        A tuple of (skinport_prices, error_message), where skinport_prices
+        maps every item name to its Skinport price in `currency` (or None).
+    """
+    error_message = None
+    base_prices = None
+    # Checked before fetching: a snapshot is only ever replaced by a live
+    # catalog, so prices fetched afterwards are at worst live and unsaved.
+    from_snapshot = price_fetcher.is_snapshot_catalog(fx.BASE_CURRENCY)
+    if prices_available:
+        base_prices = price_fetcher.fetch_all_prices(
+            item_names, currency=fx.BASE_CURRENCY
+        )
+
+    if base_prices is None:
+        print("Could not fetch price data from external APIs.")
+        error_message = PRICES_ERROR_MESSAGE
+        base_prices = {}  # Use an empty dict to avoid further errors
+    print("Price fetch complete.")
+
+    # 4. Save the new price data to the database
+    # With write-behind enabled this only queues the snapshot, so the trend
+    # analysis below may not include it yet.
+    if PERSIST_PRICES:
+        if log_step:
+            print("\n[Step 4/4] Saving new price data to the database...")
+        saved_prices = base_prices
+        if from_snapshot:
+            print(
+                "Skinport prices come from the catalog snapshot; "
+                "not saving them."
+            )
+            saved_prices = {
+                item_name: {
+                    source: price
+                    for source, price in sources.items()
+                    if source != "skinport"
+                }
+                for item_name, sources in base_prices.items()
+            }
+        price_writer.save_prices(saved_prices)
+    elif log_step:
+        print(
+            "\n[Step 4/4] Price history is recorded by the scheduler; "
+            "not saving."
+        )
+
+    rate = fx.get_rate(currency)
+    if rate is None:
+        print(f"No exchange rate available for {currency}.")
+        error_message = error_message or FX_ERROR_MESSAGE.format(
+            currency=currency
+        )
+        current_prices = {}
+    else:
+        current_prices = fx.convert_prices(base_prices, rate)
+
+    # Using skinport for analysis
+    skinport_prices = {
+        item_name: current_prices.get(item_name, {}).get("skinport")
+        for item_name in item_names
+    }
+    return skinport_prices, error_message
+
+
+def _record_portfolio(
+    steam_id: str,
+    inventory_items: dict[str, int],
+    use_test_data: bool,
+    filter_tradable: bool,
+    complete: bool,
+):
+    """
+    Stores an inventory as the portfolio holdings of its SteamID.
+
+    Test inventories, inventories filtered to tradable items and
+    incomplete inventories are not recorded, as they are not what the
+    account holds.
+    """
+    if (
+        not RECORD_PORTFOLIO
+        or use_test_data
+        or filter_tradable
+        or not complete
+        or not inventory_items
+    ):
+        return
+    try:
+        portfolio.record_inventory(steam_id, inventory_items)
+    except sqlite3.Error as e:
+        print(f"Could not record the portfolio of {steam_id}: {e}")
+
+
+def _compute_stats(
+    item_names: list[str], prices: dict[str, float | None], currency: str
+) -> dict[str, dict]:
+    """Returns analytics.summarize statistics if ANALYTICS is enabled."""
+    if not ANALYTICS or not item_names:
+        return {}
+    # Imported here so NumPy is only loaded when the statistics are used.
+    import analytics
+
+    return analytics.summarize(item_names, prices, currency=currency)
+
+
+def _build_results(
+    inventory_items: dict[str, int],
+    prices: dict[str, float | None],
+    trends: dict[str, str],
+    stats: dict[str, dict] | None = None,
+) -> dict[str, dict]:
+    """Builds the per-item results of one inventory."""
+    stats = stats or {}
+    analysis_results = {}
+    for item_name in sorted(inventory_items):
+        current_price = prices.get(item_name)
+        quantity = inventory_items[item_name]
+        analysis_results[item_name] = {
+            "current_price": current_price,
+            "quantity": quantity,
+            "total_value": (
+                current_price * quantity if current_price is not None else None
+            ),
+            "trend": trends.get(item_name, "Price not available."),
+        }
+        if item_name in stats:
+            analysis_results[item_name]["stats"] = stats[item_name]
+    return analysis_results
+
+
+@metrics.timed("run_tracker")
 def run_tracker(
     steam_id: str,
     use_test_data: bool = False,
     currency: str = "USD",
     filter_tradable: bool = False,
 ):
-
     """
     Runs the full tracking and analysis process.
 
     Args:
         steam_id: The 64-bit SteamID of the user.
         use_test_data: If True, uses a hardcoded test inventory.
-        currency: The currency to fetch prices in.
+        currency: The currency to show prices in.
         filter_tradable: If True, only fetches tradable items.
 
     Returns:
-        A tuple containing (list_of_items, dict_of_prices, error_message).
-        Returns (None, None, None) if an error occurs.
+        A tuple containing (list_of_items, dict_of_results, error_message).
+        Each result holds the item's 'current_price', 'quantity',
+        'total_value' and 'trend'.
     """
     print("--- Running Tracker ---")
     if use_test_data:
@@ -40,70 +418,417 @@ def run_tracker(
 
     # 2. Fetch Steam Inventory
     print(f"\n[Step 2/4] Fetching Steam Inventory for SteamID: {steam_id}...")
-    inventory_items = steam_client.get_inventory(
-
-        steam_id,
-        use_test_data=use_test_data,
-        filter_tradable=filter_tradable,
-
-    )
-    if not inventory_items:
-        print(
-            "Could not fetch inventory or no items matched the filters."
+    prices_available = True
+    prices_error = None
+    if CONCURRENT_FETCH:
+        inventory_items, inventory_error, prices_available, prices_error = (
+            _fetch_inventory_and_catalog(
+                steam_id, use_test_data, currency, filter_tradable
+            )
         )
-        # Return empty lists and a specific message
-        return (
-            [],
-            {},
-            "No se encontraron artículos en el inventario que coincidan con los filtros seleccionados (ej. 'solo intercambiables').",
+    else:
+        inventory_items, inventory_error = _get_inventory(
+            steam_id, use_test_data, filter_tradable
         )
+    error_message = inventory_error or prices_error
+    if not inventory_items:
+        print("Could not fetch inventory or no items matched the filters.")
+        # Return empty lists and a specific message
+        return [], {}, error_message or NO_ITEMS_MESSAGE
 
-    unique_inventory_items = sorted(list(set(inventory_items)))
+    unique_inventory_items = sorted(inventory_items)
     print(
-        f"Found {len(inventory_items)} total items ({len(unique_inventory_items)} unique)."
+        f"Found {sum(inventory_items.values())} total items "
+        f"({len(unique_inventory_items)} unique)."
+    )
+    # Recorded before the prices are saved, so saving them values it.
+    _record_portfolio(
+        steam_id,
+        inventory_items,
+        use_test_data,
+        filter_tradable,
+        complete=inventory_error is None,
     )
 
     # 3. Fetch current prices for these items
     print(
-        f"\n[Step 3/4] Fetching current market prices for {len(unique_inventory_items)} unique items..."
+        "\n[Step 3/4] Fetching current market prices for "
+        f"{len(unique_inventory_items)} unique items..."
     )
 
-    current_prices = price_fetcher.fetch_all_prices(
-        unique_inventory_items, currency=currency
+    skinport_prices, prices_error = _fetch_and_save_prices(
+        unique_inventory_items, currency, prices_available
     )
+    error_message = error_message or prices_error
 
-    error_message = None
+    # 5. Analyze and build results dictionary
+    trends = analysis.analyze_items_trend(
+        unique_inventory_items, skinport_prices, currency=currency
+    )
+    stats = _compute_stats(unique_inventory_items, skinport_prices, currency)
+    analysis_results = _build_results(
+        inventory_items, skinport_prices, trends, stats
+    )
 
-    if current_prices is None:
-        print("Could not fetch price data from external APIs.")
-        error_message = (
-            "Error: No se pudieron obtener los datos de precios desde la API de Skinport. "
-            "El servicio puede estar temporalmente caído. Los precios históricos podrían seguir visibles."
+    print("\n--- Tracking Complete ---")
+    return unique_inventory_items, analysis_results, error_message
+
+
+def run_tracker_cached(
+    steam_id: str,
+    use_test_data: bool = False,
+    currency: str = "USD",
+    filter_tradable: bool = False,
+):
+    """
+    Same as run_tracker, but re-uses recent results.
+
+    A successful result is kept for RESULT_CACHE_TTL_SECONDS. Identical
+    calls made while one is running wait for it and share its result
+    instead of running the tracker again. Results with an error message
+    are shared with the waiting calls but not cached.
+
+    Returns:
+        The same tuple as run_tracker.
+    """
+    key = (steam_id, use_test_data, currency.upper(), filter_tradable)
+    with _result_lock:
+        cached = _result_cache.get(key)
+        if cached and time.monotonic() - cached[0] < RESULT_CACHE_TTL_SECONDS:
+            print("Serving tracker results from the cache.")
+            metrics.cache_lookup("result", "hit")
+            return cached[1]
+        future = _result_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _result_inflight[key] = Future()
+
+    if not leader:
+        print("Waiting for an identical tracker run in progress.")
+        metrics.cache_lookup("result", "coalesced")
+        return future.result()
+    metrics.cache_lookup("result", "miss")
+
+    try:
+        result = run_tracker(
+            steam_id, use_test_data, currency, filter_tradable
         )
-        current_prices = {}  # Use an empty dict to avoid further errors
-    print("Price fetch complete.")
+    except BaseException as e:
+        with _result_lock:
+            _result_inflight.pop(key, None)
+        future.set_exception(e)
+        raise
 
-    # 4. Save the new price data to the database
-    print("\n[Step 4/4] Saving new price data to the database...")
-    database.save_prices(current_prices)
+    with _result_lock:
+        if result[2] is None and RESULT_CACHE_TTL_SECONDS > 0:
+            _result_cache.pop(key, None)
+            _result_cache[key] = (time.monotonic(), result)
+            while len(_result_cache) > RESULT_CACHE_MAX_ENTRIES:
+                del _result_cache[next(iter(_result_cache))]  # Oldest first
+        _result_inflight.pop(key, None)
+    future.set_result(result)
+    return result
 
-    # 5. Analyze and build results dictionary
-    analysis_results = {}
-    for item_name in unique_inventory_items:
-        item_price_data = current_prices.get(item_name, {})
 
-        current_price = item_price_data.get("skinport")  # Using skinport for analysis
+def clear_result_cache():
+    """Drops all cached tracker results."""
+    with _result_lock:
+        _result_cache.clear()
 
-        analysis_results[item_name] = {
-            "current_price": current_price,
-            "trend": analysis.analyze_item_trend(item_name, current_price)
-            if current_price is not None
-            else "Price not available.",
 
+def iter_tracker(
+    steam_id: str,
+    use_test_data: bool = False,
+    currency: str = "USD",
+    filter_tradable: bool = False,
+):
+    """
+    Runs the tracker, yielding results as soon as each one is ready.
+
+    The inventory is processed page by page, so the first results do not
+    wait for the whole inventory. The items of a page are yielded as soon
+    as their prices are looked up, and their trends, which need the price
+    history, follow in separate events. Items seen on several pages are
+    yielded again with their updated quantity.
+
+    Args:
+        steam_id: The 64-bit SteamID of the user.
+        use_test_data: If True, uses a hardcoded test inventory.
+        currency: The currency to show prices in.
+        filter_tradable: If True, only fetches tradable items.
+
+    Yields:
+        Dictionaries with an 'event' key:
+        - 'item': one result, with the keys 'item' (the item name) and the
+          same keys as a run_tracker result, except that 'trend' is None
+          until a 'trend' event for the item has been sent. A later 'item'
+          event for the same item replaces the earlier one.
+        - 'trend': the 'trend' of an item sent before, with the keys 'item',
+          'trend' and, with analytics enabled, 'stats'.
+        - 'error': a message for the user, in the key 'message', e.g. when
+          Steam stops answering before the last page.
+        - 'done': the last event, with the number of unique 'items', the
+          'total_quantity' and the 'total_value' of the priced items.
+    """
+    database.create_tables()
+    # Give the catalog download a head start while the first page loads.
+    _get_executor().submit(price_fetcher.prefetch_catalog, currency)
+
+    quantities = {}
+    prices = {}
+    trends = {}
+    stats = {}
+    errors = set()
+    complete = False
+    pages = steam_client.iter_inventory(
+        steam_id, use_test_data=use_test_data, filter_tradable=filter_tradable
+    )
+    try:
+        for page in pages:
+            new_items = sorted(item for item in page if item not in quantities)
+            for item_name, quantity in page.items():
+                quantities[item_name] = quantities.get(item_name, 0) + quantity
+
+            if new_items:
+                # Only the first page announces the step.
+                page_prices, error = _fetch_and_save_prices(
+                    new_items, currency, log_step=not prices
+                )
+                if error and error not in errors:
+                    errors.add(error)
+                    yield {"event": "error", "message": error}
+                prices.update(page_prices)
+
+            page_results = _build_results(
+                {item_name: quantities[item_name] for item_name in page},
+                prices,
+                trends,
+                stats,
+            )
+            for item_name, result in page_results.items():
+                if item_name not in trends:
+                    result["trend"] = None
+                yield {"event": "item", "item": item_name, **result}
+
+            if new_items:
+                new_trends = analysis.analyze_items_trend(
+                    new_items, page_prices, currency=currency
+                )
+                new_stats = _compute_stats(new_items, page_prices, currency)
+                trends.update(new_trends)
+                stats.update(new_stats)
+                for item_name in new_items:
+                    event = {
+                        "event": "trend",
+                        "item": item_name,
+                        "trend": new_trends.get(
+                            item_name, "Price not available."
+                        ),
+                    }
+                    if item_name in new_stats:
+                        event["stats"] = new_stats[item_name]
+                    yield event
+        complete = True
+    except http_client.RateLimitExceeded as e:
+        print(f"Steam is rate limiting requests: {e}")
+        errors.add(_rate_limit_message(e))
+        yield {"event": "error", "message": _rate_limit_message(e)}
+    except steam_client.IncompleteInventoryError as e:
+        print(f"Incomplete inventory: {e}")
+        errors.add(INCOMPLETE_INVENTORY_MESSAGE)
+        yield {"event": "error", "message": INCOMPLETE_INVENTORY_MESSAGE}
+
+    if not quantities and not errors:
+        yield {"event": "error", "message": NO_ITEMS_MESSAGE}
+    _record_portfolio(
+        steam_id, quantities, use_test_data, filter_tradable, complete
+    )
+
+    priced = [
+        prices[item_name] * quantity
+        for item_name, quantity in quantities.items()
+        if prices.get(item_name) is not None
+    ]
+    yield {
+        "event": "done",
+        "items": len(quantities),
+        "total_quantity": sum(quantities.values()),
+        "total_value": sum(priced) if priced else None,
+    }
+
+
+def _analyze_chunk(
+    db_file: str,
+    items: list[str],
+    prices: dict[str, float | None],
+    currency: str,
+) -> dict[str, str]:
+    """Runs the trend analysis of some items in a worker process."""
+    database.DB_FILE = db_file
+    return analysis.analyze_items_trend(items, prices, currency=currency)
+
+
+@metrics.timed("analysis_pool")
+def _analyze_in_processes(
+    items: list[str],
+    prices: dict[str, float | None],
+    currency: str,
+    processes: int,
+) -> dict[str, str]:
+    """Splits the trend analysis of many items across worker processes."""
+    chunk_size = -(-len(items) // processes)  # Ceiling division
+    chunks = [
+        items[i : i + chunk_size] for i in range(0, len(items), chunk_size)
+    ]
+    pool = _get_process_pool(processes)
+    futures = [
+        pool.submit(
+            _analyze_chunk,
+            database.DB_FILE,
+            chunk,
+            {item: prices[item] for item in chunk},
+            currency,
+        )
+        for chunk in chunks
+    ]
+    trends = {}
+    for future in futures:
+        trends.update(future.result())
+    return trends
+
+
+def run_tracker_batch(
+    steam_ids: list[str],
+    use_test_data: bool = False,
+    currency: str = "USD",
+    filter_tradable: bool = False,
+    max_workers: int | None = None,
+    processes: int | None = None,
+) -> dict:
+    """
+    Runs the tracker for many accounts at once.
+
+    The database is initialized once, inventories are downloaded
+    concurrently while the price catalog is prefetched, and the items of
+    all inventories are priced, saved and analyzed together, so an item
+    held by many accounts is only processed once.
+
+    Args:
+        steam_ids: The 64-bit SteamIDs of the users.
+        use_test_data: If True, uses a hardcoded test inventory.
+        currency: The currency to show prices in.
+        filter_tradable: If True, only fetches tradable items.
+        max_workers: Inventories downloaded at once
+                     (default BATCH_INVENTORY_CONCURRENCY).
+        processes: Worker processes for the trend analysis
+                   (default BATCH_ANALYSIS_PROCESSES; 0 or 1 analyzes in
+                   this process).
+
+    Returns:
+        A dictionary with the keys 'accounts', mapping each SteamID to the
+        same (list_of_items, dict_of_results, error_message) tuple as
+        run_tracker, and 'timings', mapping each stage ('setup',
+        'inventories', 'prices', 'analysis', 'total') to its duration in
+        seconds.
+    """
+    if max_workers is None:
+        max_workers = BATCH_INVENTORY_CONCURRENCY
+    if processes is None:
+        processes = BATCH_ANALYSIS_PROCESSES
+
+    timings = {}
+    start = time.monotonic()
+    print(f"--- Running Tracker for {len(steam_ids)} accounts ---")
+
+    # 1. Initialize the database
+    stage_start = time.monotonic()
+    database.create_tables()
+    timings["setup"] = time.monotonic() - stage_start
+
+    # 2. Fetch every inventory while the catalog is prefetched
+    stage_start = time.monotonic()
+    catalog_future = _get_executor().submit(
+        price_fetcher.prefetch_catalog, currency
+    )
+    inventories = {}
+    errors = {}
+    with ThreadPoolExecutor(
+        max_workers=max(max_workers, 1), thread_name_prefix="tracker-batch"
+    ) as pool:
+        futures = {
+            steam_id: pool.submit(
+                _get_inventory, steam_id, use_test_data, filter_tradable
+            )
+            for steam_id in dict.fromkeys(steam_ids)
         }
+        for steam_id, future in futures.items():
+            try:
+                inventories[steam_id], error = future.result()
+            except Exception as e:
+                print(f"Could not fetch the inventory of {steam_id}: {e}")
+                inventories[steam_id], error = {}, None
+            if error:
+                errors[steam_id] = error
+            elif not inventories[steam_id]:
+                errors[steam_id] = NO_ITEMS_MESSAGE
+    timings["inventories"] = time.monotonic() - stage_start
 
-    print("\n--- Tracking Complete ---")
-    return unique_inventory_items, analysis_results, error_message
+    all_items = sorted(set().union(*inventories.values()))
+    print(f"Found {len(all_items)} unique items across all accounts.")
+    for steam_id, inventory_items in inventories.items():
+        _record_portfolio(
+            steam_id,
+            inventory_items,
+            use_test_data,
+            filter_tradable,
+            complete=steam_id not in errors,
+        )
+
+    # 3. Price and save the union of all items once
+    stage_start = time.monotonic()
+    prices, prices_error = {}, None
+    if all_items:
+        remaining = CATALOG_TIMEOUT_SECONDS - (time.monotonic() - start)
+        try:
+            prices_available = _catalog_prefetched(
+                catalog_future.result(timeout=max(remaining, 0))
+            )
+        except TimeoutError:
+            print(f"Catalog fetch timed out after {CATALOG_TIMEOUT_SECONDS}s.")
+            prices_available = False
+        prices, prices_error = _fetch_and_save_prices(
+            all_items, currency, prices_available
+        )
+    timings["prices"] = time.monotonic() - stage_start
+
+    # 4. Analyze every item once
+    stage_start = time.monotonic()
+    if processes > 1 and len(all_items) > 1:
+        trends = _analyze_in_processes(all_items, prices, currency, processes)
+    else:
+        trends = analysis.analyze_items_trend(
+            all_items, prices, currency=currency
+        )
+    stats = _compute_stats(all_items, prices, currency)
+    timings["analysis"] = time.monotonic() - stage_start
+
+    accounts = {}
+    for steam_id, inventory_items in inventories.items():
+        accounts[steam_id] = (
+            sorted(inventory_items),
+            _build_results(inventory_items, prices, trends, stats),
+            errors.get(steam_id) or prices_error,
+        )
+
+    timings["total"] = time.monotonic() - start
+    print(
+        "--- Batch Tracking Complete ("
+        + ", ".join(
+            f"{stage}: {seconds:.2f}s" for stage, seconds in timings.items()
+        )
+        + ") ---"
+    )
+    return {"accounts": accounts, "timings": timings}
 
 
 if __name__ == "__main__":
@@ -114,6 +839,6 @@ if __name__ == "__main__":
         steam_id_from_config, use_test_data_from_config = config.get_config()
 
         run_tracker(steam_id_from_config, use_test_data_from_config)
-    except (ValueError) as e:
+    except ValueError as e:
 
         print(f"Could not run standalone tracker: {e}")